@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Offline throughput of GreenOnBrown.inference_batch against calling inference frame by frame.
+
+Frames are processed in batches of --batch-size with 1 to --max-workers worker threads. Batches spread whole frames
+over the workers, so on recorded footage throughput should scale close to the number of cores. Reports frames per
+second and whether the boxes are identical to inference.
+
+Usage:
+    python benchmarks/benchmark_batch.py --video /path/to/recording.mp4 --batch-size 16
+    python benchmarks/benchmark_batch.py --width 1456 --height 1088 --max-workers 4
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+
+import numpy as np
+
+from benchmarks.common import benchmark_parser, load_frames, synthetic_field
+from utils.greenonbrown import GreenOnBrown
+
+ALGORITHMS = ('exg', 'nexg', 'hsv')
+
+
+def main():
+    ap = benchmark_parser(__doc__, frames=64)
+    ap.add_argument('--batch-size', type=int, default=16)
+    ap.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    frames = load_frames(args, lambda resolution: [synthetic_field(resolution, seed=seed % 4)
+                                                   for seed in range(args.frames)])
+
+    if not frames:
+        print("[ERROR] No readable frames")
+        return
+
+    frames = np.stack(frames)
+    batches = [frames[start:start + args.batch_size] for start in range(0, len(frames), args.batch_size)]
+
+    print(f"{len(frames)} frames at {args.width}x{args.height} in batches of {args.batch_size}, "
+          f"{os.cpu_count()} cores")
+    print(f"{'algorithm':<10}{'workers':>8}{'loop fps':>10}{'batch fps':>11}{'identical':>11}")
+    for algorithm in ALGORITHMS:
+        for workers in range(1, args.max_workers + 1):
+            detector = GreenOnBrown(algorithm=algorithm, workers=workers)
+            detector.inference_batch(batches[0][:2], algorithm=algorithm)  # warm up
+
+            start = time.perf_counter()
+            reference = [detector.inference(frame, algorithm=algorithm)[1] for frame in frames]
+            loop_fps = len(frames) / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            results = [result for batch in batches for result in detector.inference_batch(batch, algorithm=algorithm)]
+            batch_fps = len(frames) / (time.perf_counter() - start)
+
+            identical = all(np.array_equal(np.asarray(boxes, dtype=np.int32).reshape(-1, 4), result[0])
+                            for boxes, result in zip(reference, results))
+            print(f"{algorithm:<10}{workers:>8}{loop_fps:>10.1f}{batch_fps:>11.1f}{str(identical):>11}")
+
+
+if __name__ == "__main__":
+    main()
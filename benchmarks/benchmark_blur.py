@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark the focus measures in utils/algorithms.py on synthetically defocused image stacks.
+
+Every sample image is blurred with a series of Gaussian kernels and of disk (defocus) kernels of increasing size,
+optionally with sensor noise added after blurring. For each metric this reports the runtime per megapixel and the
+Spearman rank correlation between the metric and the true sharpness of the stack. A rank correlation of 1 means the
+metric orders every stack exactly from sharpest to most blurred. 'worst' is the lowest correlation across all stacks.
+
+fft_blur is given a grey image, as in the focus GUI, and the other full-frame metrics a BGR image. The *_fast rows
+are the ROI + decimated versions computed through focus_metrics. wavelet_blur is skipped if PyWavelets is missing.
+
+Usage:
+    python benchmarks/benchmark_blur.py
+    python benchmarks/benchmark_blur.py --images /path/to/field/images --noise 2
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.common import benchmark_parser, load_frames, synthetic_field
+from utils.algorithms import (fft_blur, laplacian_blur, variance_of_gradient_blur, tenengrad_blur, entropy_blur,
+                              wavelet_blur, gradient_blur, focus_metrics, FAST_BLUR_METRICS)
+
+GAUSSIAN_SIGMAS = [0, 0.5, 1, 1.5, 2, 3, 4]
+DEFOCUS_RADII = [0, 1, 2, 3, 4, 6, 8]
+
+
+def full_frame_metrics():
+    metrics = {
+        'fft_blur': lambda image: fft_blur(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)),
+        'laplacian_blur': laplacian_blur,
+        'variance_of_gradient_blur': variance_of_gradient_blur,
+        'tenengrad_blur': tenengrad_blur,
+        'entropy_blur': entropy_blur,
+        'gradient_blur': gradient_blur
+    }
+    try:
+        import pywt  # noqa: F401
+        metrics['wavelet_blur'] = wavelet_blur
+    except ImportError:
+        print("[INFO] PyWavelets not installed, skipping wavelet_blur")
+
+    for name in FAST_BLUR_METRICS:
+        metrics[f'{name}_fast'] = lambda image, name=name: focus_metrics(image, metrics=(name,))[name]
+
+    return metrics
+
+
+def defocus_kernel(radius):
+    """Normalised disk kernel, a simple model of an out of focus lens."""
+    size = 2 * radius + 1
+    kernel = np.zeros((size, size), dtype=np.float32)
+    cv2.circle(kernel, (radius, radius), radius, 1, -1)
+    return kernel / kernel.sum()
+
+
+def blur_stack(image, kind, noise, rng):
+    """List of (blur amount, image) from sharpest to most blurred."""
+    stack = []
+    for amount in (GAUSSIAN_SIGMAS if kind == 'gaussian' else DEFOCUS_RADII):
+        if amount == 0:
+            blurred = image.copy()
+        elif kind == 'gaussian':
+            blurred = cv2.GaussianBlur(image, (0, 0), amount)
+        else:
+            blurred = cv2.filter2D(image, -1, defocus_kernel(amount))
+
+        if noise > 0:
+            blurred = np.clip(blurred + rng.normal(0, noise, blurred.shape), 0, 255).astype(np.uint8)
+        stack.append((amount, blurred))
+
+    return stack
+
+
+def spearman(x, y):
+    """Spearman rank correlation without a scipy dependency. Ties are ranked by order of appearance."""
+    rank_x = np.argsort(np.argsort(x)).astype(np.float64)
+    rank_y = np.argsort(np.argsort(y)).astype(np.float64)
+    if rank_x.std() == 0 or rank_y.std() == 0:
+        return 0.0
+    return float(np.corrcoef(rank_x, rank_y)[0, 1])
+
+
+def main():
+    ap = benchmark_parser(__doc__, video=False, images=False)
+    ap.add_argument('--images', type=str, default=None, help='directory of sharp sample images')
+    ap.add_argument('--noise', type=float, default=1.0, help='standard deviation of noise added after blurring')
+    args = ap.parse_args()
+
+    images = load_frames(args, lambda resolution: [synthetic_field(resolution, weeds=60, seed=seed)
+                                                   for seed in range(3)])
+    if not images:
+        print(f"[ERROR] No readable images in {args.images}")
+        return
+
+    rng = np.random.default_rng(0)
+    stacks = {kind: [blur_stack(image, kind, args.noise, rng) for image in images]
+              for kind in ('gaussian', 'defocus')}
+    megapixels = args.width * args.height / 1e6
+    metrics = full_frame_metrics()
+
+    print(f"{len(images)} images at {args.width}x{args.height}, noise {args.noise}")
+    print(f"{'metric':<30}{'ms/MP':>8}{'gaussian':>10}{'defocus':>10}{'worst':>8}")
+
+    results = []
+    for name, metric in metrics.items():
+        correlations = {}
+        elapsed, calls = 0.0, 0
+        for kind, kind_stacks in stacks.items():
+            correlations[kind] = []
+            for stack in kind_stacks:
+                values = []
+                for amount, image in stack:
+                    start = time.perf_counter()
+                    values.append(metric(image))
+                    elapsed += time.perf_counter() - start
+                    calls += 1
+
+                # sharper images should score higher, so correlate against negative blur
+                correlations[kind].append(spearman(values, [-amount for amount, _ in stack]))
+
+        ms_per_mp = elapsed / calls * 1000 / megapixels
+        gaussian, defocus = np.mean(correlations['gaussian']), np.mean(correlations['defocus'])
+        worst = min(min(values) for values in correlations.values())
+        results.append((name, ms_per_mp, gaussian, defocus, worst))
+        print(f"{name:<30}{ms_per_mp:>8.2f}{gaussian:>10.3f}{defocus:>10.3f}{worst:>8.3f}")
+
+    # the fastest metric that orders every stack correctly, else the most reliable one
+    reliable = [result for result in results if result[4] >= 0.99]
+    best = min(reliable, key=lambda r: r[1]) if reliable else max(results, key=lambda r: (r[4], -r[1]))
+    print(f"\nSuggested default: {best[0]} ({best[1]:.2f} ms/MP, worst rank correlation {best[4]:.3f})")
+
+
+if __name__ == "__main__":
+    main()
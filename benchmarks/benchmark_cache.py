@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Time to re-run GreenOnBrown on the same frame after a threshold change, with and without the index cache.
+
+This mirrors a --show-display tuning session on a static image: every call moves one trackbar, so a new
+CompiledDetector is built each time. 'exg' only moves exg_min, so the cached index is re-thresholded. 'hsv' moves
+hue_min, which is baked into the index of hsv and exhsv, so only the shared HSV conversion is reused.
+
+Usage:
+    python benchmarks/benchmark_cache.py
+    python benchmarks/benchmark_cache.py --image /path/to/frame.jpg --implementations numpy lut
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import itertools
+import time
+
+import cv2
+
+from benchmarks.common import benchmark_parser, synthetic_field
+from utils.greenonbrown import GreenOnBrown
+
+ALGORITHMS = ('exg', 'exgr', 'nexg', 'exhsv', 'hsv')
+SETTINGS = dict(exg_max=200, min_detection_area=10)
+
+
+def time_changes(detector, frame, algorithm, changes, repeats):
+    """Mean milliseconds per call, moving exg_min or hue_min by one on every call."""
+    values = itertools.cycle(range(20, 40))
+    detector.inference(frame, algorithm=algorithm, exg_min=20, **SETTINGS)  # warm up
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        value = next(values)
+        thresholds = dict(exg_min=value) if changes == 'exg' else dict(exg_min=25, hue_min=value)
+        detector.inference(frame, algorithm=algorithm, **thresholds, **SETTINGS)
+
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    ap = benchmark_parser(__doc__, video=False, images=False, repeats=20)
+    ap.add_argument('--image', type=str, default=None, help='frame to use instead of a synthetic field')
+    ap.add_argument('--implementations', type=str, nargs='+', default=['numpy'])
+    args = ap.parse_args()
+
+    resolution = (args.width, args.height)
+    if args.image:
+        frame = cv2.resize(cv2.imread(args.image), resolution, interpolation=cv2.INTER_AREA)
+    else:
+        frame = synthetic_field(resolution, weeds=40)
+
+    print(f"ms per threshold change at {args.width}x{args.height}")
+    print(f"{'algorithm':>10}{'implementation':>16}{'changes':>9}{'uncached':>10}{'cached':>8}")
+    for algorithm, implementation in itertools.product(ALGORITHMS, args.implementations):
+        for changes in ('exg', 'hsv') if algorithm in ('exhsv', 'hsv') else ('exg',):
+            timings = []
+            for index_cache in (False, True):
+                detector = GreenOnBrown(algorithm=algorithm, implementation=implementation, index_cache=index_cache)
+                timings.append(time_changes(detector, frame, algorithm, changes, args.repeats))
+            print(f"{algorithm:>10}{implementation:>16}{changes:>9}{timings[0]:>10.2f}{timings[1]:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
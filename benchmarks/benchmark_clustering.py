@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Relay jobs per frame and clustering cost of cluster_detections on fragmented weeds.
+
+Synthetic frames are textured soil with plants drawn as separate leaf fragments, so each plant thresholds into
+several detections. For each cluster_radius this reports the detections (one relay job each) left per frame, the
+plants that were merged with another plant and the milliseconds clustering takes. With --video the merged plants
+can't be counted and are left out.
+
+Usage:
+    python benchmarks/benchmark_clustering.py
+    python benchmarks/benchmark_clustering.py --video /path/to/recording.mp4 --radii 10 20 40
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+
+from benchmarks.common import benchmark_parser, synthetic_field, load_video, time_function
+from utils.clustering import cluster_detections, cluster_labels
+from utils.greenonbrown import GreenOnBrown
+
+
+def fragmented_field(resolution, columns=4, rows=3, fragments=6, spread=90, seed=0):
+    """
+    Soil with a jittered grid of plants, each made of small leaves spread up to spread pixels around its centre,
+    and the plant centres.
+    """
+    rng = np.random.default_rng(seed)
+    frame = synthetic_field(resolution, weeds=0, seed=seed)
+    width, height = resolution
+    grid_x, grid_y = np.meshgrid((np.arange(columns) + 0.5) * width / columns, (np.arange(rows) + 0.5) * height / rows)
+    centres = np.column_stack((grid_x.ravel(), grid_y.ravel())) + rng.uniform(-30, 30, (columns * rows, 2))
+    for x, y in centres:
+        for angle in rng.uniform(0, 2 * np.pi, fragments):
+            distance = rng.uniform(40, spread)
+            leaf = (int(x + distance * np.cos(angle)), int(y + distance * np.sin(angle)))
+            cv2.circle(frame, leaf, 4, (40, 170, 60), -1)
+    return frame, centres
+
+
+def main():
+    ap = benchmark_parser(__doc__, images=False, frames=20, repeats=50, repeats_help='timed calls per radius')
+    ap.add_argument('--algorithm', type=str, default='exg')
+    ap.add_argument('--radii', type=int, nargs='+', default=[25, 50, 100, 150])
+    args = ap.parse_args()
+
+    resolution = (args.width, args.height)
+    if args.video:
+        frames = load_video(args.video, resolution, max_frames=args.frames)
+        plants = [None] * len(frames)
+    else:
+        frames, plants = zip(*(fragmented_field(resolution, seed=seed) for seed in range(args.frames)))
+
+    detector = GreenOnBrown(algorithm=args.algorithm)
+    results = [detector.detect(frame, algorithm=args.algorithm, exg_min=25, exg_max=200) for frame in frames]
+
+    print(f"{len(frames)} frames at {args.width}x{args.height}, {args.algorithm}")
+    print(f"{'radius':>7}{'jobs':>8}{'merged plants':>15}{'ms':>8}")
+    for radius in [0] + args.radii:
+        clustered = [cluster_detections(result, radius) for result in results]
+        jobs = np.mean([len(result) for result in clustered])
+
+        # a plant is merged with another if detections near two plant centres end up in one cluster
+        merged = []
+        for result, centres in zip(results, plants):
+            if centres is None or len(result) == 0:
+                continue
+            labels = cluster_labels(result.centres, radius)
+            distances = np.linalg.norm(result.centres[:, None, :] - np.asarray(centres)[None, :, :], axis=2)
+            nearest = distances.argmin(axis=1)
+            plant_clusters = [set(labels[nearest == plant]) for plant in range(len(centres))]
+            merged.append(np.mean([any(clusters & other for n, other in enumerate(plant_clusters) if n != plant)
+                                   for plant, clusters in enumerate(plant_clusters)]))
+
+        milliseconds = time_function(lambda result: cluster_detections(result, radius), results, args.repeats)
+        merged_text = f"{np.mean(merged):.2f}" if merged else '-'
+        print(f"{radius:>7}{jobs:>8.1f}{merged_text:>15}{milliseconds:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
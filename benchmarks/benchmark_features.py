@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Compare running an ensemble of GreenOnBrown algorithms on the same frame one after another with running them on a
+shared FrameFeatures, which computes the channel planes, chromaticity and HSV conversion once and reuses the nexg,
+hsv and exg outputs inside exhsv and exgr.
+
+Both runs use the 'numpy' implementations and the outputs are checked to be identical.
+
+Usage:
+    python benchmarks/benchmark_features.py
+    python benchmarks/benchmark_features.py --images /path/to/field/images --algorithms nexg hsv exhsv
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import benchmark_parser, synthetic_corpus, load_corpus, time_function
+from utils.frame_features import FrameFeatures
+from utils.greenonbrown import GreenOnBrown
+
+RESOLUTIONS = [(640, 480), (1456, 1088)]
+
+
+def ensemble(gob, algorithms, shared):
+    def run(frame):
+        features = FrameFeatures(frame) if shared else None
+        return [gob.inference(frame, algorithm=algorithm, features=features)[1] for algorithm in algorithms]
+
+    return run
+
+
+def main():
+    ap = benchmark_parser(__doc__, width=None, video=False, repeats=20,
+                          repeats_help='timed ensemble runs per resolution')
+    ap.add_argument('--algorithms', nargs='+', default=['exg', 'exgr', 'nexg', 'hsv', 'exhsv'])
+    args = ap.parse_args()
+
+    gob = GreenOnBrown(use_workspace=False)
+
+    print(f"ensemble: {', '.join(args.algorithms)}")
+    print(f"{'resolution':<12}{'separate ms':>12}{'shared ms':>12}{'saving':>10}{'identical':>11}")
+    for resolution in RESOLUTIONS:
+        frames = load_corpus(args.images, resolution) if args.images else synthetic_corpus(resolution)
+        if not frames:
+            print(f"[ERROR] No readable images in {args.images}")
+            return
+
+        separate = ensemble(gob, args.algorithms, shared=False)
+        shared = ensemble(gob, args.algorithms, shared=True)
+        identical = all(separate_boxes == shared_boxes
+                        for frame in frames
+                        for separate_boxes, shared_boxes in zip(separate(frame), shared(frame)))
+
+        separate_ms = time_function(separate, frames, args.repeats)
+        shared_ms = time_function(shared, frames, args.repeats)
+
+        print(f"{resolution[0]}x{resolution[1]:<7}{separate_ms:>12.2f}{shared_ms:>12.2f}"
+              f"{separate_ms - shared_ms:>+10.2f}{str(identical):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Compare the implementations of each GreenOnBrown index registered in GreenOnBrown.implementations.
+
+For every algorithm and implementation this reports the mean time per frame at each resolution and the largest
+difference from the reference 'numpy' implementation across the test corpus.
+
+The 'linear' rows are the approximate cv2.transform LinearIndex versions. The linear exgr drops the inner clip of ExG so
+it differs where blue dominates, and the linear maxg sets the negative responses the numpy maxg wraps to 0. cive is not
+a GreenOnBrown algorithm and is added here only to compare its two implementations.
+
+The 'numba' rows only appear if numba is installed. They are called with exg_min = 0 and exg_max = 255, so the
+fused clip has no effect and the output should match 'numpy' exactly.
+
+Usage:
+    python benchmarks/benchmark_indices.py
+    python benchmarks/benchmark_indices.py --images /path/to/field/images --repeats 50
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+
+from benchmarks.common import benchmark_parser, synthetic_corpus, load_corpus, time_function
+from utils.algorithms import cive, CIVE
+from utils.greenonbrown import GreenOnBrown
+
+RESOLUTIONS = [(640, 480), (1456, 1088)]
+SKIP_ALGORITHMS = {'gndvi'}  # opens a display window on every call
+SKIP_IMPLEMENTATIONS = {'yuv420'}  # take I420 frames, compared in benchmark_yuv.py
+EXTRA_IMPLEMENTATIONS = {'cive': {'numpy': cive, 'linear': CIVE}}
+
+
+def as_grey(output):
+    # hsv style algorithms return (mask, True)
+    if isinstance(output, tuple):
+        output = output[0]
+    return output.astype(np.int16)
+
+
+def main():
+    ap = benchmark_parser(__doc__, width=None, video=False, repeats=30,
+                          repeats_help='timed calls per implementation and resolution')
+    args = ap.parse_args()
+
+    gob = GreenOnBrown()
+    registry = dict(gob.implementations, **EXTRA_IMPLEMENTATIONS)
+
+    print(f"OpenCV {cv2.__version__}, numpy {np.__version__}")
+    print(f"{'algorithm':<10}{'implementation':<16}{'resolution':<12}{'ms/frame':>10}{'saving':>10}{'max diff':>10}")
+
+    for resolution in RESOLUTIONS:
+        frames = load_corpus(args.images, resolution) if args.images else synthetic_corpus(resolution)
+        if not frames:
+            print(f"[ERROR] No readable images in {args.images}")
+            return
+
+        for algorithm, implementations in registry.items():
+            if algorithm in SKIP_ALGORITHMS:
+                continue
+
+            reference = implementations['numpy']
+            reference_ms = time_function(reference, frames, args.repeats)
+            reference_out = [as_grey(reference(frame)) for frame in frames]
+
+            for name, func in implementations.items():
+                if name in SKIP_IMPLEMENTATIONS:
+                    continue
+                ms = reference_ms if name == 'numpy' else time_function(func, frames, args.repeats)
+                max_diff = max(int(np.abs(as_grey(func(frame)) - ref).max())
+                               for frame, ref in zip(frames, reference_out))
+                saving = f"{reference_ms - ms:+.2f}" if name != 'numpy' else '-'
+
+                print(f"{algorithm:<10}{name:<16}{resolution[0]}x{resolution[1]:<7}{ms:>10.2f}{saving:>10}{max_diff:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Scaling of the parallel strip mode of GreenOnBrown from 1 to --max-workers threads.
+
+For each algorithm and worker count this reports the mean GreenOnBrown.inference time, the speedup over one worker
+and whether the boxes are identical to one worker, which they should always be. OpenCV also parallelises some calls
+internally, so run with --cv-threads 1 to see the scaling of the strips alone.
+
+Usage:
+    python benchmarks/benchmark_parallel.py --width 1456 --height 1088
+    python benchmarks/benchmark_parallel.py --video /path/to/recording.mp4 --max-workers 4 --cv-threads 1
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+
+from benchmarks.common import benchmark_parser, load_frames, synthetic_field, time_function
+from utils.greenonbrown import GreenOnBrown
+
+ALGORITHMS = ('exg', 'exgr', 'nexg', 'exhsv', 'hsv')
+
+
+def main():
+    ap = benchmark_parser(__doc__, frames=20, repeats=20, repeats_help='timed calls per algorithm and worker count')
+    ap.add_argument('--implementation', type=str, default='numpy', help='GreenOnBrown implementation to time')
+    ap.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    ap.add_argument('--cv-threads', type=int, default=None, help='passed to cv2.setNumThreads')
+    args = ap.parse_args()
+
+    if args.cv_threads is not None:
+        cv2.setNumThreads(args.cv_threads)
+
+    frames = load_frames(args, lambda resolution: [synthetic_field(resolution, seed=seed) for seed in range(3)])
+
+    if not frames:
+        print("[ERROR] No readable frames")
+        return
+
+    print(f"{len(frames)} frames at {args.width}x{args.height}, {os.cpu_count()} cores, "
+          f"{cv2.getNumThreads()} OpenCV threads")
+    print(f"{'algorithm':<10}{'workers':>8}{'ms':>9}{'speedup':>9}{'identical':>11}")
+    for algorithm in ALGORITHMS:
+        reference_ms, reference_boxes = None, None
+        for workers in range(1, args.max_workers + 1):
+            detector = GreenOnBrown(algorithm=algorithm, implementation=args.implementation, workers=workers)
+
+            def inference(frame):
+                return detector.inference(frame, algorithm=algorithm, min_detection_area=10)
+
+            elapsed = time_function(inference, frames, args.repeats)
+            boxes = [inference(frame)[1] for frame in frames]
+            if reference_boxes is None:
+                reference_ms, reference_boxes = elapsed, boxes
+
+            print(f"{algorithm:<10}{workers:>8}{elapsed:>9.1f}{reference_ms / elapsed:>9.2f}"
+                  f"{str(boxes == reference_boxes):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Skip rate, missed plants and time saved by the GreenOnBrown empty-frame probe.
+
+For each algorithm, probe_scale and probe_margin this reports:
+    skipped  share of --empty frames (bare soil) the probe skips
+    missed   share of frames with detections without the probe that lose one or more of them with it
+    empty/full ms  mean inference time on the bare soil and on the frames with plants
+
+Synthetic frames are textured soil plus single plants of 1 to 8 pixel radius, the hardest case for the probe. With
+--video, frames with no detections without the probe count as empty.
+
+Usage:
+    python benchmarks/benchmark_probe.py
+    python benchmarks/benchmark_probe.py --video /path/to/recording.mp4 --scales 4 8 --margins 5 10 20
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+
+from benchmarks.common import benchmark_parser, synthetic_field, load_video, time_function
+from utils.greenonbrown import GreenOnBrown
+
+ALGORITHMS = ('exg', 'nexg', 'exhsv', 'hsv')
+SETTINGS = dict(exg_min=25, exg_max=200, min_detection_area=10)
+
+
+def single_plant_frames(resolution, radii=(1, 2, 3, 4, 6, 8), per_radius=3):
+    frames = []
+    for radius in radii:
+        for seed in range(per_radius):
+            frame = synthetic_field(resolution, weeds=0, seed=seed)
+            rng = np.random.default_rng(seed)
+            centre = (int(rng.integers(radius, resolution[0] - radius)),
+                      int(rng.integers(radius, resolution[1] - radius)))
+            cv2.circle(frame, centre, radius, (40, 160, 60), -1)
+            frames.append(frame)
+    return frames
+
+
+def main():
+    ap = benchmark_parser(__doc__, images=False, frames=100, repeats=10)
+    ap.add_argument('--scales', type=int, nargs='+', default=[4, 8, 16])
+    ap.add_argument('--margins', type=int, nargs='+', default=[0, 10, 20])
+    args = ap.parse_args()
+
+    resolution = (args.width, args.height)
+    for algorithm in ALGORITHMS:
+        reference = GreenOnBrown(algorithm=algorithm)
+
+        def detections(detector, frame):
+            return len(detector.inference(frame, algorithm=algorithm, **SETTINGS)[1])
+
+        if args.video:
+            frames = load_video(args.video, resolution, max_frames=args.frames)
+            empty = [frame for frame in frames if detections(reference, frame) == 0]
+            planted = [frame for frame in frames if detections(reference, frame) > 0]
+        else:
+            empty = [synthetic_field(resolution, weeds=0, seed=seed) for seed in range(5)]
+            planted = single_plant_frames(resolution)
+        counts = [detections(reference, frame) for frame in planted]
+
+        print(f"\n{algorithm}: {len(empty)} empty and {len(planted)} planted frames at {args.width}x{args.height}")
+        print(f"{'scale':>6}{'margin':>8}{'skipped':>9}{'missed':>8}{'empty ms':>10}{'full ms':>9}")
+        for scale in [0] + args.scales:
+            for margin in (args.margins if scale else [0]):
+                detector = GreenOnBrown(algorithm=algorithm, probe_scale=scale, probe_margin=margin)
+
+                skipped = sum(detector.compile(algorithm, exg_min=25, exg_max=200).probe_empty(frame)
+                              for frame in empty) / max(len(empty), 1)
+                missed = np.mean([detections(detector, frame) < count for frame, count in zip(planted, counts)]
+                                 if planted else [0])
+                def run(frame):
+                    return detections(detector, frame)
+
+                empty_ms = time_function(run, empty, args.repeats) if empty else 0
+                full_ms = time_function(run, planted, args.repeats) if planted else 0
+                print(f"{scale:>6}{margin:>8}{skipped:>9.2f}{missed:>8.2f}{empty_ms:>10.2f}{full_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
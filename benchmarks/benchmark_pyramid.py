@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Compare the coarse-to-fine pyramid mode of GreenOnBrown with full frame processing.
+
+For each algorithm and pyramid_scale this reports the mean time per frame and how closely the detections match full
+frame processing: recall is the share of full frame detections with a pyramid detection centre within --tolerance
+pixels, precision the reverse. The pyramid mode pays off at high resolutions when most of the frame is bare soil, so
+use native resolution footage with --video or --images.
+
+Usage:
+    python benchmarks/benchmark_pyramid.py --video /path/to/recording.mp4 --width 4056 --height 3040
+    python benchmarks/benchmark_pyramid.py --weeds 5
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from benchmarks.common import benchmark_parser, load_frames, synthetic_field, time_function, matched
+from utils.greenonbrown import GreenOnBrown
+
+ALGORITHMS = ('exg', 'nexg', 'hsv', 'exhsv')
+SCALES = (1, 2, 4, 8)
+
+
+def main():
+    ap = benchmark_parser(__doc__, width=4056, height=3040, frames=20, repeats=5,
+                          repeats_help='timed calls per algorithm and scale')
+    ap.add_argument('--weeds', type=int, default=10, help='plants per synthetic frame')
+    ap.add_argument('--tolerance', type=float, default=3, help='pixel distance for matching detections')
+    args = ap.parse_args()
+
+    frames = load_frames(args, lambda resolution: [synthetic_field(resolution, weeds=args.weeds, seed=seed)
+                                                   for seed in range(3)])
+
+    if not frames:
+        print("[ERROR] No readable frames")
+        return
+
+    print(f"{len(frames)} frames at {args.width}x{args.height}")
+    print(f"{'algorithm':<10}{'scale':>6}{'ms':>9}{'speedup':>9}{'recall':>8}{'precision':>11}")
+    for algorithm in ALGORITHMS:
+        reference_ms, reference_centres = None, None
+        for scale in SCALES:
+            detector = GreenOnBrown(algorithm=algorithm, pyramid_scale=scale)
+
+            def inference(frame):
+                return detector.inference(frame, algorithm=algorithm, min_detection_area=10)
+
+            elapsed = time_function(inference, frames, args.repeats)
+            centres = [inference(frame)[2] for frame in frames]
+            if reference_centres is None:
+                reference_ms, reference_centres = elapsed, centres
+
+            recall = np.mean([matched(r, c, args.tolerance) for r, c in zip(reference_centres, centres)])
+            precision = np.mean([matched(c, r, args.tolerance) for r, c in zip(reference_centres, centres)])
+            print(f"{algorithm:<10}{scale:>6}{elapsed:>9.1f}{reference_ms / elapsed:>9.2f}"
+                  f"{recall:>8.2f}{precision:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
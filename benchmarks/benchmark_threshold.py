@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Compare the threshold methods in utils/thresholding.py on recorded footage.
+
+For every algorithm and threshold method this reports the time of the threshold step alone and of the whole
+GreenOnBrown.inference call, and how closely the detections match the original 'gaussian' method: recall is the share
+of gaussian detections with a detection centre within --tolerance pixels, precision the reverse. Frames are processed
+in order, so the Otsu level is refreshed every --interval frames as on the OWL. Use a recording from the field the
+OWL will run in, as the quality of each method depends on plant size and soil texture.
+
+Usage:
+    python benchmarks/benchmark_threshold.py --video /path/to/recording.mp4
+    python benchmarks/benchmark_threshold.py --images /path/to/field/images --width 1456 --height 1088
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from benchmarks.common import benchmark_parser, load_frames, synthetic_field, time_function, matched
+from utils.greenonbrown import GreenOnBrown
+from utils.thresholding import create_thresholder, THRESHOLD_METHODS
+
+ALGORITHMS = ('exg', 'exgr', 'nexg', 'exhsv')
+EXG_MIN, EXG_MAX = 25, 200
+
+
+def clipped_index(detector, frame, algorithm):
+    """The clipped index inference passes to the threshold step."""
+    output = detector.algorithms[algorithm](frame)
+    return np.clip(output, EXG_MIN, EXG_MAX).astype(np.uint8)
+
+
+def main():
+    ap = benchmark_parser(__doc__, width=640, height=480, frames=100, repeats=50,
+                          repeats_help='timed calls per algorithm and method')
+    ap.add_argument('--interval', type=int, default=30, help='frames between Otsu updates')
+    ap.add_argument('--tolerance', type=float, default=10, help='pixel distance for matching detections')
+    args = ap.parse_args()
+
+    if not (args.video or args.images):
+        print("[INFO] No --video or --images given, using synthetic frames")
+    frames = load_frames(args, lambda resolution: [synthetic_field(resolution, weeds=40, seed=seed)
+                                                   for seed in range(8)])
+
+    if not frames:
+        print("[ERROR] No readable frames")
+        return
+
+    print(f"{len(frames)} frames at {args.width}x{args.height}")
+    print(f"{'algorithm':<10}{'method':<13}{'threshold ms':>13}{'total ms':>10}{'recall':>8}{'precision':>11}")
+    for algorithm in ALGORITHMS:
+        reference = GreenOnBrown(algorithm=algorithm)
+        indices = [clipped_index(reference, frame, algorithm) for frame in frames]
+        reference_centres = [reference.inference(frame, algorithm=algorithm, exg_min=EXG_MIN, exg_max=EXG_MAX)[2]
+                             for frame in frames]
+
+        for method in THRESHOLD_METHODS:
+            detector = GreenOnBrown(algorithm=algorithm, threshold_method=method, threshold_interval=args.interval)
+
+            thresholder = create_thresholder(method, update_interval=args.interval)
+            threshold_ms = time_function(thresholder, indices, args.repeats)
+            total_ms = time_function(
+                lambda frame: detector.inference(frame, algorithm=algorithm, exg_min=EXG_MIN, exg_max=EXG_MAX),
+                frames, args.repeats)
+
+            recall, precision = [], []
+            detector = GreenOnBrown(algorithm=algorithm, threshold_method=method, threshold_interval=args.interval)
+            for frame, centres in zip(frames, reference_centres):
+                method_centres = detector.inference(frame, algorithm=algorithm, exg_min=EXG_MIN, exg_max=EXG_MAX)[2]
+                recall.append(matched(centres, method_centres, args.tolerance))
+                precision.append(matched(method_centres, centres, args.tolerance))
+
+            print(f"{algorithm:<10}{method:<13}{threshold_ms:>13.2f}{total_ms:>10.2f}"
+                  f"{np.mean(recall):>8.2f}{np.mean(precision):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
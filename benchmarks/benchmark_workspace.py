@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Compare GreenOnBrown.inference with and without the per-resolution Workspace.
+
+For each algorithm this reports the per-frame latency (median and 99th percentile), the number and total duration
+of garbage collector pauses, and the memory allocated per frame measured with tracemalloc. With --check the script
+exits with an error if steady-state processing with a workspace allocates more than --max-kb per frame.
+Steady-state allocation is expected to be near zero for the 'numpy', 'fixed' and 'lut' implementations.
+
+Usage:
+    python benchmarks/benchmark_workspace.py --implementation fixed --check
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.common import benchmark_parser, synthetic_field
+from utils.greenonbrown import GreenOnBrown
+
+
+class GCTimer:
+    """Records the duration of every garbage collection while active."""
+    def __init__(self):
+        self.pauses = []
+        self._start = None
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            self.pauses.append(time.perf_counter() - self._start)
+            self._start = None
+
+    def __enter__(self):
+        gc.callbacks.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        gc.callbacks.remove(self)
+
+
+def run(detector, frame, algorithm, frames):
+    for _ in range(5):
+        detector.inference(frame, algorithm=algorithm)
+
+    latencies = []
+    with GCTimer() as gc_timer:
+        for _ in range(frames):
+            start = time.perf_counter()
+            detector.inference(frame, algorithm=algorithm)
+            latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    for _ in range(frames):
+        detector.inference(frame, algorithm=algorithm)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'p50': np.percentile(latencies, 50),
+        'p99': np.percentile(latencies, 99),
+        'gc_count': len(gc_timer.pauses),
+        'gc_ms': sum(gc_timer.pauses) * 1000,
+        'peak_kb': peak / 1024
+    }
+
+
+def main():
+    ap = benchmark_parser(__doc__, width=640, height=480, video=False, images=False)
+    ap.add_argument('--implementation', type=str, default='fixed', help='numpy, fixed or lut')
+    ap.add_argument('--frames', type=int, default=300)
+    ap.add_argument('--check', action='store_true', help='fail if the workspace run allocates more than --max-kb')
+    ap.add_argument('--max-kb', type=float, default=256, help='allowed peak allocation with a workspace')
+    args = ap.parse_args()
+
+    frame = synthetic_field((args.width, args.height))
+    failures = []
+
+    print(f"{args.implementation} implementation, {args.width}x{args.height}, {args.frames} frames")
+    print(f"{'algorithm':<10}{'workspace':<11}{'p50 ms':>8}{'p99 ms':>8}{'GCs':>6}{'GC ms':>8}{'peak kB':>10}")
+    for algorithm in ('exg', 'exgr', 'nexg', 'exhsv', 'hsv'):
+        for use_workspace in (False, True):
+            detector = GreenOnBrown(algorithm=algorithm, implementation=args.implementation,
+                                    use_workspace=use_workspace)
+            result = run(detector, frame, algorithm, args.frames)
+            print(f"{algorithm:<10}{str(use_workspace):<11}{result['p50']:>8.2f}{result['p99']:>8.2f}"
+                  f"{result['gc_count']:>6}{result['gc_ms']:>8.2f}{result['peak_kb']:>10.1f}")
+
+            if use_workspace and result['peak_kb'] > args.max_kb:
+                failures.append(f"{algorithm}: {result['peak_kb']:.1f} kB")
+
+    if args.check and failures:
+        print(f"[ERROR] Steady-state allocation above {args.max_kb} kB: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
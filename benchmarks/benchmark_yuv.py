@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compare GreenOnBrown on YUV420 frames with the same algorithm on BGR frames.
+
+Each BGR frame is converted once to a full range I420 frame, as picamera2 delivers with frame_format = yuv420, and
+both pipelines are timed on their own input. Accuracy is reported as the share of BGR detections with a YUV420
+detection centre within --tolerance pixels (recall) and the reverse (precision), plus the mean absolute difference of
+the index images. The yuv420 indices are computed on the half-resolution chroma planes, so small differences along
+plant edges are expected. maxg shows a large difference because the BGR maxg wraps negative responses while the
+yuv420 version sets them to 0.
+
+Usage:
+    python benchmarks/benchmark_yuv.py --video /path/to/recording.mp4
+    python benchmarks/benchmark_yuv.py --images /path/to/field/images --width 640 --height 480
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+
+from benchmarks.common import benchmark_parser, load_frames, synthetic_field, time_function, matched
+from utils.frame_formats import bgr_to_yuv420
+from utils.greenonbrown import GreenOnBrown
+
+ALGORITHMS = ('exg', 'exgr', 'maxg', 'nexg', 'hsv', 'exhsv')
+
+
+def index_image(detector, frame, algorithm):
+    output = detector.algorithms[algorithm](frame)
+    if isinstance(output, tuple):
+        output = output[0]
+
+    height, width = (frame.shape[0] * 2 // 3, frame.shape[1]) if detector.frame_format == 'yuv420' else frame.shape[:2]
+    if output.shape != (height, width):
+        output = cv2.resize(output, (width, height), interpolation=cv2.INTER_LINEAR)
+    return output.astype(np.int16)
+
+
+def main():
+    ap = benchmark_parser(__doc__, width=640, height=480, frames=100, repeats=50,
+                          repeats_help='timed calls per algorithm and format')
+    ap.add_argument('--tolerance', type=float, default=10, help='pixel distance for matching detections')
+    args = ap.parse_args()
+
+    bgr_frames = load_frames(args, lambda resolution: [synthetic_field(resolution, seed=seed) for seed in range(4)])
+
+    if not bgr_frames:
+        print("[ERROR] No readable frames")
+        return
+
+    yuv_frames = [bgr_to_yuv420(frame) for frame in bgr_frames]
+
+    print(f"{len(bgr_frames)} frames at {args.width}x{args.height}")
+    print(f"{'algorithm':<10}{'bgr ms':>8}{'yuv ms':>8}{'bgr fps':>9}{'yuv fps':>9}"
+          f"{'recall':>8}{'precision':>11}{'index MAE':>11}")
+    for algorithm in ALGORITHMS:
+        bgr_detector = GreenOnBrown(algorithm=algorithm)
+        yuv_detector = GreenOnBrown(algorithm=algorithm, frame_format='yuv420')
+
+        def bgr_inference(frame):
+            return bgr_detector.inference(frame, algorithm=algorithm)
+
+        def yuv_inference(frame):
+            return yuv_detector.inference(frame, algorithm=algorithm)
+
+        bgr_ms = time_function(bgr_inference, bgr_frames, args.repeats)
+        yuv_ms = time_function(yuv_inference, yuv_frames, args.repeats)
+
+        recall, precision, errors = [], [], []
+        for bgr_frame, yuv_frame in zip(bgr_frames, yuv_frames):
+            bgr_centres = bgr_inference(bgr_frame)[2]
+            yuv_centres = yuv_inference(yuv_frame)[2]
+            recall.append(matched(bgr_centres, yuv_centres, args.tolerance))
+            precision.append(matched(yuv_centres, bgr_centres, args.tolerance))
+            errors.append(np.abs(index_image(bgr_detector, bgr_frame, algorithm) -
+                                 index_image(yuv_detector, yuv_frame, algorithm)).mean())
+
+        print(f"{algorithm:<10}{bgr_ms:>8.2f}{yuv_ms:>8.2f}{1000 / bgr_ms:>9.1f}{1000 / yuv_ms:>9.1f}"
+              f"{np.mean(recall):>8.2f}{np.mean(precision):>11.2f}{np.mean(errors):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
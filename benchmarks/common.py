@@ -0,0 +1,128 @@
+"""Command line options, frame sources and timing helpers shared by the benchmark scripts."""
+import argparse
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+def benchmark_parser(description, width=1456, height=1088, video=True, images=True, frames=None, repeats=None,
+                     repeats_help='timed calls per setting'):
+    """
+    ArgumentParser with the options shared by the benchmark scripts, which add their own options to it.
+    :param description: the script docstring, shown by --help
+    :param width: default --width, None leaves out --width and --height
+    :param height: default --height
+    :param video: add --video, recorded footage to use as the corpus
+    :param images: add --images, a directory of field images to use as the corpus
+    :param frames: default --frames, the maximum frames read from --video. None leaves it out.
+    :param repeats: default --repeats, None leaves it out
+    :param repeats_help: help text of --repeats
+    """
+    ap = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    if video:
+        ap.add_argument('--video', type=str, default=None, help='recorded footage to use as the corpus')
+    if images:
+        ap.add_argument('--images', type=str, default=None, help='directory of field images to use as the corpus')
+    if width is not None:
+        ap.add_argument('--width', type=int, default=width)
+        ap.add_argument('--height', type=int, default=height)
+    if frames is not None:
+        ap.add_argument('--frames', type=int, default=frames, help='maximum frames read from --video')
+    if repeats is not None:
+        ap.add_argument('--repeats', type=int, default=repeats, help=repeats_help)
+    return ap
+
+
+def load_frames(args, synthetic):
+    """
+    Frames from --video or --images if given, otherwise synthetic frames.
+    :param args: arguments parsed by a benchmark_parser
+    :param synthetic: function of a (width, height) returning the synthetic frames
+    :return: list of BGR frames at (args.width, args.height), empty if --video or --images has no readable frames
+    """
+    resolution = (args.width, args.height)
+    if getattr(args, 'video', None):
+        return load_video(args.video, resolution, max_frames=getattr(args, 'frames', 300))
+    if getattr(args, 'images', None):
+        return load_corpus(args.images, resolution)
+    return synthetic(resolution)
+
+
+def synthetic_corpus(resolution, count=4, seed=42):
+    """Random noise plus smooth soil/plant-like colour fields, so every channel combination is covered."""
+    rng = np.random.default_rng(seed)
+    width, height = resolution
+    frames = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8)]
+
+    for _ in range(count - 1):
+        base = rng.integers(40, 160, 3)
+        field = np.empty((height, width, 3), dtype=np.float32)
+        field[:] = base
+        blobs = rng.integers(0, 256, (height // 16, width // 16, 3), dtype=np.uint8)
+        blobs = cv2.resize(blobs, (width, height), interpolation=cv2.INTER_CUBIC).astype(np.float32)
+        frames.append(np.clip(0.6 * field + 0.4 * blobs, 0, 255).astype(np.uint8))
+
+    return frames
+
+
+def synthetic_field(resolution, weeds=15, seed=3):
+    """Textured brown soil with a few green plants, similar to a fallow field frame."""
+    rng = np.random.default_rng(seed)
+    width, height = resolution
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = (60, 90, 120)
+    frame = cv2.add(frame, rng.integers(0, 20, frame.shape, dtype=np.uint8))
+
+    scale = width / 640
+    for _ in range(weeds):
+        centre = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        radius = int(rng.integers(3, 20) * scale)
+        cv2.circle(frame, centre, radius, (40, 160, 60), -1)
+
+    return frame
+
+
+def load_corpus(directory, resolution):
+    """Every readable image in directory, resized to resolution."""
+    frames = []
+    for path in sorted(Path(directory).iterdir()):
+        image = cv2.imread(str(path))
+        if image is not None:
+            frames.append(cv2.resize(image, resolution, interpolation=cv2.INTER_AREA))
+    return frames
+
+
+def load_video(path, resolution, max_frames=300):
+    """Frames from a recorded video, resized to resolution."""
+    frames = []
+    capture = cv2.VideoCapture(str(path))
+    while len(frames) < max_frames:
+        grabbed, frame = capture.read()
+        if not grabbed:
+            break
+        frames.append(cv2.resize(frame, resolution, interpolation=cv2.INTER_AREA))
+    capture.release()
+    return frames
+
+
+def time_function(func, frames, repeats):
+    """Mean milliseconds per call of func over repeats calls, cycling through frames."""
+    func(frames[0])  # warm up
+    start = time.perf_counter()
+    for i in range(repeats):
+        func(frames[i % len(frames)])
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def matched(centres, other_centres, tolerance):
+    """Share of centres with one of other_centres within tolerance pixels."""
+    if len(centres) == 0:
+        return 1.0
+    if len(other_centres) == 0:
+        return 0.0
+
+    other = np.array(other_centres)
+    distances = [np.hypot(*(other - centre).T).min() for centre in centres]
+    return float(np.mean(np.array(distances) <= tolerance))
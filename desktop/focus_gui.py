@@ -16,7 +16,7 @@ import collections
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from utils.video_manager import VideoStream
-from utils.algorithms import fft_blur
+from utils.algorithms import focus_metrics
 
 class OWLFocusGUI:
     def __init__(self, root):
@@ -30,6 +30,8 @@ class OWLFocusGUI:
         self.frame = None
         self.resolution = (640, 480)
         self.exp_compensation = -2
+        # centre fraction of the frame used for the focus measure
+        self.focus_roi = 0.5
 
         # Focus tracking: persist best focus value and its frame indefinitely.
         self.focus_history = collections.deque(maxlen=250)
@@ -146,8 +148,7 @@ class OWLFocusGUI:
                 if frame is None:
                     time.sleep(0.1)
                     continue
-                grey = cv2.cvtColor(frame.copy(), cv2.COLOR_BGR2GRAY)
-                focus_val = fft_blur(grey, size=30)
+                focus_val = focus_metrics(frame, metrics=('fft',), roi=self.focus_roi, size=30)['fft']
                 self.focus_history.append(focus_val)
                 self.focus_moving_avg.append(focus_val)
                 current_avg_focus = np.mean(self.focus_moving_avg)
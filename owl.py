@@ -65,8 +65,14 @@ try:
    from utils.directory_manager import DirectorySetup
    from utils.video_manager import VideoStream
    from utils.image_sampler import ImageRecorder
-   from utils.algorithms import fft_blur
+   from utils.algorithms import fft_blur, LinearIndex
+   from utils.frame_formats import bgr_to_yuv420, yuv420_to_bgr
    from utils.greenonbrown import GreenOnBrown
+   from utils.detections import DetectionResult, DetectionRenderer
+   from utils.clustering import cluster_labels, merge_clusters
+   from utils.autotuner import Autotuner
+   from utils.pixel_classifier import PixelClassifier
+   from utils.roi_manager import ProcessingROI
    from utils.frame_reader import FrameReader
    from utils.config_manager import ConfigValidator
    from utils.log_manager import LogManager
@@ -83,6 +89,12 @@ except ImportError as e:
 
 logger.info("All required modules imported successfully")
 
+# milliseconds the loop waits for a key or trackbar change while a media frame and its thresholds are unchanged
+IDLE_WAIT_MS = 50
+
+# width of the Detection Output window, detections are drawn onto a copy of the frame shrunk to it
+DISPLAY_WIDTH = 600
+
 def nothing(x):
     pass
 
@@ -146,6 +158,7 @@ class Owl:
         self.resolution = (self.config.getint('Camera', 'resolution_width'),
                            self.config.getint('Camera', 'resolution_height'))
         self.exp_compensation = self.config.getint('Camera', 'exp_compensation')
+        self.frame_format = self.config.get('Camera', 'frame_format', fallback='bgr').lower()
 
         # Relay Dict maps the reference relay number to a boardpin on the embedded device
         self.relay_dict = {}
@@ -311,6 +324,36 @@ class Owl:
 
         # Precompute the integer lane coordinates for reuse
         self.lane_coords_int = {k: int(v) for k, v in self.lane_coords.items()}
+        self.lane_edges = [self.lane_coords_int[i] for i in range(self.relay_num)] + [int(self.frame_width)]
+
+        # relays fire for each detection past yAct, or with 'coverage' for each lane whose share of green pixels past
+        # yAct is above coverage_threshold, without extracting contours
+        self.actuation_mode = self.config.get('System', 'actuation_mode', fallback='detections').lower()
+        self.coverage_threshold = self.config.getfloat('System', 'coverage_threshold', fallback=0.01)
+
+        # detections with centres within cluster_radius pixels are merged into one relay job, 0 disables it
+        self.cluster_radius = self.config.getint('System', 'cluster_radius', fallback=0)
+
+    def processing_roi(self):
+        """ProcessingROI from the optional [ProcessingROI] section, or None to process the whole frame."""
+        if not self.config.has_section('ProcessingROI'):
+            return None
+
+        exclude = self.config.get('ProcessingROI', 'exclude', fallback='')
+        roi = ProcessingROI(top=self.config.getfloat('ProcessingROI', 'top', fallback=0.0),
+                            bottom=self.config.getfloat('ProcessingROI', 'bottom', fallback=1.0),
+                            left=self.config.getfloat('ProcessingROI', 'left', fallback=0.0),
+                            right=self.config.getfloat('ProcessingROI', 'right', fallback=1.0),
+                            exclude=ProcessingROI.parse_exclusions(exclude))
+        if roi.full_frame:
+            return None
+
+        shape = (self.frame_height, self.frame_width)
+        processed = roi.processed_fraction(shape, self.frame_format)
+        self.logger.info(f"[INFO] Processing ROI covers {processed:.0%} of the frame, "
+                         f"skipping {(1 - processed) * shape[0] * shape[1]:.0f} pixels per frame")
+
+        return roi
 
     def hoot(self):
         self.record_video = False  # Flag to control video recording
@@ -328,18 +371,70 @@ class Owl:
             fps = FPS().start()
 
         try:
+            roi = self.processing_roi()
+
             if algorithm == 'gog':
                 from utils.greenongreen import GreenOnGreen
                 model_path = self.config.get('GreenOnGreen', 'model_path')
                 confidence = self.config.getfloat('GreenOnGreen', 'confidence')
 
-                weed_detector = GreenOnGreen(model_path=model_path)
+                weed_detector = GreenOnGreen(model_path=model_path, roi=roi)
 
             else:
                 min_detection_area = self.config.getint('GreenOnBrown', 'min_detection_area')
                 invert_hue = self.config.getboolean('GreenOnBrown', 'invert_hue')
-
-                weed_detector = GreenOnBrown(algorithm=algorithm)
+                implementation = self.config.get('GreenOnBrown', 'implementation', fallback='numpy').lower()
+                lut_bits = self.config.getint('GreenOnBrown', 'lut_bits', fallback=8)
+                preprocessing = self.config.get('GreenOnBrown', 'preprocessing', fallback='none').lower()
+                preprocessing_interval = self.config.getint('GreenOnBrown', 'preprocessing_interval', fallback=30)
+                detection_mode = self.config.get('GreenOnBrown', 'detection_mode', fallback='contours').lower()
+                threshold_method = self.config.get('GreenOnBrown', 'threshold_method', fallback='gaussian').lower()
+                threshold_interval = self.config.getint('GreenOnBrown', 'threshold_interval', fallback=30)
+                pyramid_scale = self.config.getint('GreenOnBrown', 'pyramid_scale', fallback=1)
+                workers = self.config.getint('GreenOnBrown', 'workers', fallback=1)
+                probe_scale = self.config.getint('GreenOnBrown', 'probe_scale', fallback=0)
+                probe_margin = self.config.getint('GreenOnBrown', 'probe_margin', fallback=10)
+
+                linear_indices = {}
+                for name in ConfigValidator.get_linear_index_names(self.config):
+                    linear_indices[name] = LinearIndex.from_string(self.config.get('LinearIndices', name))
+
+                classifier = None
+                if algorithm == 'classifier':
+                    classifier = PixelClassifier.load(self.config.get('GreenOnBrown', 'classifier_path'))
+
+                # 'auto' starts from the reference implementation and lets the autotuner pick the fastest
+                weed_detector = GreenOnBrown(algorithm=algorithm,
+                                             implementation='numpy' if implementation == 'auto' else implementation,
+                                             lut_bits=lut_bits,
+                                             linear_indices=linear_indices, frame_format=self.frame_format,
+                                             preprocessing=preprocessing,
+                                             preprocessing_interval=preprocessing_interval,
+                                             classifier=classifier,
+                                             detection_mode=detection_mode,
+                                             threshold_method=threshold_method,
+                                             threshold_interval=threshold_interval,
+                                             roi=roi,
+                                             pyramid_scale=pyramid_scale,
+                                             workers=workers,
+                                             probe_scale=probe_scale,
+                                             probe_margin=probe_margin,
+                                             index_cache=self.show_display or bool(self.input_file_or_directory))
+
+                if implementation == 'auto':
+                    thresholds = dict(hue_min=self.hue_min, hue_max=self.hue_max,
+                                      saturation_min=self.saturation_min, saturation_max=self.saturation_max,
+                                      brightness_min=self.brightness_min, brightness_max=self.brightness_max,
+                                      invert_hue=invert_hue)
+                    Autotuner(board=self.RPI_VERSION, resolution=self.resolution).tune(weed_detector,
+                                                                                      algorithms=[algorithm],
+                                                                                      params=thresholds)
+
+                # keep a table resident for both sensitivity profiles so switching costs nothing
+                if self.controller_type == 'advanced':
+                    for settings in (self.controller.low_sensitivity_settings,
+                                     self.controller.high_sensitivity_settings):
+                        weed_detector.prepare(algorithm, invert_hue=invert_hue, **settings)
 
         except (ModuleNotFoundError, IndexError, FileNotFoundError, ValueError) as e:
             algo_error = errors.AlgorithmError(algorithm, e)
@@ -358,8 +453,21 @@ class Owl:
             actuation_duration = self.config.getfloat('System', 'actuation_duration')
             delay = self.config.getfloat('System', 'delay')
 
+            # GreenOnBrown bound to the current thresholds, rebuilt when the trackbars or controller change them
+            compiled_detector = None
+
+            # a static image, or a directory image within image_loop_time, is the same frame on every read. With the
+            # same thresholds the last result is reused and the loop idles until a trackbar or the frame changes.
+            previous_frame, previous_detector, previous_results = None, None, None
+            # a repeated media frame is converted to yuv420 once, so the converted frame is also the same object
+            previous_source, previous_converted = None, None
+
+            # detectors only return detections, they are drawn here if something shows or records them
+            renderer = DetectionRenderer(width=DISPLAY_WIDTH)
+
             while True:
                 frame = self.cam.read()
+                idle = False
 
                 if frame is None:
                     if log_fps:
@@ -372,6 +480,12 @@ class Owl:
                         self.stop()
                         break
 
+                # images and videos are read as BGR
+                if self.frame_format == 'yuv420' and frame.ndim == 3:
+                    if frame is not previous_source:
+                        previous_source, previous_converted = frame, bgr_to_yuv420(frame)
+                    frame = previous_converted
+
                 # retrieve the trackbar positions for thresholds
                 if self.show_display:
                     self.exg_min = cv2.getTrackbarPos("ExG-Min", self.window_name)
@@ -386,14 +500,14 @@ class Owl:
                 # pass image, thresholds to green_on_brown function
                 if not self.disable_detection:
                     if algorithm == 'gog':
-                        cnts, boxes, weed_centres, image_out = weed_detector.inference(
-                            frame,
+                        coverage = None
+                        result = weed_detector.detect(
+                            self.bgr(frame),
                             confidence=confidence,
                             filter_id=63
                         )
                     else:
-                        cnts, boxes, weed_centres, image_out = weed_detector.inference(
-                            frame,
+                        thresholds = dict(
                             exg_min=self.exg_min,
                             exg_max=self.exg_max,
                             hue_min=self.hue_min,
@@ -402,18 +516,54 @@ class Owl:
                             saturation_max=self.saturation_max,
                             brightness_min=self.brightness_min,
                             brightness_max=self.brightness_max,
-                            show_display=self.show_display,
-                            algorithm=algorithm,
-                            min_detection_area=min_detection_area,
-                            invert_hue=invert_hue,
-                            label='WEED'
+                            invert_hue=invert_hue
                         )
+                        if (compiled_detector is None or compiled_detector.stale
+                                or compiled_detector.params != thresholds):
+                            compiled_detector = weed_detector.compile(algorithm,
+                                                                      min_detection_area=min_detection_area,
+                                                                      label='WEED',
+                                                                      **thresholds)
+
+                        idle = frame is previous_frame and compiled_detector is previous_detector
+                        if idle:
+                            result, coverage = previous_results
+                        elif self.actuation_mode == 'coverage':
+                            result = DetectionResult([], [])
+                            coverage = compiled_detector.coverage(frame, self.lane_edges, self.yAct,
+                                                                  show_display=self.show_display)
+                        else:
+                            coverage = None
+                            result = compiled_detector.detect(frame, show_display=self.show_display)
+                        previous_frame, previous_detector = frame, compiled_detector
+                        previous_results = result, coverage
 
+                        if coverage is not None:
+                            actuation_time = time.time()
+                            for i in range(self.relay_num):
+                                if coverage[i] > self.coverage_threshold:
+                                    self.relay_controller.receive(
+                                        relay=i,
+                                        delay=delay,
+                                        time_stamp=actuation_time,
+                                        duration=actuation_duration)
+
+                            if self.controller and coverage.max(initial=0) > self.coverage_threshold:
+                                self.controller.weed_detect_indicator()
+
+                    # detections within cluster_radius are merged for display and recording. The relays still
+                    # follow the centres of the members, with one job per cluster and lane, so a cluster across a
+                    # lane boundary or the actuation line fires the same lanes as its detections would.
+                    clusters = cluster_labels(result.centres, self.cluster_radius, result.class_ids)
+                    actuation_centres = result.centres
+                    result = merge_clusters(result, clusters)
+                    boxes, weed_centres = result.boxes, result.centres
                     if len(weed_centres) > 0 and self.controller:
                         self.controller.weed_detect_indicator()
 
                     # loop over the weed centres
-                    for centre in weed_centres:
+                    fired = set()
+                    for centre, cluster in zip(actuation_centres, clusters):
                         if centre[1] > self.yAct:
                             actuation_time = time.time()
                             centre_x = centre[0]
@@ -421,7 +571,8 @@ class Owl:
                             for i in range(self.relay_num):
                                 lane_start = self.lane_coords_int[i]
                                 lane_end = lane_start + self.lane_width
-                                if lane_start <= centre_x < lane_end:
+                                if lane_start <= centre_x < lane_end and (cluster, i) not in fired:
+                                    fired.add((cluster, i))
                                     self.relay_controller.receive(
                                         relay=i,
                                         delay=delay,
@@ -433,14 +584,17 @@ class Owl:
                 if self.sample_images:
                     # only record every sampleFreq number of frames. If sample_frequency = 60, this will activate every 60th frame
                     if frame_count % self.sample_frequency == 0:
+                        sample_frame = self.bgr(frame)
                         if self.sample_method == 'whole':
-                            self.image_recorder.add_frame(frame=frame, frame_id=frame_count, boxes=None, centres=None)
+                            self.image_recorder.add_frame(frame=sample_frame, frame_id=frame_count, boxes=None,
+                                                          centres=None)
 
                         elif self.sample_method != 'whole' and not self.disable_detection:
-                            self.image_recorder.add_frame(frame=frame, frame_id=frame_count, boxes=boxes,
+                            self.image_recorder.add_frame(frame=sample_frame, frame_id=frame_count, boxes=boxes,
                                                           centres=weed_centres)
                         else:
-                            self.image_recorder.add_frame(frame=frame, frame_id=frame_count, boxes=None, centres=None)
+                            self.image_recorder.add_frame(frame=sample_frame, frame_id=frame_count, boxes=None,
+                                                          centres=None)
 
                         if self.controller:
                             self.status_indicator.image_write_indicator()
@@ -455,6 +609,13 @@ class Owl:
                 if log_fps and frame_count % 900 == 0:
                     fps.stop()
                     self.logger.info(f"[INFO] Approximate FPS: {fps.fps():.2f}")
+                    if algorithm != 'gog' and not self.disable_detection:
+                        timings = weed_detector.timing_summary()
+                        self.logger.info(f"[INFO] Mean per frame: preprocessing {timings['preprocessing']:.2f} ms, "
+                                         f"detection {timings['detection']:.2f} ms")
+                        if weed_detector.probe_scale:
+                            self.logger.info(f"[INFO] Empty-frame probe skipped {timings['skipped']:.0%} of frames, "
+                                             f"saving about {timings['saved']:.2f} ms per frame")
                     fps = FPS().start()
 
                 # update the framerate counter
@@ -462,8 +623,14 @@ class Owl:
                     fps.update()
 
                 if self.show_display:
+                    # full resolution while recording, so the video keeps the camera resolution
+                    display_width = None if self.record_video else DISPLAY_WIDTH
                     if self.disable_detection:
-                        image_out = frame.copy()
+                        image_out, _ = renderer.canvas(self.bgr(frame), width=display_width)
+                    else:
+                        image_out = renderer.render(self.bgr(frame), result, roi=weed_detector.roi,
+                                                    lane_fractions=coverage, lane_edges=self.lane_edges,
+                                                    y_start=self.yAct, width=display_width)
 
                     if self.record_video:
                         if self.video_writer is None:
@@ -472,7 +639,7 @@ class Owl:
                             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                             video_filename = f"owl_recording_{timestamp}.mp4"
                             self.video_writer = cv2.VideoWriter(video_filename, fourcc, 30.0,
-                                                                (frame.shape[1], frame.shape[0]))
+                                                                (image_out.shape[1], image_out.shape[0]))
 
                         # Write the frame with detections
                         self.video_writer.write(image_out)
@@ -481,9 +648,11 @@ class Owl:
                                 (80, 80, 255), 1)
                     cv2.putText(image_out, f'Press "S" to save {algorithm} thresholds to file.',
                                 (20, int(image_out.shape[1 ] *0.72)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (80, 80, 255), 1)
-                    cv2.imshow("Detection Output", imutils.resize(image_out, width=600))
+                    if image_out.shape[1] != DISPLAY_WIDTH:
+                        image_out = imutils.resize(image_out, width=DISPLAY_WIDTH)
+                    cv2.imshow("Detection Output", image_out)
 
-                k = cv2.waitKey(1) & 0xFF
+                k = cv2.waitKey(IDLE_WAIT_MS if idle and self.input_file_or_directory else 1) & 0xFF
                 if k == ord('s'):
                     self.save_parameters()
                     self.logger.info("[INFO] Parameters saved.")
@@ -523,6 +692,12 @@ class Owl:
             self.logger.error(f"[CRITICAL ERROR] STOPPED: {e}", exc_info=True)
             self.stop()
 
+    def bgr(self, frame):
+        """BGR version of a camera frame for display, recording, image sampling and green-on-green."""
+        if self.frame_format == 'yuv420':
+            return yuv420_to_bgr(frame)
+        return frame
+
     def stop(self):
         """Gracefully shut down all OWL components."""
 
@@ -658,7 +833,8 @@ class Owl:
         # Set up camera if no file input specified
         try:
             media_source = VideoStream(resolution=self.resolution,
-                                       exp_compensation=self.exp_compensation)
+                                       exp_compensation=self.exp_compensation,
+                                       frame_format=self.frame_format)
             media_source.start()
 
             self.frame_width = media_source.frame_width
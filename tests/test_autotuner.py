@@ -0,0 +1,26 @@
+from utils.autotuner import Autotuner
+from utils.greenonbrown import GreenOnBrown
+
+
+def test_key_depends_on_lut_bits_and_implementations():
+    tuner = Autotuner(board='test', resolution=(160, 120), cache_path=None)
+    key = tuner.key(GreenOnBrown(lut_bits=8))
+
+    assert tuner.key(GreenOnBrown(lut_bits=6)) != key
+
+    detector = GreenOnBrown(lut_bits=8)
+    detector.implementations['exg']['extra'] = detector.implementations['exg']['numpy']
+    assert tuner.key(detector) != key
+
+
+def test_hsv_is_retuned_at_new_thresholds(tmp_path):
+    tuner = Autotuner(board='test', resolution=(160, 120), cache_path=tmp_path / 'autotune.json', repeats=1)
+    thresholds = {'hue_min': 40, 'hue_max': 80, 'saturation_min': 50, 'exg_min': 25}
+
+    tuner.tune(GreenOnBrown(algorithm='hsv'), algorithms=['hsv'], params=thresholds)
+    cache = tuner.load(GreenOnBrown(algorithm='hsv'))
+    # the exg clip isn't a threshold the implementations are compared at
+    assert cache['params']['hsv'] == {'hue_min': 40, 'hue_max': 80, 'saturation_min': 50}
+
+    tuner.tune(GreenOnBrown(algorithm='hsv'), algorithms=['hsv'], params={'hue_min': 35})
+    assert tuner.load(GreenOnBrown(algorithm='hsv'))['params']['hsv'] == {'hue_min': 35}
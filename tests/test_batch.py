@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from utils.autotuner import synthetic_frame
+from utils.greenonbrown import GreenOnBrown
+
+PARAMS = {'exg_min': 25, 'exg_max': 200}
+
+
+def frames(count=6):
+    return [synthetic_frame((320, 240), seed=seed) for seed in range(count)]
+
+
+@pytest.mark.parametrize('algorithm, implementation', [('exg', 'numpy'), ('hsv', 'lut'), ('exhsv', 'lut')])
+def test_batch_matches_inference(algorithm, implementation):
+    batch = frames()
+    expected = []
+    for frame in batch:
+        detector = GreenOnBrown(algorithm=algorithm, implementation=implementation)
+        _, boxes, centres, _ = detector.inference(frame, algorithm=algorithm, min_detection_area=10, **PARAMS)
+        expected.append((np.asarray(boxes).reshape(-1, 4), np.asarray(centres).reshape(-1, 2)))
+
+    # the probe uses looser hsv thresholds than the mask, on other threads at the same time
+    detector = GreenOnBrown(algorithm=algorithm, implementation=implementation, workers=3, probe_scale=4)
+    results = detector.inference_batch(batch, params=PARAMS, min_detection_area=10, algorithm=algorithm)
+
+    assert len(results) == len(expected)
+    for (boxes, centres), (expected_boxes, expected_centres) in zip(results, expected):
+        assert np.array_equal(boxes, expected_boxes)
+        assert np.array_equal(centres, expected_centres)
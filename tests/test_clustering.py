@@ -0,0 +1,32 @@
+import numpy as np
+
+from utils.clustering import cluster_detections, cluster_labels, merge_clusters
+from utils.detections import DetectionResult
+
+
+def test_clusters_chain_through_neighbours():
+    centres = np.array([[0, 0], [8, 0], [16, 0], [100, 100]])
+    assert cluster_labels(centres, 10).tolist() == [0, 0, 0, 1]
+
+
+def test_classes_are_not_merged():
+    centres = np.array([[0, 0], [5, 0]])
+    assert cluster_labels(centres, 10, class_ids=np.array([0, 1])).tolist() == [0, 1]
+
+
+def test_radius_zero_keeps_every_detection():
+    centres = np.array([[0, 0], [1, 0], [2, 0]])
+    assert cluster_labels(centres, 0).tolist() == [0, 1, 2]
+
+    result = DetectionResult([[0, 0, 2, 2], [1, 0, 2, 2], [2, 0, 2, 2]], centres)
+    assert cluster_detections(result, 0) is result
+
+
+def test_merged_boxes_and_areas():
+    result = DetectionResult([[10, 10, 10, 10], [25, 30, 10, 10], [200, 200, 4, 4]],
+                             [[15, 15], [30, 35], [202, 202]], areas=[50, 60, 10])
+    merged = merge_clusters(result, cluster_labels(result.centres, 30))
+
+    assert merged.boxes.tolist() == [[10, 10, 25, 30], [200, 200, 4, 4]]
+    assert merged.centres.tolist() == [[22, 25], [202, 202]]
+    assert merged.areas.tolist() == [110, 10]
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from benchmarks.common import synthetic_field
+from utils.greenonbrown import GreenOnBrown
+
+
+def sorted_rows(rows, columns):
+    array = np.asarray(rows, dtype=np.int64).reshape(-1, columns)
+    return array[np.lexsort(array.T[::-1])]
+
+
+@pytest.mark.parametrize('algorithm', ['exg', 'hsv'])
+def test_components_match_contours(algorithm):
+    frame = synthetic_field((640, 480), weeds=20)
+    results = {}
+    for mode in ('contours', 'components'):
+        detector = GreenOnBrown(algorithm=algorithm, detection_mode=mode)
+        _, boxes, centres, _ = detector.inference(frame, algorithm=algorithm, min_detection_area=10)
+        results[mode] = sorted_rows(boxes, 4), sorted_rows(centres, 2)
+
+    # labelling and contour tracing order the detections differently
+    assert len(results['components'][0]) == len(results['contours'][0]) > 0
+    assert np.array_equal(results['components'][0], results['contours'][0])
+    assert np.array_equal(results['components'][1], results['contours'][1])
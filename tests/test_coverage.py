@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from utils.greenonbrown import GreenOnBrown
+
+WIDTH, HEIGHT = 640, 480
+
+
+def half_planted_frame():
+    """Soil with the left half of the frame below row 240 covered in plants."""
+    frame = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    frame[:] = (60, 90, 120)
+    frame[HEIGHT // 2:, :WIDTH // 2] = (40, 160, 60)
+    return frame
+
+
+def coverage(lane_edges, y_start=HEIGHT // 2):
+    # a global threshold, as the adaptive ones only mark the edges of a uniform area
+    detector = GreenOnBrown(algorithm='exg', threshold_method='otsu')
+    compiled = detector.compile('exg', exg_min=25, exg_max=200)
+    fractions = compiled.coverage(half_planted_frame(), lane_edges, y_start=y_start)
+    return fractions
+
+
+def test_lane_split():
+    fractions = coverage([0, 160, 320, 480, 640])
+    assert fractions == pytest.approx([1, 1, 0, 0], abs=0.02)
+
+
+def test_partly_planted_lane():
+    fractions = coverage([0, 240, 400, 640])
+    assert fractions == pytest.approx([1, 0.5, 0], abs=0.02)
+
+
+def test_float_lane_edges():
+    # e.g. lane edges from a webcam width reported as a float
+    fractions = coverage([0.0, 320.0, 640.0])
+    assert fractions == pytest.approx([1, 0], abs=0.02)
+
+
+def test_rows_above_y_start_are_not_counted():
+    fractions = coverage([0, 320, 640], y_start=0)
+    assert fractions == pytest.approx([0.5, 0], abs=0.02)
@@ -0,0 +1,41 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from utils.greenonbrown import GreenOnBrown
+
+IMAGE = os.path.join(os.path.dirname(__file__), '..', 'images', 'owl-background.png')
+
+
+def corpus(seed=42):
+    """Random colours, smooth soil and plant-like colour fields and, if it can be read, a real field image."""
+    rng = np.random.default_rng(seed)
+    frames = [rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)]
+
+    ramp = np.linspace(0, 255, 320, dtype=np.float32)
+    for low, high in (((40, 60, 80), (90, 130, 160)), ((20, 90, 30), (80, 220, 110))):
+        frame = np.empty((240, 320, 3), dtype=np.uint8)
+        for channel in range(3):
+            frame[:, :, channel] = low[channel] + (high[channel] - low[channel]) * ramp / 255
+        frames.append(cv2.add(frame, rng.integers(0, 20, frame.shape, dtype=np.uint8)))
+
+    image = cv2.imread(IMAGE)
+    if image is not None:
+        frames.append(cv2.resize(image, (640, 480), interpolation=cv2.INTER_AREA))
+    return frames
+
+
+def as_grey(output):
+    if isinstance(output, tuple):
+        output = output[0]
+    return output.astype(np.int16)
+
+
+@pytest.mark.parametrize('algorithm', ['exg', 'exgr', 'maxg', 'nexg', 'exhsv'])
+def test_fixed_matches_numpy(algorithm):
+    implementations = GreenOnBrown().implementations[algorithm]
+    for frame in corpus():
+        reference = as_grey(implementations['numpy'](frame))
+        assert np.abs(as_grey(implementations['fixed'](frame)) - reference).max() <= 1
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from benchmarks.common import synthetic_field
+from utils.greenonbrown import GreenOnBrown
+
+
+@pytest.mark.parametrize('algorithm', ['exg', 'nexg', 'hsv'])
+def test_cached_index_matches_a_fresh_threshold(algorithm):
+    frame = synthetic_field((640, 480), weeds=20)
+    detector = GreenOnBrown(algorithm=algorithm, index_cache=True)
+
+    # the same frame again with new thresholds only re-thresholds the cached index
+    detector.compile(algorithm, exg_min=25, exg_max=200, hue_min=30)(frame)
+    _, boxes, centres, _ = detector.compile(algorithm, exg_min=40, exg_max=180, hue_min=40)(frame)
+
+    fresh = GreenOnBrown(algorithm=algorithm).compile(algorithm, exg_min=40, exg_max=180, hue_min=40)
+    _, expected_boxes, expected_centres, _ = fresh(frame)
+    assert len(boxes) == len(expected_boxes) > 0
+    assert np.array_equal(boxes, expected_boxes)
+    assert np.array_equal(centres, expected_centres)
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from benchmarks.common import synthetic_field
+from utils.greenonbrown import GreenOnBrown
+
+
+@pytest.mark.parametrize('algorithm', ['exg', 'exgr', 'nexg', 'hsv'])
+@pytest.mark.parametrize('threshold_method', ['gaussian', 'box'])
+def test_strips_match_one_thread(algorithm, threshold_method):
+    frame = synthetic_field((640, 480), weeds=20)
+
+    detector = GreenOnBrown(algorithm=algorithm, threshold_method=threshold_method)
+    expected = detector.frame_mask(frame, detector.compile(algorithm, exg_min=25, exg_max=200))
+
+    detector = GreenOnBrown(algorithm=algorithm, threshold_method=threshold_method, workers=3)
+    compiled = detector.compile(algorithm, exg_min=25, exg_max=200)
+    assert compiled.strip_safe
+    mask = detector.parallel_mask(frame, compiled)
+
+    assert mask is not None
+    assert np.array_equal(mask, expected)
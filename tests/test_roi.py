@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+from utils.greenonbrown import GreenOnBrown
+from utils.roi_manager import ProcessingROI
+
+SOIL = (60, 90, 120)
+PLANT = (40, 160, 60)
+
+
+def field(plants, shape=(480, 640)):
+    """Plain soil with a green square of side 20 at each (x, y) top left corner."""
+    frame = np.empty(shape + (3,), dtype=np.uint8)
+    frame[:] = SOIL
+    for x, y in plants:
+        cv2.rectangle(frame, (x, y), (x + 19, y + 19), PLANT, -1)
+    return frame
+
+
+def detect(frame, roi=None):
+    detector = GreenOnBrown(algorithm='exg', roi=roi)
+    _, boxes, centres, _ = detector.inference(frame, algorithm='exg', exg_min=25, exg_max=200, min_detection_area=10)
+    return np.asarray(boxes).reshape(-1, 4), np.asarray(centres).reshape(-1, 2)
+
+
+def test_detections_are_in_full_frame_coordinates():
+    frame = field([(400, 300)])
+    roi = ProcessingROI(top=0.5, left=0.25)
+
+    (full_boxes, full_centres), (boxes, centres) = detect(frame), detect(frame, roi=roi)
+
+    assert len(full_boxes) == len(boxes) == 1
+    assert np.array_equal(full_boxes, boxes)
+    assert np.array_equal(full_centres, centres)
+
+
+def test_plants_outside_the_band_are_ignored():
+    roi = ProcessingROI(top=0.5, left=0.25)
+    boxes, _ = detect(field([(400, 100), (50, 300), (400, 300)]), roi=roi)
+
+    assert len(boxes) == 1
+    assert boxes[0, 0] >= 0.25 * 640 and boxes[0, 1] >= 0.5 * 480
+
+
+def test_excluded_rectangles_are_cleared():
+    roi = ProcessingROI(exclude=[(0.5, 0.5, 1.0, 1.0)])
+    boxes, _ = detect(field([(100, 100), (400, 300)]), roi=roi)
+
+    assert len(boxes) == 1
+    assert boxes[0, 0] < 320
+
+
+def test_outside_exclusions_matches_the_exclusion_mask():
+    # GreenOnGreen has no mask to clear, so it drops boxes by their centre instead
+    roi = ProcessingROI(top=0.25, exclude=[(0.5, 0.5, 1.0, 1.0), (0.0, 0.9, 0.1, 1.0)])
+    shape = (480, 640)
+    ys, xs = np.mgrid[0:480:7, 0:640:7]
+    centres = np.stack([xs.ravel(), ys.ravel()], axis=1)
+
+    y0, y1, x0, x1 = roi.bounds(shape)
+    band = (centres[:, 1] >= y0) & (centres[:, 1] < y1) & (centres[:, 0] >= x0) & (centres[:, 0] < x1)
+    expected = roi.exclusion_mask(shape)[centres[band, 1] - y0, centres[band, 0] - x0] > 0
+
+    assert np.array_equal(roi.outside_exclusions(centres[band], shape), expected)
+    assert not roi.outside_exclusions([[600, 400]], shape)[0]
+    assert roi.outside_exclusions([[100, 400]], shape)[0]
@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+
+from utils.greenonbrown import GreenOnBrown
+from utils.thresholding import OtsuThreshold
+
+
+def bimodal_index(low, high):
+    index = np.full((100, 100), low, dtype=np.uint8)
+    index[:, 50:] = high
+    return index
+
+
+def test_otsu_level_is_reused_between_updates():
+    thresholder = OtsuThreshold(update_interval=3)
+    thresholder(bimodal_index(10, 100))
+    level = thresholder.level
+
+    # the level isn't recomputed until update_interval frames have used it
+    mask = thresholder(bimodal_index(100, 200))
+    assert thresholder.level == level
+    assert np.all(mask == 255)
+
+    thresholder(bimodal_index(100, 200))
+    thresholder(bimodal_index(100, 200))
+    assert 100 <= thresholder.level < 200
+
+
+def test_otsu_reset():
+    thresholder = OtsuThreshold(update_interval=30)
+    thresholder(bimodal_index(10, 100))
+    thresholder.reset()
+
+    thresholder(bimodal_index(100, 200))
+    assert 100 <= thresholder.level < 200
+
+
+def test_rebuilt_detector_recomputes_the_otsu_level():
+    frame = np.empty((240, 320, 3), dtype=np.uint8)
+    frame[:] = (60, 90, 120)
+    for x in range(20, 300, 60):
+        cv2.circle(frame, (x, 120), 10, (40, 160, 60), -1)
+
+    detector = GreenOnBrown(algorithm='exg', threshold_method='otsu')
+    detector.inference(frame, exg_min=0, exg_max=255)
+    _, boxes, _, _ = detector.inference(frame, exg_min=25, exg_max=200)
+
+    fresh = GreenOnBrown(algorithm='exg', threshold_method='otsu')
+    _, expected, _, _ = fresh.inference(frame, exg_min=25, exg_max=200)
+    assert len(boxes) == len(expected) == 5
+    assert np.array_equal(boxes, expected)
+
+
+def test_flat_index_gives_an_empty_mask():
+    thresholder = OtsuThreshold(update_interval=30)
+    mask = thresholder(np.full((100, 100), 25, dtype=np.uint8))
+
+    assert not mask.any()
+    assert thresholder.level is None
+
+    # nothing is kept from the flat frame, the next one gets its own level
+    thresholder(bimodal_index(25, 100))
+    assert 25 <= thresholder.level < 100
+
+
+def test_bare_soil_has_no_detections():
+    soil = np.empty((240, 320, 3), dtype=np.uint8)
+    soil[:] = (60, 90, 120)
+
+    detector = GreenOnBrown(algorithm='exg', threshold_method='otsu')
+    _, boxes, _, _ = detector.inference(soil, exg_min=25, exg_max=200)
+    assert len(boxes) == 0
+
+
+def test_pyramid_counts_one_frame():
+    frame = np.empty((480, 640, 3), dtype=np.uint8)
+    frame[:] = (60, 90, 120)
+    for x in range(40, 600, 120):
+        cv2.circle(frame, (x, 240), 10, (40, 160, 60), -1)
+
+    detector = GreenOnBrown(algorithm='exg', threshold_method='otsu', pyramid_scale=2)
+    detector.inference(frame, exg_min=25, exg_max=200)
+    detector.inference(frame, exg_min=25, exg_max=200)
+
+    assert detector.get_thresholder('exg').frames_since_update == 2
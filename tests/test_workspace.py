@@ -0,0 +1,28 @@
+import tracemalloc
+
+import pytest
+
+from benchmarks.common import synthetic_field
+from utils.greenonbrown import GreenOnBrown
+
+# same bound as benchmarks/benchmark_workspace.py --check, a 640x480 frame is 300 kB per plane
+MAX_KB = 256
+
+
+@pytest.mark.parametrize('implementation', ['numpy', 'fixed'])
+@pytest.mark.parametrize('algorithm', ['exg', 'exgr', 'nexg', 'exhsv', 'hsv'])
+def test_steady_state_allocation(algorithm, implementation):
+    frame = synthetic_field((640, 480))
+    detector = GreenOnBrown(algorithm=algorithm, implementation=implementation)
+    for _ in range(3):
+        detector.inference(frame, algorithm=algorithm)
+
+    tracemalloc.start()
+    try:
+        for _ in range(3):
+            detector.inference(frame, algorithm=algorithm)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak / 1024 < MAX_KB
@@ -1,77 +1,89 @@
 import numpy as np
 import cv2
 
+from utils.frame_features import FrameFeatures
+from utils.frame_formats import split_yuv420, yuv_coefficients
+from utils.preprocessing import get_clahe
+from utils.workspace import scratch
+
 ### Adding a new algorithm ###
 """
 To add a new algorithm the only requirement is that it accepts a BGR (opencv) image and returns a grayscale
 image as an output. If it returns a binary image (like hsv) then it must return a boolean True in addition to the image
 as it has already been thresholded.
+Algorithms can optionally accept a features argument (utils.frame_features.FrameFeatures) to share channel planes
+and other indices with the algorithms run on the same frame, and a workspace argument (utils.workspace.Workspace) to
+write into preallocated buffers.
 """
 ##############################
 
-def exg(image):
+def exg(image, features=None, workspace=None):
     """
     Takes an image and processes it using ExG. Returns a single channel exG output.
     Developed by Woebbecke et al. 1995.
+    :param features: optional FrameFeatures of the image to share channel planes with other algorithms
+    :param workspace: optional Workspace to write into when no features are given
     :return: grayscale image
     """
-    # using array slicing to split into channels
-    blue = image[:, :, 0].astype(np.float32)
-    green = image[:, :, 1].astype(np.float32)
-    red = image[:, :, 2].astype(np.float32)
+    features = features if features is not None else FrameFeatures(image, workspace=workspace)
     # cv2.imshow('blue', blue.astype('uint8'))
     # cv2.imshow('green', green.astype('uint8'))
     # cv2.imshow('red', red.astype('uint8'))
 
-    image_out = 2 * green - red - blue
-    image_out = np.clip(image_out, 0, 255)
-    image_out = image_out.astype('uint8')
+    image_out = np.multiply(features.green, 2, out=features.buffer('exg'))
+    image_out -= features.red
+    image_out -= features.blue
+    np.clip(image_out, 0, 255, out=image_out)
+    output = features.buffer('exg_index', np.uint8)
+    np.copyto(output, image_out, casting='unsafe')
 
     # cv2.imshow('ExG', imgOut)
-    return image_out
+    return output
 
-def maxg(image):
+def maxg(image, features=None, workspace=None):
     '''
     Takes an input image in int8 format and calculates the 'maxg' algorithm based on the following publication:
     'Weed Identification Using Deep Learning and Image Processing in Vegetable Plantation', Jin et al. 2021
     :param image: image as a BGR array (i.e. opened with opencv not PIL)
+    :param features: optional FrameFeatures of the image to share channel planes with other algorithms
+    :param workspace: optional Workspace to write into when no features are given
     :return: grayscale image
     '''
-    # using array slicing to split into channels with float32 for calculation
-    blue = image[:, :, 0].astype(np.float32)
-    green = image[:, :, 1].astype(np.float32)
-    red = image[:, :, 2].astype(np.float32)
+    features = features if features is not None else FrameFeatures(image, workspace=workspace)
 
-    image_out = 24 * green - 19 * red - 2 * blue
-    image_out = (image_out / np.amax(image_out)) * 255 # scale image between 0 - 255
-    image_out = image_out.astype('uint8')
+    image_out = np.multiply(features.green, 24, out=features.buffer('maxg'))
+    channel_term = np.multiply(features.red, 19, out=features.buffer('maxg_term'))
+    image_out -= channel_term
+    image_out -= np.multiply(features.blue, 2, out=channel_term)
+    image_out /= np.amax(image_out)
+    image_out *= 255 # scale image between 0 - 255
+    output = features.buffer('maxg_index', np.uint8)
+    np.copyto(output, image_out, casting='unsafe')
 
-    return image_out
+    return output
 
-def exg_standardised(image):
+def exg_standardised(image, features=None, workspace=None):
     '''
     Takes an input image in int8 format and calculates the standardised ExG algorithm
     :param image: image as a BGR array (i.e. opened with opencv not PIL)
+    :param features: optional FrameFeatures of the image to share channel planes with other algorithms
+    :param workspace: optional Workspace to write into when no features are given
     :return: returns a grayscale image
     '''
-    blue = image[:, :, 0].astype(np.float32)
-    green = image[:, :, 1].astype(np.float32)
-    red = image[:, :, 2].astype(np.float32)
-    channel_sum = red + green + blue
-    channel_sum = np.where(channel_sum == 0, 1, channel_sum)
-
-    b = blue / channel_sum
-    g = green / channel_sum
-    r = red / channel_sum
+    features = features if features is not None else FrameFeatures(image, workspace=workspace)
+    b, g, r = features.chromaticity
 
-    image_out = 255 * (2 * g - r - b)
-    image_out = np.where(image_out < 0, 0, image_out)
-    image_out = np.where(image_out > 255, 255, image_out)
+    image_out = np.multiply(g, 2, out=features.buffer('nexg'))
+    image_out -= r
+    image_out -= b
+    image_out *= 255
+    np.clip(image_out, 0, 255, out=image_out)
 
-    image_out = image_out.astype('uint8')
+    output = features.buffer('nexg_index', np.uint8)
+    np.copyto(output, image_out, casting='unsafe')
     # cv2.imshow('ExG Standardised', imgOut)
 
-    return image_out
+    return output
 
 def exg_standardised_hue(image,
                          hue_min=30,
@@ -80,7 +92,9 @@ def exg_standardised_hue(image,
                          brightness_max=220,
                          saturation_min=30,
                          saturation_max=255,
-                         invert_hue=False):
+                         invert_hue=False,
+                         features=None,
+                         workspace=None):
     '''
     Takes an image and performs a combined ExG + HSV algorithm
     :param image: image as a BGR array (i.e. opened with opencv not PIL)
@@ -91,52 +105,43 @@ def exg_standardised_hue(image,
     :param saturation_min: minimum saturation
     :param saturation_max: maximum saturation
     :param invert_hue: inverts the hue threshold to exclude anything within the thresholds
+    :param features: optional FrameFeatures, reusing nexg and hsv if they have already been run on the frame
+    :param workspace: optional Workspace to write into when no features are given
     :return: returns a grayscale image
     '''
-
-    blue = image[:, :, 0].astype(np.float32)
-    green = image[:, :, 1].astype(np.float32)
-    red = image[:, :, 2].astype(np.float32)
-
-    channel_sum = red + green + blue
-    channel_sum = np.where(channel_sum == 0, 1, channel_sum)
-
-    b = blue / channel_sum
-    g = green / channel_sum
-    r = red / channel_sum
-
-    image_out = 255 * (2 * g - r - b)
-    image_out = np.where(image_out < 0, 0, image_out)
-    image_out = np.where(image_out > 255, 255, image_out)
-
-    image_out = image_out.astype('uint8')
-
-    hsv_thresh, _ = hsv(image,
-                       hue_min=hue_min, hue_max=hue_max,
-                       brightness_min=brightness_min, brightness_max=brightness_max,
-                       saturation_min=saturation_min, saturation_max=saturation_max,
-                       invert_hue=invert_hue)
-    image_out = hsv_thresh & image_out
+    features = features if features is not None else FrameFeatures(image, workspace=workspace)
+
+    image_out = features.index(exg_standardised)
+    hsv_thresh, _ = features.index(hsv,
+                                   hue_min=hue_min, hue_max=hue_max,
+                                   brightness_min=brightness_min, brightness_max=brightness_max,
+                                   saturation_min=saturation_min, saturation_max=saturation_max,
+                                   invert_hue=invert_hue, workspace=features.workspace)
+    image_out = np.bitwise_and(hsv_thresh, image_out, out=features.buffer('exhsv_index', np.uint8))
     # cv2.imshow('exhu', imgOut)
 
     return image_out
 
-def exgr(image):
+def exgr(image, features=None, workspace=None):
     '''
     performs the ExGR algorithm on the input image
     :param image: image as a BGR array (i.e. opened with opencv not PIL)
+    :param features: optional FrameFeatures, reusing exg if it has already been run on the frame
+    :param workspace: optional Workspace to write into when no features are given
     :return: returns a grayscale image
     '''
-    green = image[:, :, 1].astype(np.float32)
-    red = image[:, :, 2].astype(np.float32)
+    features = features if features is not None else FrameFeatures(image, workspace=workspace)
 
-    exg_image = exg(image)
-    image_out = exg_image - (1.4 * red - green)
+    exg_image = features.index(exg)
+    red_term = np.multiply(features.red, 1.4, out=features.buffer('exgr'))
+    red_term -= features.green
+    image_out = np.subtract(exg_image, red_term, out=red_term)
 
-    image_out = np.clip(image_out, 0, 255)
-    image_out = image_out.astype('uint8')
+    np.clip(image_out, 0, 255, out=image_out)
+    output = features.buffer('exgr_index', np.uint8)
+    np.copyto(output, image_out, casting='unsafe')
 
-    return image_out
+    return output
 
 def hsv(image,
         hue_min=30,
@@ -145,7 +150,9 @@ def hsv(image,
         brightness_max=220,
         saturation_min=30,
         saturation_max=255,
-        invert_hue=False):
+        invert_hue=False,
+        workspace=None,
+        features=None):
 
     """
     Performs an HSV thresholding operation on the input image
@@ -157,17 +164,34 @@ def hsv(image,
     :param saturation_min: minimum saturation threshold
     :param saturation_max: maximum saturation threshold
     :param invert_hue: inverts the hue threshold to exclude anything within the thresholds
+    :param workspace: optional Workspace to write into instead of allocating new arrays
+    :param features: optional FrameFeatures to reuse the HSV conversion of the frame
     :return: returns a binary image and boolean thresholded or not
     """
-
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    hue = image[:, :, 0]
-    sat = image[:, :, 1]
-    val = image[:, :, 2]
-
-    hue_thresh = cv2.inRange(hue, hue_min, hue_max)
-    sat_thresh = cv2.inRange(sat, saturation_min, saturation_max)
-    val_thresh = cv2.inRange(val, brightness_min, brightness_max)
+    if workspace is not None:
+        # same result as below, with one three-channel inRange when the hue isn't inverted
+        if features is not None:
+            image = features.hsv
+        else:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=workspace.get('hsv', channels=3))
+        out_thresh = workspace.get('hsv_thresh')
+        if not invert_hue:
+            cv2.inRange(image, (hue_min, saturation_min, brightness_min), (hue_max, saturation_max, brightness_max),
+                        dst=out_thresh)
+            return out_thresh, True
+
+        hue_thresh = cv2.inRange(image, (hue_min, 0, 0), (hue_max, 255, 255), dst=workspace.get('hue_thresh'))
+        cv2.bitwise_not(hue_thresh, dst=hue_thresh)
+        cv2.inRange(image, (0, saturation_min, brightness_min), (255, saturation_max, brightness_max),
+                    dst=out_thresh)
+        cv2.bitwise_and(out_thresh, hue_thresh, dst=out_thresh)
+        return out_thresh, True
+
+    features = features if features is not None else FrameFeatures(image)
+
+    hue_thresh = cv2.inRange(features.hue, hue_min, hue_max)
+    sat_thresh = cv2.inRange(features.sat, saturation_min, saturation_max)
+    val_thresh = cv2.inRange(features.val, brightness_min, brightness_max)
 
     # allow users to select purple/red colour ranges by excluding green
     if invert_hue:
@@ -225,7 +249,7 @@ def clahe_sat_val(image):
     sat = image[:, :, 1]
     val = image[:, :, 2]
 
-    clahe = cv2.createCLAHE(clipLimit=20, tileGridSize=(64,64))
+    clahe = get_clahe(image.shape, clip_limit=20, tile_grid_size=(64, 64))
     satCL = clahe.apply(sat)
     valCL = clahe.apply(val)
 
@@ -249,6 +273,292 @@ def dgci(image):
 
     return imgOut
 
+##### FIXED-POINT ALGORITHMS
+# Integer implementations of exg, exgr, maxg, nexg and exhsv. These avoid the three float32 channel copies and
+# match the float versions to within +/- 1 grey level. Select them with implementation='fixed' in GreenOnBrown.
+
+# 255 * 2^16 / channel_sum for every possible channel sum (0 - 765). A sum of zero is treated as 1, as in
+# exg_standardised, so normalised indices become a table lookup and an integer multiply instead of a division.
+RECIPROCAL_SHIFT = 16
+RECIPROCAL_TABLE = np.round((255 << RECIPROCAL_SHIFT) / np.maximum(np.arange(766), 1)).astype(np.int32)
+
+def exg_fixed(image, workspace=None):
+    """
+    Fixed-point version of exg using int16 arithmetic.
+    :param image: image as a BGR array (i.e. opened with opencv not PIL)
+    :param workspace: optional Workspace to write into instead of allocating new arrays
+    :return: grayscale image
+    """
+    image_out = scratch(workspace, 'exg_i16', image.shape, np.int16)
+    np.left_shift(image[:, :, 1], 1, out=image_out, dtype=np.int16)
+    image_out -= image[:, :, 2]
+    image_out -= image[:, :, 0]
+    np.clip(image_out, 0, 255, out=image_out)
+
+    output = scratch(workspace, 'index', image.shape)
+    np.copyto(output, image_out, casting='unsafe')
+
+    return output
+
+def exgr_fixed(image, workspace=None):
+    """
+    Fixed-point version of exgr. The 1.4 * red term is evaluated as (5 * (exg + green) - 7 * red) / 5 in int16.
+    :param image: image as a BGR array (i.e. opened with opencv not PIL)
+    :param workspace: optional Workspace to write into instead of allocating new arrays
+    :return: grayscale image
+    """
+    green = image[:, :, 1]
+    red = image[:, :, 2]
+
+    image_out = scratch(workspace, 'exg_i16', image.shape, np.int16)
+    np.left_shift(green, 1, out=image_out, dtype=np.int16)
+    image_out -= red
+    image_out -= image[:, :, 0]
+    np.clip(image_out, 0, 255, out=image_out)
+
+    red_term = scratch(workspace, 'red_i16', image.shape, np.int16)
+    np.multiply(red, 7, out=red_term, dtype=np.int16)
+
+    image_out += green
+    image_out *= 5
+    image_out -= red_term
+    image_out //= 5
+    np.clip(image_out, 0, 255, out=image_out)
+
+    output = scratch(workspace, 'index', image.shape)
+    np.copyto(output, image_out, casting='unsafe')
+
+    return output
+
+def maxg_fixed(image, workspace=None):
+    """
+    Fixed-point version of maxg. The response is computed in int32, then scaled in float32 in the same order as
+    maxg and cast the same way, so negative responses wrap when cast to uint8 exactly as they do in maxg.
+    :param image: image as a BGR array (i.e. opened with opencv not PIL)
+    :param workspace: optional Workspace to write into instead of allocating new arrays
+    :return: grayscale image
+    """
+    image_out = scratch(workspace, 'maxg_i32', image.shape, np.int32)
+    channel_term = scratch(workspace, 'channel_i32', image.shape, np.int32)
+
+    np.multiply(image[:, :, 1], 24, out=image_out, dtype=np.int32)
+    np.multiply(image[:, :, 2], 19, out=channel_term, dtype=np.int32)
+    image_out -= channel_term
+    np.multiply(image[:, :, 0], 2, out=channel_term, dtype=np.int32)
+    image_out -= channel_term
+
+    # the response is at most 24 * 255, well inside the 24 bit float32 mantissa, so the copy is exact
+    scaled = scratch(workspace, 'maxg_f32', image.shape, np.float32)
+    np.copyto(scaled, image_out, casting='unsafe')
+    scaled /= np.float32(image_out.max())
+    scaled *= np.float32(255)
+
+    output = scratch(workspace, 'index', image.shape)
+    np.copyto(output, scaled, casting='unsafe')
+
+    return output
+
+def exg_standardised_fixed(image, workspace=None):
+    """
+    Fixed-point version of exg_standardised. The division by the channel sum is replaced by a lookup into
+    RECIPROCAL_TABLE followed by an integer multiply and shift.
+    :param image: image as a BGR array (i.e. opened with opencv not PIL)
+    :param workspace: optional Workspace to write into instead of allocating new arrays
+    :return: grayscale image
+    """
+    blue = image[:, :, 0]
+    green = image[:, :, 1]
+    red = image[:, :, 2]
+
+    # intp so np.take can index with it directly
+    channel_sum = scratch(workspace, 'sum_intp', image.shape, np.intp)
+    np.add(blue, green, out=channel_sum, dtype=np.intp)
+    channel_sum += red
+
+    image_out = scratch(workspace, 'nexg_i32', image.shape, np.int32)
+    np.left_shift(green, 1, out=image_out, dtype=np.int32)
+    image_out -= red
+    image_out -= blue
+    np.maximum(image_out, 0, out=image_out)
+
+    reciprocal = scratch(workspace, 'reciprocal_i32', image.shape, np.int32)
+    np.take(RECIPROCAL_TABLE, channel_sum, out=reciprocal, mode='clip')
+    image_out *= reciprocal
+    image_out >>= RECIPROCAL_SHIFT
+    np.minimum(image_out, 255, out=image_out)
+
+    output = scratch(workspace, 'index', image.shape)
+    np.copyto(output, image_out, casting='unsafe')
+
+    return output
+
+def exg_standardised_hue_fixed(image,
+                               hue_min=30,
+                               hue_max=90,
+                               brightness_min=10,
+                               brightness_max=220,
+                               saturation_min=30,
+                               saturation_max=255,
+                               invert_hue=False,
+                               workspace=None):
+    """
+    Fixed-point version of exg_standardised_hue. See exg_standardised_hue for the parameters.
+    :return: returns a grayscale image
+    """
+    image_out = exg_standardised_fixed(image, workspace=workspace)
+
+    hsv_thresh, _ = hsv(image,
+                        hue_min=hue_min, hue_max=hue_max,
+                        brightness_min=brightness_min, brightness_max=brightness_max,
+                        saturation_min=saturation_min, saturation_max=saturation_max,
+                        invert_hue=invert_hue, workspace=workspace)
+    cv2.bitwise_and(image_out, hsv_thresh, dst=image_out)
+
+    return image_out
+
+##### LINEAR ALGORITHMS
+class LinearIndex:
+    def __init__(self, blue, green, red, offset=0.0, normalise=False):
+        """
+        Any index that is a linear combination of the B, G and R channels plus an offset, computed in a single
+        cv2.transform pass with a saturating uint8 output instead of three float32 channel copies.
+        :param blue: blue channel coefficient
+        :param green: green channel coefficient
+        :param red: red channel coefficient
+        :param offset: added to every pixel before clipping to 0 - 255
+        :param normalise: scale the positive response by 255 / frame maximum (as maxg does) instead of clipping
+        """
+        self.coefficients = (float(blue), float(green), float(red), float(offset))
+        self.normalise = normalise
+        self.matrix = np.array([self.coefficients], dtype=np.float32)
+
+    @classmethod
+    def from_string(cls, value):
+        """
+        Parse 'blue, green, red[, offset]' as used in the [LinearIndices] config section.
+        """
+        values = [float(v) for v in value.split(',')]
+        if len(values) not in (3, 4):
+            raise ValueError(f"Expected 'blue, green, red[, offset]', got '{value}'")
+
+        return cls(*values)
+
+    def __call__(self, image, workspace=None):
+        return self._transform(image, self.matrix, workspace=workspace)
+
+    def yuv420(self, frame, workspace=None):
+        """
+        The same index on a full range I420 frame (see utils.frame_formats), evaluated at chroma resolution. Indices
+        whose weights sum to 0, like ExG, don't depend on Y and only read the U and V planes.
+        :param frame: planar I420 frame of shape (height * 3 / 2, width)
+        :return: grayscale image of half the frame height and width
+        """
+        _, u, v = split_yuv420(frame)
+        luma, cb, cr = self.yuv_coefficients
+        offset = self.coefficients[3] - 128 * (cb + cr)
+        if luma == 0 and not self.normalise:
+            return cv2.addWeighted(u, cb, v, cr, offset, dst=scratch(workspace, 'chroma_index', u.shape))
+
+        planes = cv2.merge((luma_at_chroma(frame, workspace=workspace), u, v),
+                           dst=scratch(workspace, 'chroma_planes', u.shape, channels=3))
+        matrix = np.array([[luma, cb, cr, offset]], dtype=np.float32)
+        return self._transform(planes, matrix, workspace=workspace, prefix='chroma_')
+
+    @property
+    def yuv_coefficients(self):
+        return yuv_coefficients(*self.coefficients[:3])
+
+    def _transform(self, image, matrix, workspace=None, prefix=''):
+        output = scratch(workspace, f'{prefix}index', image.shape)
+        if not self.normalise:
+            return cv2.transform(image, matrix, dst=output)
+
+        # int16 holds the unclipped response of any 8-bit weights, e.g. 24 * 255 for maxg
+        source = scratch(workspace, f'{prefix}linear_source', image.shape, np.int16, channels=3)
+        np.copyto(source, image)
+        response = cv2.transform(source, matrix,
+                                 dst=scratch(workspace, f'{prefix}linear_i16', image.shape, np.int16))
+        np.maximum(response, 0, out=response)
+
+        max_value = int(response.max())
+        if max_value == 0:
+            output.fill(0)
+            return output
+
+        return cv2.convertScaleAbs(response, dst=output, alpha=255.0 / max_value)
+
+    def __repr__(self):
+        return f"LinearIndex{self.coefficients}"
+
+
+# the built-in linear indices. EXGR (3g - 2.4r - b) and MAXG are the approximate 'linear' exgr and maxg: EXGR drops
+# the clip of the ExG term inside exgr, so it differs where blue dominates, and MAXG sets the negative responses maxg
+# wraps to 0. EXG is exact but slower than the numpy exg, so it is only used for the yuv420 indices. CIVE is lower
+# for plants, so it isn't a GreenOnBrown algorithm and is only compared in benchmark_indices.py.
+EXG = LinearIndex(-1, 2, -1)
+EXGR = LinearIndex(-1, 3, -2.4)
+MAXG = LinearIndex(-2, 24, -19, normalise=True)
+CIVE = LinearIndex(0.385, -0.881, 0.441, 18.78745)
+
+##### YUV420 ALGORITHMS
+"""
+These take a full range BT.601 I420 frame (utils.frame_formats) straight from the camera instead of a BGR image and
+return the index at chroma resolution, half the frame height and width. Y is averaged down to the chroma resolution
+where an index needs it. The hsv and exhsv versions are ChromaThresholdLUT objects in utils.lut_manager.
+"""
+# R + G + B and 1.4R - G in terms of Y, Cb' and Cr'
+CHANNEL_SUM_YUV = yuv_coefficients(1, 1, 1)
+EXGR_RED_TERM_YUV = yuv_coefficients(0, -1, 1.4)
+
+
+def luma_at_chroma(frame, workspace=None):
+    """Y plane of an I420 frame averaged over each 2x2 block, so it lines up with the U and V planes."""
+    y, u, _ = split_yuv420(frame)
+    return cv2.resize(y, (u.shape[1], u.shape[0]), interpolation=cv2.INTER_AREA,
+                      dst=scratch(workspace, 'chroma_luma', u.shape))
+
+
+def exgr_yuv420(frame, workspace=None):
+    """
+    ExGR of an I420 frame. As in exgr the ExG term is clipped to 0 - 255 before 1.4R - G is subtracted.
+    :param frame: planar I420 frame of shape (height * 3 / 2, width)
+    :return: grayscale image of half the frame height and width
+    """
+    _, u, v = split_yuv420(frame)
+    exg_image = EXG.yuv420(frame, workspace=workspace)
+    planes = cv2.merge((exg_image, luma_at_chroma(frame, workspace=workspace), u, v),
+                       dst=scratch(workspace, 'chroma_planes_4', u.shape, channels=4))
+
+    luma, cb, cr = EXGR_RED_TERM_YUV
+    matrix = np.array([[1, -luma, -cb, -cr, 128 * (cb + cr)]], dtype=np.float32)
+    return cv2.transform(planes, matrix, dst=scratch(workspace, 'chroma_exgr', u.shape))
+
+
+def exg_standardised_yuv420(frame, workspace=None):
+    """
+    Standardised ExG of an I420 frame, 255 * ExG / (R + G + B), where ExG only depends on the chroma planes.
+    :param frame: planar I420 frame of shape (height * 3 / 2, width)
+    :return: grayscale image of half the frame height and width
+    """
+    _, u, v = split_yuv420(frame)
+    _, exg_cb, exg_cr = EXG.yuv_coefficients
+    exg_image = cv2.addWeighted(u, exg_cb, v, exg_cr, -128 * (exg_cb + exg_cr), dtype=cv2.CV_32F,
+                                dst=scratch(workspace, 'chroma_exg_f32', u.shape, np.float32))
+
+    luma, cb, cr = CHANNEL_SUM_YUV
+    channel_sum = scratch(workspace, 'chroma_sum_f32', u.shape, np.float32)
+    np.multiply(luma_at_chroma(frame, workspace=workspace), np.float32(luma), out=channel_sum)
+    channel_sum += cv2.addWeighted(u, cb, v, cr, -128 * (cb + cr), dtype=cv2.CV_32F,
+                                   dst=scratch(workspace, 'chroma_term_f32', u.shape, np.float32))
+    np.maximum(channel_sum, 1, out=channel_sum)
+
+    cv2.divide(exg_image, channel_sum, dst=exg_image, scale=255)
+    np.clip(exg_image, 0, 255, out=exg_image)
+
+    output = scratch(workspace, 'chroma_nexg', u.shape)
+    np.copyto(output, exg_image, casting='unsafe')
+    return output
+
 ##### BLUR ALGORITHMS
 # some algorithms developed with the help of Chat-GPT!
 # used before passing image into blur algorithms
@@ -338,4 +648,114 @@ def gradient_blur(image):
     gradient_magnitude = np.sqrt(np.square(sobelx) + np.square(sobely))
     blurriness = np.sum(gradient_magnitude) / (grey.shape[0] * grey.shape[1])
 
-    return blurriness
\ No newline at end of file
+    return blurriness
+
+##### FAST BLUR ALGORITHMS
+"""
+Faster versions of the blur metrics above for use on the live detection path. They take the grey image from
+focus_grey, which converts the frame once, crops a centre ROI and decimates it, and then work in float32. The values
+are on a different scale to the full-frame versions, but rank frames by focus in the same order.
+"""
+def focus_grey(image, roi=0.5, decimation=2, features=None):
+    """
+    Grey centre crop of a frame for the fast blur metrics.
+    :param image: BGR or grey image
+    :param roi: fraction of the frame width and height kept around the centre
+    :param decimation: integer downsampling factor applied after cropping, 1 keeps every pixel
+    :param features: optional FrameFeatures of the image to reuse its grey conversion
+    :return: float32 grey image
+    """
+    if image.ndim == 2:
+        grey = image
+    elif features is not None:
+        grey = features.grey
+    else:
+        grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    height, width = grey.shape
+    crop_height, crop_width = max(1, int(height * roi)), max(1, int(width * roi))
+    top, left = (height - crop_height) // 2, (width - crop_width) // 2
+    grey = grey[top:top + crop_height, left:left + crop_width]
+
+    if decimation > 1:
+        grey = cv2.resize(grey, (max(1, crop_width // decimation), max(1, crop_height // decimation)),
+                          interpolation=cv2.INTER_AREA)
+
+    return grey.astype(np.float32)
+
+
+def fft_blur_fast(grey, size=60, roi=0.5, decimation=2):
+    """
+    fft_blur with a real FFT in float32. Removing the low frequencies is done without fftshift by zeroing the
+    corners of the half spectrum.
+    :param grey: float32 grey image from focus_grey
+    :param size: low frequency half-width of the full frame version, scaled by roi / decimation so the same share of
+                 the spectrum is removed from the cropped and decimated image
+    :param roi: the roi passed to focus_grey
+    :param decimation: the decimation passed to focus_grey
+    """
+    size = max(1, int(round(size * roi / decimation)))
+    spectrum = np.fft.rfft2(grey)
+    spectrum[:size, :size] = 0
+    spectrum[-size:, :size] = 0
+    recon = np.fft.irfft2(spectrum, s=grey.shape)
+
+    magnitude = np.abs(recon)
+    np.maximum(magnitude, np.finfo(np.float32).tiny, out=magnitude)
+    return float(20 * np.log(magnitude).mean())
+
+
+def laplacian_blur_fast(grey):
+    _, std = cv2.meanStdDev(cv2.Laplacian(grey, cv2.CV_32F))
+    return float(std[0, 0] ** 2)
+
+
+def variance_of_gradient_blur_fast(grey):
+    sobelx = cv2.Sobel(grey, cv2.CV_32F, 1, 0, ksize=3)
+    sobely = cv2.Sobel(grey, cv2.CV_32F, 0, 1, ksize=3)
+    _, std = cv2.meanStdDev(cv2.magnitude(sobelx, sobely))
+    return float(std[0, 0] ** 2)
+
+
+def tenengrad_blur_fast(grey):
+    sobelx = cv2.Sobel(grey, cv2.CV_32F, 1, 0, ksize=5)
+    sobely = cv2.Sobel(grey, cv2.CV_32F, 0, 1, ksize=5)
+    return (cv2.norm(sobelx, cv2.NORM_L2SQR) + cv2.norm(sobely, cv2.NORM_L2SQR)) / grey.size
+
+
+def gradient_blur_fast(grey):
+    sobelx = cv2.Sobel(grey, cv2.CV_32F, 1, 0, ksize=3)
+    sobely = cv2.Sobel(grey, cv2.CV_32F, 0, 1, ksize=3)
+    return cv2.mean(cv2.magnitude(sobelx, sobely))[0]
+
+
+FAST_BLUR_METRICS = {
+    'fft': fft_blur_fast,
+    'laplacian': laplacian_blur_fast,
+    'variance_of_gradient': variance_of_gradient_blur_fast,
+    'tenengrad': tenengrad_blur_fast,
+    'gradient': gradient_blur_fast
+}
+
+
+def focus_metrics(image, metrics=('fft',), roi=0.5, decimation=2, size=60, features=None):
+    """
+    Computes several fast blur metrics from a single grey conversion of the frame.
+    :param image: BGR or grey image
+    :param metrics: names from FAST_BLUR_METRICS
+    :param roi: fraction of the frame width and height kept around the centre
+    :param decimation: integer downsampling factor applied after cropping
+    :param size: fft low frequency half-width, as for fft_blur
+    :param features: optional FrameFeatures of the image to reuse its grey conversion
+    :return: dictionary of metric name to value, higher is sharper
+    """
+    grey = focus_grey(image, roi=roi, decimation=decimation, features=features)
+
+    results = {}
+    for metric in metrics:
+        if metric == 'fft':
+            results[metric] = fft_blur_fast(grey, size=size, roi=roi, decimation=decimation)
+        else:
+            results[metric] = FAST_BLUR_METRICS[metric](grey)
+
+    return results
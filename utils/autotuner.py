@@ -0,0 +1,203 @@
+import inspect
+import json
+import platform
+import time
+import numpy as np
+import cv2
+
+from pathlib import Path
+from utils.log_manager import LogManager
+from utils.workspace import Workspace
+
+CACHE_PATH = Path(__file__).resolve().parent.parent / 'cache' / 'autotune.json'
+
+# share of pixels allowed to differ by more than one grey level from the 'numpy' reference
+MAX_MISMATCH = 0.001
+
+# thresholds the hsv and exhsv implementations are validated at, see Autotuner.tune. The exg clip isn't passed, as
+# only the fused numba kernels apply it.
+THRESHOLD_PARAMS = ('hue_min', 'hue_max', 'brightness_min', 'brightness_max', 'saturation_min', 'saturation_max',
+                    'invert_hue')
+
+
+def synthetic_frame(resolution, seed=0):
+    """Brown soil with green plants and noise, so every implementation sees a realistic mix of colours."""
+    rng = np.random.default_rng(seed)
+    width, height = resolution
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = (60, 90, 120)
+    frame = cv2.add(frame, rng.integers(0, 40, frame.shape, dtype=np.uint8))
+
+    for _ in range(30):
+        centre = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        radius = int(rng.integers(3, 25) * width / 640)
+        colour = tuple(int(c) for c in rng.integers((20, 110, 30), (70, 200, 90)))
+        cv2.circle(frame, centre, radius, colour, -1)
+
+    return frame
+
+
+class Autotuner:
+    def __init__(self, board, resolution, cache_path=CACHE_PATH, repeats=20):
+        """
+        Picks the fastest implementation of each GreenOnBrown algorithm on this device with a short benchmark on a
+        synthetic frame. Results are saved to a JSON cache keyed by board, CPU architecture, OpenCV and numpy
+        versions, resolution, lut_bits and the implementations available, and reused until any of those change.
+        :param board: board model, e.g. from get_rpi_version()
+        :param resolution: (width, height) of the camera frames
+        :param cache_path: JSON cache file. None disables the cache.
+        :param repeats: timed calls per implementation
+        """
+        self.board = board
+        self.resolution = tuple(resolution)
+        self.cache_path = Path(cache_path) if cache_path is not None else None
+        self.repeats = repeats
+
+        self.logger = LogManager.get_logger(__name__)
+
+    def key(self, detector):
+        """
+        Everything the cached winners depend on. lut_bits changes the accuracy of the 'lut' tables, and e.g.
+        installing numba adds implementations that haven't been timed.
+        """
+        return {
+            'board': self.board,
+            'machine': platform.machine(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'resolution': list(self.resolution),
+            'lut_bits': detector.lut_bits,
+            'implementations': sorted({name for available in detector.implementations.values() for name in available})
+        }
+
+    def load(self, detector):
+        """Cached winners and timings, or an empty cache if there is none or the key has changed."""
+        key = self.key(detector)
+        empty = {'key': key, 'implementations': {}, 'timings': {}, 'params': {}}
+        if self.cache_path is None or not self.cache_path.exists():
+            return empty
+
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Unable to read autotune cache {self.cache_path}: {e}. Rebuilding.")
+            return empty
+
+        if cache.get('key') != key:
+            self.logger.info("[INFO] Device, OpenCV version, resolution or implementations changed, "
+                             "rebuilding autotune cache")
+            return empty
+
+        cache.setdefault('params', {})
+        return cache
+
+    def save(self, cache):
+        if self.cache_path is None:
+            return
+
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_path, 'w') as f:
+                json.dump(cache, f, indent=2)
+        except OSError as e:
+            self.logger.warning(f"Unable to save autotune cache to {self.cache_path}: {e}")
+
+    def time_implementation(self, func, frame, workspace, params=None):
+        """Mean milliseconds per call and the grey output of an implementation."""
+        parameters = inspect.signature(func).parameters
+        kwargs = {name: value for name, value in (params or {}).items() if name in parameters}
+        if 'workspace' in parameters:
+            kwargs['workspace'] = workspace
+
+        output = func(frame, **kwargs)  # warm up, also compiles lookup tables
+        start = time.perf_counter()
+        for _ in range(self.repeats):
+            func(frame, **kwargs)
+        elapsed = (time.perf_counter() - start) / self.repeats * 1000
+
+        output = func(frame, **kwargs)
+        if isinstance(output, tuple):
+            output = output[0]
+        return elapsed, np.array(output, dtype=np.int16)
+
+    def benchmark(self, detector, algorithm, frame, params=None):
+        """
+        Times every implementation of an algorithm and returns the fastest one whose output matches the 'numpy'
+        reference, with the timings of all of them.
+        :param params: thresholds passed to the implementations that take them, e.g. hue_min for hsv
+        """
+        implementations = detector.implementations[algorithm]
+        workspace = Workspace(frame.shape)
+
+        reference_ms, reference = self.time_implementation(implementations['numpy'], frame, workspace, params)
+        timings = {'numpy': reference_ms}
+        best, best_ms = 'numpy', reference_ms
+
+        for name, func in implementations.items():
+            if name in ('numpy', 'yuv420'):
+                continue
+
+            try:
+                elapsed, output = self.time_implementation(func, frame, workspace, params)
+            except Exception as e:
+                self.logger.warning(f"Skipping {name} implementation of {algorithm}: {e}")
+                continue
+
+            mismatch = np.count_nonzero(np.abs(output - reference) > 1) / reference.size
+            timings[name] = elapsed
+            if mismatch > MAX_MISMATCH:
+                self.logger.info(f"[INFO] {algorithm} {name}: {elapsed:.2f} ms, "
+                                 f"{mismatch:.2%} of pixels differ from numpy, not selected")
+                continue
+
+            if elapsed < best_ms:
+                best, best_ms = name, elapsed
+
+        return best, timings
+
+    def tune(self, detector, algorithms=None, params=None):
+        """
+        Selects the fastest implementation of each algorithm on the detector, benchmarking only the algorithms
+        missing from the cache or cached at other thresholds.
+        :param detector: GreenOnBrown instance
+        :param algorithms: algorithm names to tune, defaults to all of detector.implementations
+        :param params: configured thresholds, e.g. {'hue_min': 30}. The hsv and exhsv implementations are compared
+                       at these rather than their defaults, as the 'lut' tables quantise colours near the thresholds.
+        :return: dictionary of algorithm name to selected implementation
+        """
+        if detector.frame_format != 'bgr':
+            self.logger.info(f"[INFO] Only one implementation for {detector.frame_format} frames, skipping autotune")
+            return {}
+
+        algorithms = list(detector.implementations) if algorithms is None else algorithms
+        params = {name: value for name, value in (params or {}).items() if name in THRESHOLD_PARAMS}
+        cache = self.load(detector)
+        frame = None
+
+        selected = {}
+        for algorithm in algorithms:
+            if algorithm not in detector.implementations or algorithm == 'gndvi':
+                continue
+
+            best = cache['implementations'].get(algorithm)
+            if (best is None or best not in detector.implementations[algorithm]
+                    or cache['params'].get(algorithm, {}) != params):
+                if frame is None:
+                    self.logger.info(f"[INFO] Autotuning implementations at {self.resolution[0]}x{self.resolution[1]}")
+                    frame = synthetic_frame(self.resolution)
+
+                best, timings = self.benchmark(detector, algorithm, frame, params)
+                cache['implementations'][algorithm] = best
+                cache['timings'][algorithm] = timings
+                cache['params'][algorithm] = params
+                summary = ', '.join(f"{name} {ms:.2f} ms" for name, ms in timings.items())
+                self.logger.info(f"[INFO] {algorithm}: {summary}. Selected {best}.")
+
+            detector.set_implementation(best, algorithm=algorithm)
+            selected[algorithm] = best
+
+        if frame is not None:
+            self.save(cache)
+
+        return selected
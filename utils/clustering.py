@@ -0,0 +1,108 @@
+"""
+Merging of nearby detections before they are sent to the relays.
+
+A fragmented weed, e.g. a grass tussock or a plant with thin leaves, is often thresholded into many small contours.
+Each would otherwise be its own relay job. cluster_detections merges detections whose centres are within a radius
+of each other, chaining through neighbours, into one detection with the combined box and area. The OWL keeps
+the cluster of each detection from cluster_labels, and sends one job per cluster for each lane its members' centres
+fall in past the actuation line, so merging never changes which lanes fire.
+
+Centres are hashed into a uniform grid of radius-sized cells, so each centre is only compared with the centres in
+its own and the 8 neighbouring cells and the cost grows with the number of detections, not its square.
+"""
+import numpy as np
+
+from utils.detections import DetectionResult
+
+
+def _find(parents, item):
+    while parents[item] != item:
+        parents[item] = parents[parents[item]]
+        item = parents[item]
+    return item
+
+
+def cluster_labels(centres, radius, class_ids=None):
+    """
+    Cluster of each centre, with centres closer than radius (directly or through other centres) in one cluster.
+    :param centres: (N, 2) array of (x, y) centres
+    :param radius: merge distance in pixels
+    :param class_ids: optional class of each centre, only centres of the same class are merged
+    :return: (N,) int array of cluster numbers from 0, in order of each cluster's first centre
+    """
+    centres = np.asarray(centres).reshape(-1, 2)
+    count = len(centres)
+    if count == 0 or radius <= 0:
+        return np.arange(count)
+
+    cells = np.floor_divide(centres, radius).astype(np.int64).tolist()
+    points = centres.tolist()
+    classes = class_ids.tolist() if class_ids is not None else [0] * count
+    radius_squared = radius * radius
+
+    grid = {}
+    parents = list(range(count))
+    for item, ((cell_x, cell_y), (x, y)) in enumerate(zip(cells, points)):
+        for neighbour_x in (cell_x - 1, cell_x, cell_x + 1):
+            for neighbour_y in (cell_y - 1, cell_y, cell_y + 1):
+                for other in grid.get((neighbour_x, neighbour_y), ()):
+                    other_x, other_y = points[other]
+                    if (classes[other] == classes[item]
+                            and (x - other_x) ** 2 + (y - other_y) ** 2 <= radius_squared):
+                        root, other_root = _find(parents, item), _find(parents, other)
+                        if root != other_root:
+                            parents[max(root, other_root)] = min(root, other_root)
+        grid.setdefault((cell_x, cell_y), []).append(item)
+
+    roots = [_find(parents, item) for item in range(count)]
+    _, labels = np.unique(roots, return_inverse=True)
+    return labels.reshape(-1)
+
+
+def cluster_detections(result, radius):
+    """
+    One detection per cluster of a DetectionResult, see cluster_labels. Each cluster gets the box around all its
+    boxes, the centre of that box, the summed area and the highest score of its members. The contours are kept
+    as they are, as the actuation only uses the boxes and centres.
+    :param result: DetectionResult
+    :param radius: merge distance in pixels, 0 returns the result unchanged
+    :return: DetectionResult of the clusters
+    """
+    if radius <= 0 or len(result) < 2:
+        return result
+
+    return merge_clusters(result, cluster_labels(result.centres, radius, result.class_ids))
+
+
+def merge_clusters(result, labels):
+    """
+    One detection per cluster of a DetectionResult, given the cluster of each detection from cluster_labels.
+    :return: DetectionResult of the clusters, in cluster number order
+    """
+    clusters = int(labels.max()) + 1 if len(labels) else 0
+    if clusters == len(result):
+        return result
+
+    starts = result.boxes[:, :2]
+    ends = starts + result.boxes[:, 2:]
+    start = np.full((clusters, 2), np.iinfo(np.int32).max, dtype=np.int32)
+    end = np.full((clusters, 2), np.iinfo(np.int32).min, dtype=np.int32)
+    np.minimum.at(start, labels, starts)
+    np.maximum.at(end, labels, ends)
+
+    boxes = np.hstack((start, end - start))
+    centres = start + (end - start) // 2
+    areas = np.bincount(labels, weights=result.areas, minlength=clusters)
+
+    # members of a cluster share a class, take it from the first member
+    first = np.full(clusters, len(labels), dtype=np.int64)
+    np.minimum.at(first, labels, np.arange(len(labels)))
+    class_ids = result.class_ids[first]
+
+    scores = None
+    if result.scores is not None:
+        scores = np.zeros(clusters, dtype=np.float32)
+        np.maximum.at(scores, labels, result.scores)
+
+    return DetectionResult(boxes, centres, scores=scores, class_ids=class_ids, labels=result.labels,
+                           contours=result.contours, areas=areas)
@@ -1,6 +1,6 @@
 from pathlib import Path
 from configparser import ConfigParser, Error as ConfigParserError
-from typing import Dict, Set, Tuple
+from typing import Dict, List, Set, Tuple
 
 import logging
 import utils.error_manager as errors
@@ -13,7 +13,7 @@ class ConfigValidator:
     REQUIRED_CONFIG = {
         'System': {
             'required_keys': {'algorithm', 'relay_num', 'actuation_duration', 'delay'},
-            'optional_keys': {'input_file_or_directory'}
+            'optional_keys': {'input_file_or_directory', 'actuation_mode', 'coverage_threshold', 'cluster_radius'}
         },
         'Controller': {
             # Base requirements for all controller types
@@ -53,7 +53,7 @@ class ConfigValidator:
         },
         'Camera': {
             'required_keys': {'resolution_width', 'resolution_height'},
-            'optional_keys': {'exp_compensation'}
+            'optional_keys': {'exp_compensation', 'frame_format'}
         },
         'GreenOnBrown': {
             'required_keys': {
@@ -61,7 +61,9 @@ class ConfigValidator:
                 'saturation_min', 'saturation_max', 'brightness_min', 'brightness_max',
                 'min_detection_area'
             },
-            'optional_keys': {'invert_hue'}
+            'optional_keys': {'invert_hue', 'implementation', 'lut_bits', 'preprocessing', 'preprocessing_interval',
+                              'classifier_path', 'detection_mode', 'threshold_method', 'threshold_interval',
+                              'pyramid_scale', 'workers', 'probe_scale', 'probe_margin'}
         },
         'DataCollection': {
             'required_keys': {'sample_images', 'sample_method', 'save_directory'},
@@ -84,6 +86,15 @@ class ConfigValidator:
         # Hue values (0-180)
         'hue_min': ('int', 0, 180),
         'hue_max': ('int', 0, 180),
+        'lut_bits': ('int', 1, 8),
+        'preprocessing_interval': ('int', 1, None),
+        'threshold_interval': ('int', 1, None),
+        'pyramid_scale': ('int', 1, 8),
+        'workers': ('int', 1, 16),
+        'probe_scale': ('int', 0, 32),
+        'probe_margin': ('int', 0, 255),
+        'coverage_threshold': ('float', 0, 1),
+        'cluster_radius': ('int', 0, None),
         # Resolution
         'resolution_width': ('int', 1, None),
         'resolution_height': ('int', 1, None),
@@ -99,7 +110,14 @@ class ConfigValidator:
         'sensitivity_pin': ('pin', 1, 40),
     }
 
-    VALID_ALGORITHMS = {'exg', 'exgr', 'maxg', 'nexg', 'exhsv', 'hsv', 'gndvi', 'gog'}
+    VALID_ALGORITHMS = {'exg', 'exgr', 'maxg', 'nexg', 'exhsv', 'hsv', 'gndvi', 'gog', 'classifier'}
+    VALID_IMPLEMENTATIONS = {'numpy', 'fixed', 'linear', 'lut', 'numba', 'auto'}
+    VALID_FRAME_FORMATS = {'bgr', 'yuv420'}
+    VALID_PREPROCESSING = {'none', 'normalise', 'clahe'}
+    VALID_DETECTION_MODES = {'contours', 'components'}
+    VALID_ACTUATION_MODES = {'detections', 'coverage'}
+    VALID_THRESHOLD_METHODS = {'gaussian', 'box', 'downsampled', 'otsu'}
+    YUV420_ALGORITHMS = {'exg', 'exgr', 'maxg', 'nexg', 'exhsv', 'hsv'}
     VALID_CONTROLLER_TYPES = {'none', 'ute', 'advanced'}
     VALID_SWITCH_PURPOSES = {'recording', 'sensitivity'}
 
@@ -170,11 +188,145 @@ class ConfigValidator:
         if not algorithm:
             return False, {'System': {'algorithm': 'Algorithm must be specified'}}
 
-        if algorithm not in cls.VALID_ALGORITHMS:
+        linear_valid, linear_errors = cls.validate_linear_indices(config)
+        if not linear_valid:
+            return False, linear_errors
+
+        valid_algorithms = cls.VALID_ALGORITHMS | set(cls.get_linear_index_names(config))
+        if algorithm not in valid_algorithms:
+            return False, {'System': {
+                'algorithm': f'Invalid algorithm. Must be one of: {", ".join(sorted(valid_algorithms))}'
+            }}
+
+        if algorithm == 'classifier' and not config.get('GreenOnBrown', 'classifier_path', fallback='').strip():
+            return False, {'GreenOnBrown': {
+                'classifier_path': 'classifier_path must point to a model trained with utils/pixel_classifier.py'
+            }}
+
+        frame_format = config.get('Camera', 'frame_format', fallback='bgr').lower()
+        if frame_format not in cls.VALID_FRAME_FORMATS:
+            return False, {'Camera': {
+                'frame_format': f'Invalid frame format. Must be one of: {", ".join(sorted(cls.VALID_FRAME_FORMATS))}'
+            }}
+
+        yuv420_algorithms = cls.YUV420_ALGORITHMS | {'gog'} | set(cls.get_linear_index_names(config))
+        if frame_format == 'yuv420' and algorithm not in yuv420_algorithms:
             return False, {'System': {
-                'algorithm': f'Invalid algorithm. Must be one of: {", ".join(sorted(cls.VALID_ALGORITHMS))}'
+                'algorithm': f'{algorithm} does not support yuv420 frames. Use frame_format = bgr'
+            }}
+
+        preprocessing = config.get('GreenOnBrown', 'preprocessing', fallback='none').lower()
+        if preprocessing not in cls.VALID_PREPROCESSING:
+            return False, {'GreenOnBrown': {
+                'preprocessing': f'Invalid preprocessing. Must be one of: {", ".join(sorted(cls.VALID_PREPROCESSING))}'
             }}
 
+        if frame_format == 'yuv420' and preprocessing == 'clahe':
+            return False, {'GreenOnBrown': {'preprocessing': 'clahe preprocessing does not support yuv420 frames'}}
+
+        implementation = config.get('GreenOnBrown', 'implementation', fallback='numpy').lower()
+        if implementation not in cls.VALID_IMPLEMENTATIONS:
+            return False, {'GreenOnBrown': {
+                'implementation': f'Invalid implementation. Must be one of: {", ".join(sorted(cls.VALID_IMPLEMENTATIONS))}'
+            }}
+
+        detection_mode = config.get('GreenOnBrown', 'detection_mode', fallback='contours').lower()
+        if detection_mode not in cls.VALID_DETECTION_MODES:
+            return False, {'GreenOnBrown': {
+                'detection_mode': f'Invalid detection mode. Must be one of: {", ".join(sorted(cls.VALID_DETECTION_MODES))}'
+            }}
+
+        threshold_method = config.get('GreenOnBrown', 'threshold_method', fallback='gaussian').lower()
+        if threshold_method not in cls.VALID_THRESHOLD_METHODS:
+            return False, {'GreenOnBrown': {
+                'threshold_method': f'Invalid threshold method. Must be one of: '
+                                    f'{", ".join(sorted(cls.VALID_THRESHOLD_METHODS))}'
+            }}
+
+        actuation_mode = config.get('System', 'actuation_mode', fallback='detections').lower()
+        if actuation_mode not in cls.VALID_ACTUATION_MODES:
+            return False, {'System': {
+                'actuation_mode': f'Invalid actuation mode. Must be one of: {", ".join(sorted(cls.VALID_ACTUATION_MODES))}'
+            }}
+        if actuation_mode == 'coverage' and algorithm == 'gog':
+            return False, {'System': {'actuation_mode': 'Coverage actuation needs a green-on-brown algorithm'}}
+
+        pyramid_scale = config.getint('GreenOnBrown', 'pyramid_scale', fallback=1)
+        if pyramid_scale not in (1, 2, 4, 8):
+            return False, {'GreenOnBrown': {'pyramid_scale': 'Must be 1 (disabled), 2, 4 or 8'}}
+        if pyramid_scale > 1 and frame_format == 'yuv420':
+            return False, {'GreenOnBrown': {'pyramid_scale': 'The pyramid mode needs frame_format = bgr'}}
+
+        return True, {}
+
+    @classmethod
+    def get_linear_index_names(cls, config: ConfigParser) -> List[str]:
+        """Names of the user-defined linear indices in the [LinearIndices] section."""
+        if not config.has_section('LinearIndices'):
+            return []
+        return [name for name in config.options('LinearIndices') if name not in config.defaults()]
+
+    @classmethod
+    def validate_linear_indices(cls, config: ConfigParser) -> Tuple[bool, Dict[str, Dict[str, str]]]:
+        """Validate 'name = blue, green, red[, offset]' entries of the [LinearIndices] section."""
+        linear_errors = {}
+        for name in cls.get_linear_index_names(config):
+            if name in cls.VALID_ALGORITHMS:
+                linear_errors[name] = 'Name is already used by a built-in algorithm'
+                continue
+
+            value = config.get('LinearIndices', name)
+            try:
+                coefficients = [float(v) for v in value.split(',')]
+            except ValueError:
+                linear_errors[name] = f'Coefficients must be numbers, got: {value}'
+                continue
+
+            if len(coefficients) not in (3, 4):
+                linear_errors[name] = 'Must be blue, green, red coefficients and an optional offset'
+
+        if linear_errors:
+            return False, {'LinearIndices': linear_errors}
+
+        return True, {}
+
+    @classmethod
+    def validate_roi(cls, config: ConfigParser) -> Tuple[bool, Dict[str, Dict[str, str]]]:
+        """Validate the optional [ProcessingROI] band and excluded areas, given as fractions of the frame."""
+        if not config.has_section('ProcessingROI'):
+            return True, {}
+
+        roi_errors = {}
+        bounds = {}
+        for key, default in (('top', 0.0), ('bottom', 1.0), ('left', 0.0), ('right', 1.0)):
+            try:
+                bounds[key] = config.getfloat('ProcessingROI', key, fallback=default)
+            except ValueError:
+                roi_errors[key] = 'Must be a valid float'
+                continue
+            if not 0 <= bounds[key] <= 1:
+                roi_errors[key] = 'Must be a fraction of the frame between 0 and 1'
+
+        if not roi_errors:
+            if bounds['top'] >= bounds['bottom']:
+                roi_errors['top'] = f"top ({bounds['top']}) must be less than bottom ({bounds['bottom']})"
+            if bounds['left'] >= bounds['right']:
+                roi_errors['left'] = f"left ({bounds['left']}) must be less than right ({bounds['right']})"
+
+        exclude = config.get('ProcessingROI', 'exclude', fallback='')
+        for item in filter(str.strip, exclude.split(';')):
+            try:
+                rectangle = [float(v) for v in item.split(',')]
+            except ValueError:
+                roi_errors['exclude'] = f'Values must be numbers, got: {item.strip()}'
+                break
+            if len(rectangle) != 4 or not all(0 <= v <= 1 for v in rectangle):
+                roi_errors['exclude'] = f'Each area needs 4 fractions (left, top, right, bottom), got: {item.strip()}'
+                break
+
+        if roi_errors:
+            return False, {'ProcessingROI': roi_errors}
+
         return True, {}
 
     @classmethod
@@ -378,6 +530,11 @@ class ConfigValidator:
         if not is_valid:
             validation_errors.update(algorithm_errors)
 
+        # Processing ROI validation
+        is_valid, roi_errors = cls.validate_roi(config)
+        if not is_valid:
+            validation_errors.update(roi_errors)
+
         # Threshold validation
         is_valid, threshold_errors = cls.validate_thresholds(config)
         if not is_valid:
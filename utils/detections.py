@@ -0,0 +1,99 @@
+import numpy as np
+import cv2
+
+BOX_COLOUR = (0, 0, 255)
+LABEL_COLOUR = (255, 0, 0)
+LANE_COLOUR = (255, 0, 0)
+
+
+class DetectionResult:
+    def __init__(self, boxes, centres, scores=None, class_ids=None, labels=None, contours=None, areas=None):
+        """
+        Detections in one frame, with nothing drawn. The detectors return this and leave the frame untouched, so
+        ImageRecorder saves clean frames and headless runs never pay for drawing. DetectionRenderer draws it when a
+        display or recording needs it.
+        :param boxes: (x, y, width, height) of each detection in full frame pixels
+        :param centres: (x, y) centre of each detection
+        :param scores: confidence of each detection, or None for detectors without one, e.g. GreenOnBrown
+        :param class_ids: class of each detection, all 0 if None
+        :param labels: dict of class id to the name shown by DetectionRenderer
+        :param contours: contours of each detection if the detector has them, e.g. GreenOnBrown
+        :param areas: pixel area of each detection, the box areas if None
+        """
+        self.boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        self.centres = np.asarray(centres, dtype=np.int32).reshape(-1, 2)
+        self.scores = None if scores is None else np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = (np.zeros(len(self.boxes), dtype=np.int32) if class_ids is None
+                          else np.asarray(class_ids, dtype=np.int32).reshape(-1))
+        self.labels = labels or {}
+        self.contours = contours if contours is not None else []
+        self.areas = (self.boxes[:, 2].astype(np.int64) * self.boxes[:, 3] if areas is None
+                      else np.asarray(areas, dtype=np.float64).reshape(-1))
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def label(self, item):
+        """Display text of a detection, its class name and, if it has one, its confidence."""
+        class_id = int(self.class_ids[item])
+        name = self.labels.get(class_id, class_id)
+        if self.scores is None:
+            return f'{name}'
+
+        return f'{int(100 * self.scores[item])}% {name}'
+
+
+class DetectionRenderer:
+    def __init__(self, width=None):
+        """
+        Draws DetectionResults onto a copy of the frame, only when something will show or record it.
+        :param width: width the copy is shrunk to before drawing, e.g. the display window width. None draws at full
+                      resolution, e.g. for video recording.
+        """
+        self.width = width
+
+    def canvas(self, frame, width=None):
+        """Copy of a BGR frame to draw on, shrunk to width if narrower, and its scale relative to the frame."""
+        width = width if width is not None else self.width
+        height, frame_width = frame.shape[:2]
+        if width is None or width >= frame_width:
+            return frame.copy(), 1.0
+
+        # linear rather than area interpolation, about 1 ms instead of 13 ms from 1456x1088 to 600 wide, and
+        # the overlays are drawn afterwards so they stay sharp
+        scale = width / frame_width
+        return cv2.resize(frame, (width, max(int(round(height * scale)), 1)), interpolation=cv2.INTER_LINEAR), scale
+
+    def render(self, frame, result=None, roi=None, lane_fractions=None, lane_edges=None, y_start=0, width=None):
+        """
+        :param frame: BGR frame the result came from, which isn't modified
+        :param result: DetectionResult to draw boxes and labels for
+        :param roi: optional ProcessingROI to outline
+        :param lane_fractions: optional green fraction of each lane, e.g. from CompiledDetector.coverage
+        :param lane_edges: x coordinates of the lane boundaries in the frame, needed with lane_fractions
+        :param y_start: row the lane fractions are counted from
+        :param width: overrides the renderer width for this frame
+        :return: the annotated copy
+        """
+        image, scale = self.canvas(frame, width=width)
+        font_scale = max(scale, 0.4)
+        thickness = max(int(round(2 * scale)), 1)
+
+        if roi is not None:
+            roi.draw(image)
+
+        if result is not None:
+            for item, (x, y, box_width, box_height) in enumerate(result.boxes * scale):
+                start = (int(x), int(y))
+                end = (int(x + box_width), int(y + box_height))
+                cv2.putText(image, result.label(item), (start[0], start[1] + int(30 * font_scale)),
+                            cv2.FONT_HERSHEY_SIMPLEX, font_scale, LABEL_COLOUR, thickness)
+                cv2.rectangle(image, start, end, BOX_COLOUR, thickness)
+
+        if lane_fractions is not None:
+            for lane, fraction in enumerate(lane_fractions):
+                position = (int(lane_edges[lane] * scale) + 10, int((max(y_start, 0) + 30) * scale))
+                cv2.putText(image, f'{fraction:.1%}', position, cv2.FONT_HERSHEY_SIMPLEX, 0.8 * font_scale,
+                            LANE_COLOUR, thickness)
+
+        return image
@@ -0,0 +1,92 @@
+from functools import cached_property
+
+import numpy as np
+import cv2
+
+from utils.workspace import scratch
+
+
+class FrameFeatures:
+    def __init__(self, image, workspace=None):
+        """
+        Lazily computed planes of a single BGR frame, each computed at most once. Algorithms that accept a features
+        argument pull their channels, chromaticity and HSV planes from here, so several algorithms run on the same
+        frame (e.g. nexg, hsv and exhsv) share the conversions instead of repeating them.
+
+        Planes are shared between algorithms and must be treated as read-only. Create a new FrameFeatures per frame.
+        :param image: image as a BGR array (i.e. opened with opencv not PIL)
+        :param workspace: optional Workspace the planes, and the outputs of algorithms using these features, are
+                          written into. They are then only valid until the next frame is processed with it.
+        """
+        self.image = image
+        self.workspace = workspace
+        self.indices = {}
+
+    def buffer(self, name, dtype=np.float32, channels=None):
+        """Frame-sized array from the workspace, or a new one without a workspace."""
+        return scratch(self.workspace, f'features_{name}', self.image.shape, dtype, channels=channels)
+
+    def channel(self, channel, name):
+        plane = self.buffer(name)
+        np.copyto(plane, self.image[:, :, channel])
+        return plane
+
+    @cached_property
+    def blue(self):
+        return self.channel(0, 'blue')
+
+    @cached_property
+    def green(self):
+        return self.channel(1, 'green')
+
+    @cached_property
+    def red(self):
+        return self.channel(2, 'red')
+
+    @cached_property
+    def channel_sum(self):
+        """Sum of the float channels with zeros replaced by 1, so it is safe to divide by."""
+        channel_sum = np.add(self.red, self.green, out=self.buffer('channel_sum'))
+        channel_sum += self.blue
+        # the channels are whole numbers, so 0 is the only sum below 1
+        return np.maximum(channel_sum, 1, out=channel_sum)
+
+    @cached_property
+    def chromaticity(self):
+        """Normalised (b, g, r) planes, each channel divided by the channel sum."""
+        channel_sum = self.channel_sum
+        return tuple(np.divide(plane, channel_sum, out=self.buffer(f'{name}_chromaticity'))
+                     for plane, name in ((self.blue, 'blue'), (self.green, 'green'), (self.red, 'red')))
+
+    @cached_property
+    def hsv(self):
+        return cv2.cvtColor(self.image, cv2.COLOR_BGR2HSV, dst=self.buffer('hsv', np.uint8, channels=3))
+
+    @cached_property
+    def hue(self):
+        return self.hsv[:, :, 0]
+
+    @cached_property
+    def sat(self):
+        return self.hsv[:, :, 1]
+
+    @cached_property
+    def val(self):
+        return self.hsv[:, :, 2]
+
+    @cached_property
+    def grey(self):
+        return cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY, dst=self.buffer('grey', np.uint8))
+
+    def index(self, func, **params):
+        """
+        Returns the output of an algorithm on this frame, computing it only the first time it is requested with
+        the same parameters.
+        :param func: algorithm from utils.algorithms that accepts a features argument
+        :param params: keyword arguments passed to func
+        """
+        key = (func, tuple(sorted(params.items())))
+        if key not in self.indices:
+            self.indices[key] = func(self.image, features=self, **params)
+
+        return self.indices[key]
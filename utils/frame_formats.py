@@ -0,0 +1,92 @@
+import numpy as np
+import cv2
+
+# supported VideoStream/GreenOnBrown frame formats
+FRAME_FORMATS = ('bgr', 'yuv420')
+
+# full range BT.601 (sYCC, the libcamera default for still and preview streams) chroma contribution to each channel,
+# i.e. R = Y + 1.402 Cr', G = Y - 0.344136 Cb' - 0.714136 Cr', B = Y + 1.772 Cb' with Cb' = U - 128, Cr' = V - 128
+CHROMA_TO_BGR = np.array([[1.772, 0.0],
+                          [-0.344136, -0.714136],
+                          [0.0, 1.402]])
+
+
+def yuv420_shape(frame):
+    """(height, width) of the image stored in a planar I420 frame of shape (height * 3 / 2, width)."""
+    return frame.shape[0] * 2 // 3, frame.shape[1]
+
+
+def image_shape(frame, frame_format='bgr'):
+    """(height, width) of the image in a frame of either format."""
+    if frame_format == 'yuv420':
+        return yuv420_shape(frame)
+    return frame.shape[:2]
+
+
+def split_yuv420(frame):
+    """
+    Returns views of the Y (height x width), U and V (height / 2 x width / 2) planes of a contiguous I420 frame.
+    """
+    height, width = yuv420_shape(frame)
+    chroma_rows = height // 4
+    y = frame[:height]
+    u = frame[height:height + chroma_rows].reshape(height // 2, width // 2)
+    v = frame[height + chroma_rows:height + 2 * chroma_rows].reshape(height // 2, width // 2)
+
+    return y, u, v
+
+
+def yuv_coefficients(blue, green, red):
+    """
+    Coefficients (y, cb, cr) of a linear index blue * B + green * G + red * R re-expressed in full range YCbCr,
+    index = y * Y + cb * (U - 128) + cr * (V - 128).
+    """
+    bgr = np.array([blue, green, red], dtype=np.float64)
+    cb, cr = bgr @ CHROMA_TO_BGR
+    return float(bgr.sum()), float(cb), float(cr)
+
+
+def bgr_to_yuv420(image):
+    """
+    Full range BT.601 I420 frame from a BGR image, with 2x2 averaged chroma. cv2.COLOR_BGR2YUV_I420 is limited range,
+    so it doesn't match the camera output.
+    """
+    height, width = image.shape[:2]
+    ycrcb = cv2.cvtColor(image, cv2.COLOR_BGR2YCrCb)
+    chroma = cv2.resize(ycrcb[:, :, 1:], (width // 2, height // 2), interpolation=cv2.INTER_AREA)
+
+    frame = np.empty((height * 3 // 2, width), dtype=np.uint8)
+    y, u, v = split_yuv420(frame)
+    y[:] = ycrcb[:, :, 0]
+    u[:] = chroma[:, :, 1]
+    v[:] = chroma[:, :, 0]
+
+    return frame
+
+
+def yuv420_to_bgr(frame):
+    """BGR image from a full range BT.601 I420 frame, e.g. for display, recording or image sampling."""
+    y, u, v = split_yuv420(frame)
+    height, width = y.shape
+    crcb = cv2.resize(cv2.merge((v, u)), (width, height), interpolation=cv2.INTER_LINEAR)
+
+    return cv2.cvtColor(cv2.merge((y, crcb[:, :, 0], crcb[:, :, 1])), cv2.COLOR_YCrCb2BGR)
+
+
+def repack_yuv420(array, width, height):
+    """
+    Contiguous I420 frame from a strided YUV420 camera buffer whose rows are padded to array.shape[1] bytes.
+    Returns the array unchanged if it isn't padded.
+    """
+    stride = array.shape[1]
+    if stride == width:
+        return array
+
+    frame = np.empty((height * 3 // 2, width), dtype=np.uint8)
+    y, u, v = split_yuv420(frame)
+    y[:] = array[:height, :width]
+    chroma_rows = height // 4
+    u[:] = array[height:height + chroma_rows].reshape(height // 2, stride // 2)[:, :width // 2]
+    v[:] = array[height + chroma_rows:height + 2 * chroma_rows].reshape(height // 2, stride // 2)[:, :width // 2]
+
+    return frame
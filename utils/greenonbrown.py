@@ -1,13 +1,496 @@
 #!/usr/bin/env python
 from utils.algorithms import exg, exg_standardised, exg_standardised_hue, hsv, exgr, gndvi, maxg
+from utils.algorithms import exg_fixed, exgr_fixed, maxg_fixed, exg_standardised_fixed, exg_standardised_hue_fixed
+from utils.algorithms import EXG, EXGR, MAXG, exgr_yuv420, exg_standardised_yuv420
+from utils.detections import DetectionResult, DetectionRenderer
+from utils.frame_features import FrameFeatures
+from utils.frame_formats import FRAME_FORMATS, image_shape, yuv420_to_bgr
+from utils.lut_manager import ColourLUT, ThresholdLUT, ChromaThresholdLUT
+from utils.numba_kernels import FusedIndex, NUMBA_AVAILABLE
+from utils.log_manager import LogManager
+from utils.preprocessing import create_preprocessor
+from utils.thresholding import create_thresholder, THRESHOLD_METHODS
+from utils.workspace import Workspace, scratch
+from concurrent.futures import ThreadPoolExecutor
+import inspect
+from collections import OrderedDict
+from functools import partial
+import time
 import numpy as np
 import cv2
 
 
+DETECTION_MODES = ('contours', 'components')
+
+# margin around pyramid tiles and parallel strips, wider than the 31 x 31 threshold plus the closing
+HALO = 24
+
+# full resolution tiles of the pyramid mode
+PYRAMID_TILE = 128
+# share of candidate tiles above which the pyramid mode processes the whole frame instead
+PYRAMID_MAX_CANDIDATES = 0.4
+
+MAX_WORKSPACES = 4
+
+# strips are at least this many rows, so small frames aren't split into strips that are mostly halo
+MIN_STRIP_ROWS = 64
+# stages that look at the whole frame rather than a neighbourhood, so strips would give a different mask
+FRAME_STATISTIC_ALGORITHMS = {'maxg', 'gndvi'}
+STRIP_THRESHOLD_METHODS = {'gaussian', 'box'}
+
+# algorithms whose output is a mask that no threshold margin applies to, so the empty-frame probe can't be used
+UNPROBED_ALGORITHMS = {'classifier'}
+
+# thresholds compile and inference_batch use for any not given, the same as the inference defaults
+DEFAULT_THRESHOLDS = dict(exg_min=30, exg_max=250, hue_min=30, hue_max=90, brightness_min=5, brightness_max=200,
+                          saturation_min=30, saturation_max=255, invert_hue=False)
+
+# index images kept per cached frame, e.g. one per hsv setting tried while tuning
+MAX_CACHED_INDICES = 8
+
+
+class LazyContours:
+    def __init__(self, mask, offset=(0, 0)):
+        """
+        Sequence of the external contours of a mask, only traced the first time they are used, e.g. for display.
+        The mask may be a workspace buffer, so use the contours before the next frame is processed.
+        :param offset: (x, y) added to every contour point, e.g. the position of a processing ROI
+        """
+        self.mask = mask
+        self.offset = tuple(offset)
+        self._contours = None
+
+    @property
+    def contours(self):
+        if self._contours is None:
+            self._contours, _ = cv2.findContours(self.mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                                 offset=self.offset)
+            self.mask = None
+        return self._contours
+
+    def __len__(self):
+        return len(self.contours)
+
+    def __iter__(self):
+        return iter(self.contours)
+
+    def __getitem__(self, item):
+        return self.contours[item]
+
+
+class IndexCache:
+    def __init__(self, max_indices=MAX_CACHED_INDICES):
+        """
+        Index images of the last frame, before the clip and threshold, keyed by the frame object. A static image, or
+        a directory image shown for image_loop_time, is the same array on every read, so when only the exg_min,
+        exg_max or threshold settings change the frame is re-thresholded from the cached index. Indices with the hsv
+        thresholds baked in (hsv, exhsv, lut and numba) are cached per hsv setting and share the frame's
+        FrameFeatures, so the HSV conversion is still only done once per frame.
+
+        Frames must not be modified in place while cached, i.e. a camera that reuses one buffer for every frame
+        needs the cache disabled.
+        :param max_indices: index images kept per frame, the oldest is dropped first
+        """
+        self.max_indices = max_indices
+        self.frame = None
+        self.image = None
+        self.offset = None
+        self.features = None
+        self.indices = OrderedDict()
+        self.hits = 0
+
+    def lookup(self, frame):
+        """True if frame is the cached frame, otherwise clears the cache for it."""
+        if frame is self.frame:
+            return True
+
+        self.frame = frame
+        self.image = None
+        self.offset = None
+        self.features = None
+        self.indices.clear()
+        return False
+
+    def get_features(self):
+        """FrameFeatures of the cached band image, created on first use."""
+        if self.features is None:
+            self.features = FrameFeatures(self.image)
+        # every hsv setting tried adds an hsv mask to the shared features
+        while len(self.features.indices) > self.max_indices:
+            self.features.indices.pop(next(iter(self.features.indices)))
+
+        return self.features
+
+    def get(self, key):
+        output = self.indices.get(key)
+        if output is not None:
+            self.hits += 1
+        return output
+
+    def store(self, key, output, threshed_already):
+        """Keeps a copy of an index, as the index is usually a workspace buffer the next frame overwrites."""
+        self.indices[key] = (output.copy(), threshed_already)
+        while len(self.indices) > self.max_indices:
+            self.indices.popitem(last=False)
+
+        return self.indices[key]
+
+
+class CompiledDetector:
+    def __init__(self, detector, algorithm, params, min_detection_area=1, label='WEED'):
+        """
+        GreenOnBrown.inference bound to one algorithm and set of thresholds. The algorithm lookup, keyword arguments,
+        threshold tables, thresholder and parallel checks are resolved here once, so each call only runs the frame
+        through. Build it with GreenOnBrown.compile and build a new one when the thresholds change. Replacing the
+        reference to the old one is a single assignment, so a frame never sees a half updated detector.
+        :param detector: GreenOnBrown the implementations, workspaces and settings come from
+        :param params: exg_min, exg_max and the hsv thresholds
+        """
+        self.detector = detector
+        self.algorithm = algorithm
+        self.params = dict(params)
+        self.min_detection_area = min_detection_area
+        self.label = label
+        self.version = detector.version
+
+        func = detector.algorithms.get(algorithm, exg_standardised_hue)
+        kwargs = {}
+        if algorithm in ('exhsv', 'hsv'):
+            kwargs.update({key: params[key] for key in ('hue_min', 'hue_max', 'brightness_min', 'brightness_max',
+                                                        'saturation_min', 'saturation_max', 'invert_hue')})
+        if algorithm in detector.fused_algorithms:
+            kwargs.update(exg_min=params['exg_min'], exg_max=params['exg_max'])
+        self.index = partial(func, **kwargs) if kwargs else func
+        # index images only depend on these, so threshold changes reuse the IndexCache entry
+        self.index_key = (algorithm, detector.version, tuple(sorted(kwargs.items())))
+
+        self.uses_workspace = algorithm in detector.workspace_algorithms
+        self.uses_features = algorithm in detector.feature_algorithms
+        # fused kernels clip the index themselves
+        self.clip = None if algorithm in detector.fused_algorithms else (params['exg_min'], params['exg_max'])
+        self.thresholder = detector.get_thresholder(algorithm)
+        # the thresholder is shared with earlier detectors, a level kept from other clip bounds could pass every pixel
+        if hasattr(self.thresholder, 'reset'):
+            self.thresholder.reset()
+        self.strip_safe = detector.strip_safe(algorithm)
+        self.batch_parallel = detector.batch_parallel(algorithm)
+
+        detector.prepare(algorithm, **params)
+
+        # empty-frame probe, the same index with every threshold loosened by probe_margin, see probe_empty
+        self.probe_index = None
+        if detector.probe_supported(algorithm):
+            margin = detector.probe_margin
+            probe_params = detector.widened_thresholds(params, margin)
+            probe_kwargs = {}
+            if algorithm in ('exhsv', 'hsv'):
+                probe_kwargs.update({key: probe_params[key] for key in kwargs if key not in ('exg_min', 'exg_max')})
+            if algorithm in detector.fused_algorithms:
+                probe_kwargs.update(exg_min=probe_params['exg_min'], exg_max=255)
+            self.probe_index = partial(func, **probe_kwargs) if probe_kwargs else func
+            self.probe_level = params['exg_min'] - margin
+            detector.prepare(algorithm, **probe_params)
+
+    @property
+    def stale(self):
+        """True if the implementation or threshold method has changed since this was built."""
+        return self.version != self.detector.version
+
+    def probe_empty(self, image):
+        """
+        True if no pixel of the frame can pass the thresholds, judged from the index of a copy shrunk by probe_scale
+        with INTER_AREA. Once clipped to exg_min, an index that never rises above exg_min is flat and every threshold
+        method returns an empty mask, so the frame is empty if the shrunk index stays at or below
+        exg_min - probe_margin. For hsv the shrunk mask, with the ranges widened by probe_margin, must be empty.
+
+        Shrinking averages each plant with the soil around it, so plants much smaller than a probe cell
+        (probe_scale x probe_scale pixels) can be diluted below the margin and missed.
+        """
+        if self.probe_index is None:
+            return False
+
+        scale = self.detector.probe_scale
+        height, width = image.shape[:2]
+        small = cv2.resize(image, (max(width // scale, 1), max(height // scale, 1)), interpolation=cv2.INTER_AREA)
+
+        output = self.probe_index(small)
+        if isinstance(output, tuple):
+            return cv2.countNonZero(output[0]) == 0
+
+        return float(output.max()) <= self.probe_level
+
+    def mask(self, image, workspace=None, features=None, show_display=False, update=True):
+        """
+        Preprocessing, index, clip, threshold and morphological closing of a frame or a tile of one.
+        :param update: False for further parts of a frame already thresholded once, see threshold
+        :return: binary mask with the image height and width
+        """
+        output, threshed_already = self.index_image(image, workspace=workspace, features=features)
+        return self.threshold(output, threshed_already, workspace=workspace, show_display=show_display,
+                              update=update)
+
+    def index_image(self, image, workspace=None, features=None):
+        """
+        Preprocessing and index of a frame or a tile of one, at the image height and width.
+        :return: the index and True if it is already a thresholded mask
+        """
+        detector = self.detector
+        threshed_already = False
+        start = time.perf_counter()
+
+        # the index is computed on the preprocessed frame, while display and the returned image use the original
+        index_image = image
+        if detector.preprocessor is not None:
+            if detector.frame_format == 'yuv420':
+                index_image = detector.preprocessor.yuv420(image, workspace=workspace)
+            else:
+                index_image = detector.preprocessor(image, workspace=workspace)
+        detector.timings['preprocessing'] += (time.perf_counter() - start) * 1000
+
+        kwargs = {'workspace': workspace} if workspace and self.uses_workspace else {}
+        # features of the original frame don't apply to a preprocessed or cropped one
+        if features is not None and self.uses_features and features.image is index_image:
+            kwargs['features'] = features
+
+        output = self.index(index_image, **kwargs)
+        # e.g. hsv or the classifier, which return a mask that is already thresholded
+        if isinstance(output, tuple):
+            output, threshed_already = output
+
+        if detector.frame_format == 'yuv420':
+            # yuv420 indices are at chroma resolution, bring them back to the frame size
+            height, width = image_shape(image, detector.frame_format)
+            interpolation = cv2.INTER_NEAREST if threshed_already else cv2.INTER_LINEAR
+            output = cv2.resize(output, (width, height), interpolation=interpolation,
+                                dst=workspace.get('upscaled') if workspace else None)
+
+        return output, threshed_already
+
+    def threshold(self, output, threshed_already, workspace=None, show_display=False, update=True):
+        """
+        Clip, threshold and morphological closing of an index from index_image. The index isn't modified.
+        :param update: with update=False a thresholder that keeps state across frames (Otsu) uses its current level
+                       without counting a frame, so the tiles of a pyramid frame count once
+        """
+        detector = self.detector
+        if not threshed_already:
+            if self.clip is None:
+                pass  # already clipped by the kernel
+            elif output.dtype == np.uint8:
+                output = np.clip(output, *self.clip, out=workspace.get('clip') if workspace else None)
+            else:
+                clipped = np.clip(output, *self.clip, out=scratch(workspace, f'clip_{output.dtype}', output.shape,
+                                                                  output.dtype))
+                np.abs(clipped, out=clipped)
+                output = scratch(workspace, 'clip', output.shape)
+                np.copyto(output, clipped, casting='unsafe')
+            if show_display:
+                cv2.imshow("HSV Threshold on ExG", output)
+            if update or not hasattr(self.thresholder, 'apply'):
+                threshold_out = self.thresholder(output, workspace=workspace)
+            else:
+                threshold_out = self.thresholder.apply(output, workspace=workspace)
+            threshold_out = cv2.morphologyEx(threshold_out, cv2.MORPH_CLOSE, detector.kernel, iterations=1,
+                                             dst=workspace.get('morph') if workspace else None)
+        else:
+            threshold_out = cv2.morphologyEx(output, cv2.MORPH_CLOSE, detector.kernel, iterations=5,
+                                             dst=workspace.get('morph') if workspace else None)
+
+        return threshold_out
+
+    def band_mask(self, frame, features=None, show_display=False):
+        """
+        Thresholded mask of the part of a frame that is processed, i.e. the ROI band, with exclusions cleared.
+        :return: the mask, or None if the empty-frame probe skipped the frame, the band image and its (x, y) offset
+        """
+        detector = self.detector
+        cache = detector.index_cache
+
+        # only the ROI band is processed, and detections are shifted back to full frame coordinates
+        if cache is not None and cache.lookup(frame) and cache.image is not None:
+            image, offset = cache.image, cache.offset
+        else:
+            image = frame
+            offset = (0, 0)
+            if detector.roi is not None:
+                offset = detector.roi.offset(image_shape(frame, detector.frame_format), detector.frame_format)
+                image = detector.roi.crop(frame, detector.frame_format)
+            # a yuv420 band is copied into a buffer the next crop reuses, so only the whole frame can be cached
+            if cache is not None and (image is frame or detector.frame_format != 'yuv420'):
+                cache.image, cache.offset = image, offset
+
+        if self.probe_empty(image):
+            return None, image, offset
+
+        if detector.pyramid_scale > 1:
+            threshold_out = detector.pyramid_mask(image, self)
+        else:
+            threshold_out = detector.frame_mask(image, self, features=features, show_display=show_display)
+
+        if detector.roi is not None:
+            detector.roi.apply_exclusions(threshold_out, image_shape(frame, detector.frame_format),
+                                          detector.frame_format)
+
+        return threshold_out, image, offset
+
+    def _record_timing(self, start, preprocessing_ms, skipped):
+        timings = self.detector.timings
+        elapsed = (time.perf_counter() - start) * 1000
+        if skipped:
+            timings['skipped'] += 1
+            timings['skipped_ms'] += elapsed
+
+        timings['detection'] += elapsed - (timings['preprocessing'] - preprocessing_ms)
+        timings['frames'] += 1
+
+    def _display_frame(self, frame):
+        """The full BGR frame, for drawing on a copy of it."""
+        return yuv420_to_bgr(frame) if self.detector.frame_format == 'yuv420' else frame
+
+    def detect(self, image, features=None, show_display=False):
+        """
+        Detects weeds in a frame without drawing anything.
+        :param show_display: show the thresholded index window used for tuning
+        :return: DetectionResult, with the contours of each detection
+        """
+        detector = self.detector
+        start = time.perf_counter()
+        preprocessing_ms = detector.timings['preprocessing']
+
+        frame = image
+        threshold_out, image, offset = self.band_mask(frame, features=features, show_display=show_display)
+        if threshold_out is None:
+            contours, boxes, weed_centres = detector.empty_detections()
+            areas = []
+        else:
+            workspace = detector.get_workspace(image_shape(image, detector.frame_format))
+            contours, boxes, weed_centres, areas = detector.detections(threshold_out, self.min_detection_area,
+                                                                       workspace, offset=offset, with_areas=True)
+
+        self._record_timing(start, preprocessing_ms, skipped=threshold_out is None)
+
+        return DetectionResult(boxes, weed_centres, labels={0: self.label}, contours=contours, areas=areas)
+
+    def __call__(self, image, show_display=False, features=None):
+        """
+        Detects weeds in a frame, as GreenOnBrown.inference.
+        :return: contours, boxes, weed centres and the image (annotated copy if show_display)
+        """
+        result = self.detect(image, features=features, show_display=show_display)
+        contours = result.contours
+        if self.detector.detection_mode == 'components':
+            boxes, weed_centres = result.boxes, result.centres
+        else:
+            boxes, weed_centres = result.boxes.tolist(), result.centres.tolist()
+
+        if show_display:
+            image_out = self.detector.renderer.render(self._display_frame(image), result, roi=self.detector.roi)
+            return contours, boxes, weed_centres, image_out
+
+        return contours, boxes, weed_centres, image
+
+    def coverage(self, frame, lane_edges, y_start=0, show_display=False):
+        """
+        Share of green pixels in each lane from row y_start down, for actuation by coverage rather than by
+        individual detections. The mask is summed down its columns in one cv2.reduce call and the column sums are
+        totalled per lane from their cumulative sum, so no contours are extracted.
+        :param lane_edges: ascending x coordinates of the lane boundaries in the full frame, one more than the lanes
+        :param y_start: first row counted, e.g. the actuation line
+        :param show_display: show the thresholded index window used for tuning. Nothing is drawn, the fractions can
+                             be drawn with DetectionRenderer.render(lane_fractions=...).
+        :return: float32 array of the green fraction of the processed pixels of each lane
+        """
+        detector = self.detector
+        start = time.perf_counter()
+        preprocessing_ms = detector.timings['preprocessing']
+
+        threshold_out, _, (x0, y0) = self.band_mask(frame, show_display=show_display)
+
+        lane_edges = np.asarray(lane_edges, dtype=np.intp)
+        fractions = np.zeros(len(lane_edges) - 1, dtype=np.float32)
+        if threshold_out is not None:
+            rows = threshold_out[max(y_start - y0, 0):]
+            if rows.shape[0] > 0:
+                columns = cv2.reduce(rows, 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S)[0]
+                cumulative = np.concatenate(([0], np.cumsum(columns, dtype=np.int64)))
+                # lanes partly or wholly outside the ROI band only count their processed pixels
+                edges = np.clip(lane_edges - x0, 0, rows.shape[1])
+                area = np.diff(edges) * rows.shape[0] * 255
+                np.divide(np.diff(cumulative[edges]), area, out=fractions, where=area > 0)
+
+        self._record_timing(start, preprocessing_ms, skipped=threshold_out is None)
+
+        return fractions
+
+
 class GreenOnBrown:
-    def __init__(self, algorithm='exg', label_file='models/labels.txt'):
+    def __init__(self, algorithm='exg', label_file='models/labels.txt', implementation='numpy', lut_bits=8,
+                 use_workspace=True, linear_indices=None, frame_format='bgr', preprocessing='none',
+                 preprocessing_interval=30, classifier=None, detection_mode='contours', threshold_method='gaussian',
+                 threshold_interval=30, roi=None, pyramid_scale=1, workers=1, probe_scale=0, probe_margin=10,
+                 index_cache=False):
+        if frame_format not in FRAME_FORMATS:
+            raise ValueError(f"Unsupported frame format {frame_format}. Must be one of: {', '.join(FRAME_FORMATS)}")
+        if detection_mode not in DETECTION_MODES:
+            raise ValueError(f"Unknown detection mode {detection_mode}. Must be one of: {', '.join(DETECTION_MODES)}")
+
         self.algorithm = algorithm
+        self.frame_format = frame_format
+        self.lut_bits = lut_bits
+        self.detection_mode = detection_mode
+
+        # coarse-to-fine detection on a frame shrunk by this factor, 1 disables it
+        if pyramid_scale > 1 and frame_format == 'yuv420':
+            raise ValueError("The pyramid mode needs bgr frames, yuv420 indices are already at half resolution")
+        self.pyramid_scale = pyramid_scale
+
+        # frames whose index can't pass the thresholds at 1/probe_scale are skipped, 0 or 1 disables it
+        self.probe_scale = probe_scale if probe_scale > 1 else 0
+        self.probe_margin = probe_margin
+
+        # index images of the last frame, so a repeated frame is only re-thresholded, see IndexCache
+        self.index_cache = IndexCache() if index_cache else None
+
+        # draws the annotated copy returned by inference with show_display, at full resolution
+        self.renderer = DetectionRenderer()
+
+        # persistent pool for splitting frames into horizontal strips, see parallel_mask. cv2 and numpy release the
+        # GIL, so the strips run on separate cores.
+        self.workers = max(int(workers), 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        self.strip_workspaces = []
+        self.batch_workspaces = []
+
+        # optional ProcessingROI, only the band that can trigger a relay is processed
+        self.roi = roi if roi is not None and not roi.full_frame else None
         self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self.logger = LogManager.get_logger(__name__)
+
+        # optional brightness normalisation or CLAHE before the index, with cached LUTs and CLAHE objects
+        self.preprocessor = create_preprocessor(preprocessing, update_interval=preprocessing_interval)
+        if self.preprocessor is not None and frame_format == 'yuv420' and not hasattr(self.preprocessor, 'yuv420'):
+            raise ValueError(f"{preprocessing} preprocessing does not support yuv420 frames")
+
+        # local threshold applied to the index, see utils/thresholding.py. Algorithms can override the default
+        # with set_threshold_method and each gets its own thresholder, as Otsu keeps a level per index.
+        if threshold_method not in THRESHOLD_METHODS:
+            raise ValueError(f"Unknown threshold method {threshold_method}. "
+                             f"Must be one of: {', '.join(THRESHOLD_METHODS)}")
+        self.threshold_method = threshold_method
+        self.threshold_interval = threshold_interval
+        self.threshold_methods = {}
+        self.thresholders = {}
+
+        # bumped whenever an implementation or threshold method changes, so CompiledDetectors know to rebuild
+        self.version = 0
+        self.compiled = None
+
+        # total milliseconds spent and frames processed since the last timing_summary
+        self.timings = self._empty_timings()
+
+        # preallocated buffers per processed (height, width), see get_workspace
+        self.use_workspace = use_workspace
+        self.workspaces = OrderedDict()
 
         # Dictionary mapping algorithm names to functions
         self.algorithms = {
@@ -20,6 +503,511 @@ class GreenOnBrown:
             'gndvi': gndvi
         }
 
+        # Equivalent implementations of each algorithm. The 'numpy' entries are the reference versions above.
+        self.implementations = {name: {'numpy': func} for name, func in self.algorithms.items()}
+        self.implementations['exg']['fixed'] = exg_fixed
+        self.implementations['exgr']['fixed'] = exgr_fixed
+        self.implementations['maxg']['fixed'] = maxg_fixed
+        self.implementations['nexg']['fixed'] = exg_standardised_fixed
+        self.implementations['exhsv']['fixed'] = exg_standardised_hue_fixed
+
+        # approximate, see utils.algorithms. The autotuner doesn't select them as they differ from numpy.
+        self.implementations['exgr']['linear'] = EXGR
+        self.implementations['maxg']['linear'] = MAXG
+
+        # user-defined LinearIndex algorithms, e.g. from the [LinearIndices] config section. They are their own reference.
+        for name, linear_index in (linear_indices or {}).items():
+            self.algorithms[name] = linear_index
+            self.implementations[name] = {'numpy': linear_index, 'linear': linear_index, 'yuv420': linear_index.yuv420}
+
+        # single-pass index + clip (+ hsv gating) kernels, only if numba is installed
+        if NUMBA_AVAILABLE:
+            for name in ('exg', 'exgr', 'nexg', 'exhsv', 'hsv'):
+                self.implementations[name]['numba'] = FusedIndex(name)
+        elif implementation == 'numba':
+            self.logger.warning("Numba is not installed, using the numpy implementations. "
+                                "Install it with: pip install numba")
+            implementation = 'numpy'
+
+        # trained PixelClassifier, evaluated directly ('numpy') or compiled into a colour lookup table ('lut')
+        if classifier is not None:
+            self.algorithms['classifier'] = classifier
+            self.implementations['classifier'] = {'numpy': classifier, 'lut': classifier.lut(bits=lut_bits)}
+        elif algorithm == 'classifier':
+            raise ValueError("The classifier algorithm needs a trained PixelClassifier, see utils/pixel_classifier.py")
+
+        # versions for YUV420 camera frames, which return the index at chroma (half) resolution
+        self.implementations['exg']['yuv420'] = EXG.yuv420
+        self.implementations['exgr']['yuv420'] = exgr_yuv420
+        self.implementations['maxg']['yuv420'] = MAXG.yuv420
+        self.implementations['nexg']['yuv420'] = exg_standardised_yuv420
+        self.implementations['exhsv']['yuv420'] = ChromaThresholdLUT('exhsv')
+        self.implementations['hsv']['yuv420'] = ChromaThresholdLUT('hsv')
+
+        # colour lookup tables are compiled (or loaded from the disk cache) when the implementation is selected.
+        # hsv and exhsv tables have the thresholds baked in and are rebuilt incrementally when they change.
+        self.implementations['exg']['lut'] = ColourLUT(exg, 'exg', bits=lut_bits)
+        self.implementations['exgr']['lut'] = ColourLUT(exgr, 'exgr', bits=lut_bits)
+        self.implementations['nexg']['lut'] = ColourLUT(exg_standardised, 'nexg', bits=lut_bits)
+        self.implementations['exhsv']['lut'] = ThresholdLUT('exhsv', bits=lut_bits)
+        self.implementations['hsv']['lut'] = ThresholdLUT('hsv', bits=lut_bits)
+
+        # algorithms whose active implementation can write into the workspace, share FrameFeatures planes or apply
+        # the exg_min/exg_max clip itself
+        self.workspace_algorithms = set()
+        self.feature_algorithms = set()
+        self.fused_algorithms = set()
+        for name in self.algorithms:
+            self._update_workspace_support(name)
+
+        if frame_format == 'yuv420':
+            if 'yuv420' not in self.implementations.get(algorithm, {}):
+                raise ValueError(f"{algorithm} does not support yuv420 frames")
+            if implementation != 'numpy':
+                self.logger.info(f"[INFO] Ignoring implementation '{implementation}' for yuv420 frames")
+            implementation = 'yuv420'
+            self.set_implementation(implementation)
+
+        self.set_implementation(implementation, algorithm=algorithm)
+
+        if self.executor is not None and not self.strip_safe(algorithm):
+            self.logger.info(f"[INFO] {algorithm} with these settings depends on the whole frame, "
+                             f"processing it on one thread")
+
+    def _update_workspace_support(self, name):
+        parameters = inspect.signature(self.algorithms[name]).parameters
+        for argument, supported in (('workspace', self.workspace_algorithms), ('features', self.feature_algorithms),
+                                    ('exg_min', self.fused_algorithms)):
+            if argument in parameters:
+                supported.add(name)
+            else:
+                supported.discard(name)
+
+    def set_implementation(self, implementation, algorithm=None):
+        """
+        Select which implementation of an algorithm is used by inference.
+        :param implementation: implementation name, e.g. 'numpy', 'fixed', 'linear', 'lut' or 'numba'
+        :param algorithm: algorithm to change. If None, every algorithm with that implementation is changed.
+        """
+        names = [algorithm] if algorithm is not None else list(self.implementations.keys())
+        self.version += 1
+
+        for name in names:
+            available = self.implementations.get(name, {})
+            if implementation in available:
+                self.algorithms[name] = available[implementation]
+                self._update_workspace_support(name)
+                if algorithm is not None and hasattr(self.algorithms[name], 'compile'):
+                    self.algorithms[name].compile()
+            elif algorithm is not None:
+                self.logger.warning(f"No '{implementation}' implementation of {name}. "
+                                    f"Available: {', '.join(available)}. Keeping {self.algorithms[name]}.")
+
+    def set_threshold_method(self, method, algorithm=None):
+        """
+        Select how the index is thresholded.
+        :param method: one of 'gaussian', 'box', 'downsampled' or 'otsu'
+        :param algorithm: algorithm to change. If None, the default for algorithms without their own method changes.
+        """
+        if method not in THRESHOLD_METHODS:
+            raise ValueError(f"Unknown threshold method {method}. Must be one of: {', '.join(THRESHOLD_METHODS)}")
+
+        self.version += 1
+        if algorithm is None:
+            self.threshold_method = method
+            self.thresholders = {name: thresholder for name, thresholder in self.thresholders.items()
+                                 if name in self.threshold_methods}
+        else:
+            self.threshold_methods[algorithm] = method
+            self.thresholders.pop(algorithm, None)
+
+    def get_thresholder(self, algorithm):
+        thresholder = self.thresholders.get(algorithm)
+        if thresholder is None:
+            method = self.threshold_methods.get(algorithm, self.threshold_method)
+            thresholder = create_thresholder(method, update_interval=self.threshold_interval)
+            self.thresholders[algorithm] = thresholder
+
+        return thresholder
+
+    def prepare(self, algorithm,
+                hue_min=30,
+                hue_max=90,
+                brightness_min=5,
+                brightness_max=200,
+                saturation_min=30,
+                saturation_max=255,
+                invert_hue=False,
+                **kwargs):
+        """
+        Build any threshold-dependent tables ahead of time, e.g. for each controller sensitivity profile, so the
+        first frame after switching doesn't pay for it. Other keyword arguments such as exg_min are ignored.
+        """
+        func = self.algorithms.get(algorithm)
+        if hasattr(func, 'prepare'):
+            func.prepare(hue_min=hue_min, hue_max=hue_max, brightness_min=brightness_min,
+                         brightness_max=brightness_max, saturation_min=saturation_min,
+                         saturation_max=saturation_max, invert_hue=invert_hue)
+
+    @staticmethod
+    def _empty_timings():
+        return {'preprocessing': 0.0, 'detection': 0.0, 'frames': 0, 'skipped': 0, 'skipped_ms': 0.0}
+
+    def timing_summary(self):
+        """
+        Mean milliseconds per frame spent preprocessing and detecting since the last call, then resets the totals.
+        Also the share of frames the empty-frame probe skipped, and an estimate of the milliseconds per frame it
+        saved, from the mean time of the frames that were processed in full.
+        """
+        timings = self.timings
+        frames = max(timings['frames'], 1)
+        summary = {'preprocessing': timings['preprocessing'] / frames,
+                   'detection': timings['detection'] / frames,
+                   'skipped': timings['skipped'] / frames,
+                   'saved': 0.0}
+
+        processed = timings['frames'] - timings['skipped']
+        if processed > 0 and timings['skipped'] > 0:
+            processed_ms = (timings['detection'] - timings['skipped_ms']) / processed
+            summary['saved'] = (timings['skipped'] * processed_ms - timings['skipped_ms']) / frames
+        self.timings = self._empty_timings()
+
+        return summary
+
+    def get_workspace(self, shape):
+        """
+        Workspace for a (height, width), or None if workspaces are disabled. The pyramid mode uses one each for the
+        frame, the coarse frame and the tiles, and the least recently used is dropped after MAX_WORKSPACES.
+        """
+        if not self.use_workspace:
+            return None
+
+        shape = tuple(shape[:2])
+        workspace = self.workspaces.get(shape)
+        if workspace is None:
+            workspace = Workspace(shape)
+            self.workspaces[shape] = workspace
+            if len(self.workspaces) > MAX_WORKSPACES:
+                self.workspaces.popitem(last=False)
+        else:
+            self.workspaces.move_to_end(shape)
+
+        return workspace
+
+    def components(self, mask, min_detection_area=1, workspace=None, offset=(0, 0)):
+        """
+        Detections from the connected components of a binary mask, with the area filter, boxes and centres computed
+        as array operations instead of a Python loop over contours. The area is the pixel count of each component,
+        which is slightly larger than the polygon area cv2.contourArea gives for the same blob.
+        :param mask: binary uint8 mask
+        :param min_detection_area: components with this many pixels or fewer are dropped
+        :param workspace: optional Workspace for the label image
+        :param offset: (x, y) added to the boxes and centres, e.g. the position of a processing ROI
+        :return: (N, 4) int32 boxes as x, y, w, h, (N, 2) int32 centres and (N,) int32 areas
+        """
+        labels = workspace.get('labels', dtype=np.int32) if workspace else None
+        # Grana's block-based labelling was the fastest on sparse and on weedy masks
+        _, _, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(mask, 8, cv2.CV_32S, cv2.CCL_GRANA,
+                                                                       labels=labels)
+
+        # row 0 is the background
+        stats = stats[1:]
+        keep = stats[:, cv2.CC_STAT_AREA] > min_detection_area
+        boxes = stats[keep, :4]
+        boxes[:, :2] += np.asarray(offset, dtype=np.int32)
+        centres = boxes[:, :2] + boxes[:, 2:] // 2
+
+        return boxes, centres, stats[keep, cv2.CC_STAT_AREA]
+
+    def strip_safe(self, algorithm):
+        """
+        True if every stage of the algorithm only looks at pixels within HALO rows, so processing strips of a frame
+        separately gives the same mask as the whole frame. Frame statistics (brightness normalisation, CLAHE tiles,
+        Otsu, maxg scaling) and the downsampled threshold grid are not, and the fused numba kernels already use every
+        core themselves.
+        """
+        func = self.algorithms.get(algorithm)
+        return (self.frame_format == 'bgr'
+                and self.preprocessor is None
+                and self.threshold_methods.get(algorithm, self.threshold_method) in STRIP_THRESHOLD_METHODS
+                and algorithm not in FRAME_STATISTIC_ALGORITHMS
+                and not getattr(func, 'normalise', False)
+                and not isinstance(func, FusedIndex))
+
+    def probe_supported(self, algorithm):
+        """
+        True if the empty-frame probe can be used for an algorithm. It needs a BGR frame without preprocessing, and
+        indices scaled by a frame statistic like maxg always reach their maximum somewhere.
+        """
+        func = self.algorithms.get(algorithm)
+        return (self.probe_scale > 1
+                and self.frame_format == 'bgr'
+                and self.preprocessor is None
+                and algorithm not in FRAME_STATISTIC_ALGORITHMS | UNPROBED_ALGORITHMS
+                and not getattr(func, 'normalise', False))
+
+    @staticmethod
+    def widened_thresholds(params, margin):
+        """Thresholds with every range widened by margin, or narrowed for an inverted hue range."""
+        hue_margin = -margin if params['invert_hue'] else margin
+        widened = dict(params)
+        widened.update(exg_min=max(params['exg_min'] - margin, 0),
+                       hue_min=min(max(params['hue_min'] - hue_margin, 0), 179),
+                       hue_max=min(max(params['hue_max'] + hue_margin, 0), 179),
+                       saturation_min=max(params['saturation_min'] - margin, 0),
+                       saturation_max=min(params['saturation_max'] + margin, 255),
+                       brightness_min=max(params['brightness_min'] - margin, 0),
+                       brightness_max=min(params['brightness_max'] + margin, 255))
+
+        return widened
+
+    def empty_detections(self):
+        """Contours, boxes and centres of a frame without detections, in the detection_mode types."""
+        if self.detection_mode == 'components':
+            return [], np.empty((0, 4), dtype=np.int32), np.empty((0, 2), dtype=np.int32)
+
+        return [], [], []
+
+    def frame_mask(self, image, compiled, features=None, show_display=False, update=True):
+        """
+        CompiledDetector.mask of a whole frame, in parallel strips when that gives the same mask. With the index
+        cache the frame is processed in one pass, and only thresholded if its index is already cached.
+        """
+        workspace = self.get_workspace(image_shape(image, self.frame_format))
+        cache = self.index_cache
+        if cache is not None and cache.image is image:
+            cached = cache.get(compiled.index_key)
+            if cached is None:
+                if features is None and compiled.uses_features and self.frame_format == 'bgr':
+                    features = cache.get_features()
+                output, threshed_already = compiled.index_image(image, workspace=workspace, features=features)
+                cached = cache.store(compiled.index_key, output, threshed_already)
+
+            return compiled.threshold(*cached, workspace=workspace, show_display=show_display, update=update)
+
+        if self.executor is not None and compiled.strip_safe:
+            mask = self.parallel_mask(image, compiled)
+            if mask is not None:
+                return mask
+
+        return compiled.mask(image, workspace=workspace, features=features, show_display=show_display,
+                             update=update)
+
+    def parallel_mask(self, image, compiled):
+        """
+        CompiledDetector.mask of horizontal strips processed on the worker threads. Each strip is processed with
+        HALO rows of the neighbouring strips, and only its own rows are copied into the frame mask, so the mask is
+        identical to a single pass. Contours are traced once on the merged mask, so plants across strip borders
+        aren't split or duplicated.
+        :return: the frame mask, or None if the frame is too small to split
+        """
+        height, width = image.shape[:2]
+        strips = min(self.workers, height // MIN_STRIP_ROWS)
+        if strips < 2:
+            return None
+
+        bounds = np.linspace(0, height, strips + 1).astype(int)
+        windows = [(max(y0 - HALO, 0), min(y1 + HALO, height)) for y0, y1 in zip(bounds[:-1], bounds[1:])]
+
+        # one workspace per strip, as the strips run at the same time
+        if self.use_workspace:
+            if [workspace.shape for workspace in self.strip_workspaces] != [(w1 - w0, width) for w0, w1 in windows]:
+                self.strip_workspaces = [Workspace((w1 - w0, width)) for w0, w1 in windows]
+            workspaces = self.strip_workspaces
+        else:
+            workspaces = [None] * strips
+
+        workspace = self.get_workspace(image.shape)
+        mask = workspace.get('parallel_mask') if workspace else np.empty((height, width), dtype=np.uint8)
+
+        def process(strip):
+            (y0, y1), (w0, w1) = bounds[strip:strip + 2], windows[strip]
+            strip_mask = compiled.mask(image[w0:w1], workspace=workspaces[strip])
+            mask[y0:y1] = strip_mask[y0 - w0:y1 - w0]
+
+        for future in [self.executor.submit(process, strip) for strip in range(strips)]:
+            future.result()
+
+        return mask
+
+    def pyramid_mask(self, image, compiled):
+        """
+        Coarse-to-fine CompiledDetector.mask. The mask is first computed on a copy of the frame shrunk by pyramid_scale.
+        Only PYRAMID_TILE square tiles that contain or neighbour a coarse detection are then processed at full
+        resolution, each with a HALO margin for the local threshold and closing. Falls back to the full frame if most
+        tiles are candidates.
+
+        The mask is approximate. Plants that don't survive the coarse threshold are missed, and statistics of the
+        whole frame (the maxg scaling, brightness normalisation) are computed per tile, so it can differ noticeably
+        from CompiledDetector.mask of the full frame, most of all for maxg. The Otsu level is only updated
+        by the coarse pass, so it counts one frame.
+        """
+        height, width = image.shape[:2]
+        window = PYRAMID_TILE + 2 * HALO
+        if height < window or width < window:
+            return self.frame_mask(image, compiled)
+
+        scale = self.pyramid_scale
+        coarse_size = (max(width // scale, 1), max(height // scale, 1))
+        coarse_workspace = self.get_workspace(coarse_size[::-1])
+        coarse = cv2.resize(image, coarse_size, interpolation=cv2.INTER_AREA,
+                            dst=coarse_workspace.get('pyramid_coarse', channels=3) if coarse_workspace else None)
+        coarse_mask = compiled.mask(coarse, workspace=coarse_workspace)
+
+        # tiles with any coarse detection. The coarse threshold window covers pyramid_scale times more of the frame,
+        # so the coarse detections already extend past the plants they come from.
+        rows, columns = -(-height // PYRAMID_TILE), -(-width // PYRAMID_TILE)
+        cell = PYRAMID_TILE // scale
+        pooled = np.zeros((rows * cell, columns * cell), dtype=np.uint8)
+        coarse_rows, coarse_columns = min(coarse_mask.shape[0], rows * cell), min(coarse_mask.shape[1], columns * cell)
+        pooled[:coarse_rows, :coarse_columns] = coarse_mask[:coarse_rows, :coarse_columns]
+        candidates = pooled.reshape(rows, cell, columns, cell).max(axis=(1, 3)) > 0
+        if candidates.mean() > PYRAMID_MAX_CANDIDATES:
+            return self.frame_mask(image, compiled, update=False)
+
+        workspace = self.get_workspace(image.shape)
+        mask = workspace.get('pyramid_mask') if workspace else np.empty((height, width), dtype=np.uint8)
+        mask.fill(0)
+
+        # every window has the same shape, so one tile workspace is reused. Windows at the frame edges are shifted
+        # inwards rather than cropped.
+        tile_workspace = self.get_workspace((window, window))
+        for row, column in zip(*np.nonzero(candidates)):
+            y0, x0 = row * PYRAMID_TILE, column * PYRAMID_TILE
+            y1, x1 = min(y0 + PYRAMID_TILE, height), min(x0 + PYRAMID_TILE, width)
+            wy = min(max(y0 - HALO, 0), height - window)
+            wx = min(max(x0 - HALO, 0), width - window)
+
+            tile_mask = compiled.mask(image[wy:wy + window, wx:wx + window], workspace=tile_workspace,
+                                      update=False)
+            mask[y0:y1, x0:x1] = tile_mask[y0 - wy:y1 - wy, x0 - wx:x1 - wx]
+
+        return mask
+
+    def detections(self, mask, min_detection_area=1, workspace=None, offset=(0, 0), with_areas=False):
+        """
+        Contours, boxes and centres of the detections in a thresholded mask, with the detection_mode method.
+        :param with_areas: also return the area of each detection, the contour area or with 'components' the
+                           pixel count
+        :return: contours, boxes and weed centres (and areas), as lists or with detection_mode 'components' as arrays
+        """
+        if self.detection_mode == 'components':
+            # contours are only traced if something, e.g. the caller, uses them
+            boxes, weed_centres, areas = self.components(mask, min_detection_area, workspace, offset=offset)
+            if with_areas:
+                return LazyContours(mask, offset=offset), boxes, weed_centres, areas
+            return LazyContours(mask, offset=offset), boxes, weed_centres
+
+        weed_centres = []
+        boxes = []
+        areas = []
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
+
+        for c in contours:
+            area = cv2.contourArea(c)
+            if area > min_detection_area:
+                x, y, w, h = cv2.boundingRect(c)
+                boxes.append([x, y, w, h])
+                weed_centres.append([x + w // 2, y + h // 2])
+                areas.append(area)
+
+        if with_areas:
+            return contours, boxes, weed_centres, areas
+        return contours, boxes, weed_centres
+
+    def batch_parallel(self, algorithm):
+        """
+        True if frames of a batch can be processed at the same time on the worker threads. Brightness normalisation
+        and Otsu carry state from one frame to the next, CLAHE objects and the pyramid and yuv420 ROI buffers are
+        shared, and the fused numba kernels already use every core.
+        """
+        return (self.executor is not None
+                and self.frame_format == 'bgr'
+                and self.preprocessor is None
+                and self.pyramid_scale == 1
+                and self.threshold_methods.get(algorithm, self.threshold_method) != 'otsu'
+                and not isinstance(self.algorithms.get(algorithm), FusedIndex))
+
+    def compile(self, algorithm='exg', min_detection_area=1, label='WEED', **params):
+        """
+        CompiledDetector for an algorithm and set of thresholds, e.g. for the OWL's main loop. Build a new one when
+        the thresholds change, or when its stale property is True after set_implementation or set_threshold_method.
+        :param params: exg_min, exg_max, hue_min, hue_max, brightness_min, brightness_max, saturation_min,
+                       saturation_max and invert_hue. Missing ones use the inference defaults.
+        """
+        unknown = set(params) - set(DEFAULT_THRESHOLDS)
+        if unknown:
+            raise ValueError(f"Unknown thresholds {', '.join(sorted(unknown))}. "
+                             f"Must be from: {', '.join(DEFAULT_THRESHOLDS)}")
+
+        return CompiledDetector(self, algorithm, {**DEFAULT_THRESHOLDS, **params},
+                                min_detection_area=min_detection_area, label=label)
+
+    def inference_batch(self, frames, params=None, min_detection_area=1, algorithm='exg'):
+        """
+        Detections for a batch of frames, e.g. from recorded footage. With workers > 1 the frames are split into one
+        contiguous chunk per worker thread, each with its own workspace, so whole frames are processed at the same
+        time rather than strips of one frame. Otherwise, or if batch_parallel is False, the frames are processed in
+        order on the calling thread. Either way the detections are the same as calling inference on each frame in
+        order, and nothing is drawn.
+
+        Stacking the frames into one tall image for a single index call was tried and was slower at 320x240 to
+        1456x1088, as the batch intermediates no longer fit in cache.
+        :param frames: N x H x W x 3 array or list of frames in the detector's frame_format
+        :param params: thresholds as keyword arguments of inference, e.g. {'exg_min': 25}. Missing ones use the
+                       inference defaults.
+        :return: list of (boxes, centres) per frame, as (M, 4) and (M, 2) int32 arrays
+        """
+        compiled = self.compile(algorithm, min_detection_area=min_detection_area, **(params or {}))
+
+        if not compiled.batch_parallel or len(frames) < 2:
+            results = []
+            for frame in frames:
+                _, boxes, weed_centres, _ = compiled(frame)
+                results.append((np.asarray(boxes, dtype=np.int32).reshape(-1, 4),
+                                np.asarray(weed_centres, dtype=np.int32).reshape(-1, 2)))
+            return results
+
+        start = time.perf_counter()
+        chunks = np.array_split(np.arange(len(frames)), min(self.workers, len(frames)))
+        while len(self.batch_workspaces) < len(chunks):
+            self.batch_workspaces.append({})
+
+        def process(chunk, workspaces):
+            results = []
+            for i in chunk:
+                frame, offset = frames[i], (0, 0)
+                if self.roi is not None:
+                    offset = self.roi.offset(frame.shape)
+                    frame = self.roi.crop(frame)
+
+                if compiled.probe_empty(frame):
+                    results.append((np.empty((0, 4), dtype=np.int32), np.empty((0, 2), dtype=np.int32)))
+                    continue
+
+                workspace = None
+                if self.use_workspace:
+                    # one per frame size, as a batch may mix resolutions
+                    workspace = workspaces.setdefault(frame.shape[:2], Workspace(frame.shape))
+
+                mask = compiled.mask(frame, workspace=workspace)
+                if self.roi is not None:
+                    self.roi.apply_exclusions(mask, frames[i].shape)
+
+                _, boxes, weed_centres = self.detections(mask, min_detection_area, workspace, offset=offset)
+                results.append((np.asarray(boxes, dtype=np.int32).reshape(-1, 4),
+                                np.asarray(weed_centres, dtype=np.int32).reshape(-1, 2)))
+            return results
+
+        # frames run concurrently here, so the probe counters in timing_summary only cover frames run in order
+        futures = [self.executor.submit(process, chunk, self.batch_workspaces[n]) for n, chunk in enumerate(chunks)]
+        results = [result for future in futures for result in future.result()]
+
+        self.timings['detection'] += (time.perf_counter() - start) * 1000
+        self.timings['frames'] += len(frames)
+
+        return results
+
     def inference(self, image,
                   exg_min=30,
                   exg_max=250,
@@ -33,56 +1021,40 @@ class GreenOnBrown:
                   show_display=False,
                   algorithm='exg',
                   invert_hue=False,
-                  label='WEED'):
-        threshed_already = False
-
-        # Retrieve the function based on the algorithm name
-        func = self.algorithms.get(algorithm, exg_standardised_hue)
-
-        # Handle special cases for functions with additional parameters
-        if algorithm == 'exhsv':
-            output = func(image, hue_min=hue_min, hue_max=hue_max, brightness_min=brightness_min,
-                          brightness_max=brightness_max, saturation_min=saturation_min,
-                          saturation_max=saturation_max, invert_hue=invert_hue)
-        elif algorithm == 'hsv':
-            output, threshed_already = func(image, hue_min=hue_min, hue_max=hue_max, brightness_min=brightness_min,
-                                            brightness_max=brightness_max, saturation_min=saturation_min,
-                                            saturation_max=saturation_max, invert_hue=invert_hue)
-        else:
-            output = func(image)
-
-        weed_centres = []
-        boxes = []
+                  label='WEED',
+                  features=None):
+        """
+        Detects weeds in a BGR frame with a green-on-brown algorithm. Per-frame callers with fixed settings can skip
+        the keyword handling with compile.
+        :param features: optional FrameFeatures of the image. Pass the same object when running several algorithms
+                         on one frame so channel planes, HSV conversions and shared indices are only computed once.
+        :return: contours, boxes, weed centres and the image (annotated if show_display). With detection_mode
+                 'components' the boxes and centres are (N, 4) and (N, 2) arrays and the contours are LazyContours.
+        """
+        params = dict(exg_min=exg_min, exg_max=exg_max, hue_min=hue_min, hue_max=hue_max,
+                      brightness_min=brightness_min, brightness_max=brightness_max,
+                      saturation_min=saturation_min, saturation_max=saturation_max, invert_hue=invert_hue)
+        compiled = self.get_compiled(algorithm, params, min_detection_area=min_detection_area, label=label)
 
-        if not threshed_already:
-            output = np.clip(output, exg_min, exg_max)
-            output = np.uint8(np.abs(output))
-            if show_display:
-                cv2.imshow("HSV Threshold on ExG", output)
-            threshold_out = cv2.adaptiveThreshold(output, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV,
-                                                  31, 2)
-            # threshold_out = cv2.threshold(output, exg_min, exg_max, cv2.THRESH_BINARY)
-            threshold_out = cv2.morphologyEx(threshold_out, cv2.MORPH_CLOSE, self.kernel, iterations=1)
-        else:
-            threshold_out = cv2.morphologyEx(output, cv2.MORPH_CLOSE, self.kernel, iterations=5)
-
-        contours, _ = cv2.findContours(threshold_out, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return compiled(image, show_display=show_display, features=features)
 
-        for c in contours:
-            if cv2.contourArea(c) > min_detection_area:
-                x, y, w, h = cv2.boundingRect(c)
-                boxes.append([x, y, w, h])
-                weed_centres.append([x + w // 2, y + h // 2])
+    def get_compiled(self, algorithm, params, min_detection_area=1, label='WEED'):
+        """The last CompiledDetector while the settings stay the same, otherwise a new one."""
+        compiled = self.compiled
+        if (compiled is None or compiled.stale or compiled.algorithm != algorithm or compiled.params != params
+                or compiled.min_detection_area != min_detection_area or compiled.label != label):
+            compiled = self.compiled = self.compile(algorithm, min_detection_area=min_detection_area, label=label,
+                                                    **params)
 
-        if show_display:
-            image_out = image.copy()
-            for box in boxes:
-                startX, startY, boxW, boxH = box
-                endX = startX + boxW
-                endY = startY + boxH
-                cv2.putText(image_out, label, (startX, startY + 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 0, 0), 2)
-                cv2.rectangle(image_out, (int(startX), int(startY)), (endX, endY), (0, 0, 255), 2)
+        return compiled
 
-            return contours, boxes, weed_centres, image_out
+    def detect(self, image, algorithm='exg', min_detection_area=1, label='WEED', features=None, **params):
+        """
+        Detects weeds in a frame as inference does, but returns a DetectionResult and draws nothing. Draw it with
+        utils.detections.DetectionRenderer if it is displayed or recorded.
+        :param params: exg_min, exg_max and the hsv thresholds, the inference defaults for any not given
+        """
+        params = {**DEFAULT_THRESHOLDS, **params}
+        compiled = self.get_compiled(algorithm, params, min_detection_area=min_detection_area, label=label)
 
-        return contours, boxes, weed_centres, image
+        return compiled.detect(image, features=features)
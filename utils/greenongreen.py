@@ -5,12 +5,13 @@ from pycoral.utils.dataset import read_label_file
 from pycoral.utils.edgetpu import make_interpreter
 from pycoral.utils.edgetpu import run_inference
 from pathlib import Path
+from utils.detections import DetectionResult, DetectionRenderer
 
 import cv2
 
 
 class GreenOnGreen:
-    def __init__(self, model_path='models', label_file='models/labels.txt'):
+    def __init__(self, model_path='models', label_file='models/labels.txt', roi=None):
         if model_path is None:
             print('[WARNING] No model directory or path provided with --model-path flag. '
                   'Attempting to load from default...')
@@ -46,47 +47,74 @@ class GreenOnGreen:
         self.inference_size = input_size(self.interpreter)
         self.objects = None
 
-    def inference(self, image, confidence=0.5, filter_id=0):
-        cv2_im_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        # optional ProcessingROI, only the band that can trigger a relay is passed to the model
+        self.roi = roi if roi is not None and not roi.full_frame else None
+
+        # draws the annotated copy returned by inference, at full resolution
+        self.renderer = DetectionRenderer()
+
+    def detect(self, image, confidence=0.5, filter_id=0):
+        """
+        Objects of class filter_id in a BGR frame. Nothing is drawn, see utils.detections.DetectionRenderer.
+        :return: DetectionResult with the boxes in full frame pixels, the scores and class ids
+        """
+        # boxes are found in the ROI band and shifted back to full frame coordinates
+        roi_image, offset_x, offset_y = image, 0, 0
+        if self.roi is not None:
+            roi_image = self.roi.crop(image)
+            offset_x, offset_y = self.roi.offset(image.shape)
+
+        cv2_im_rgb = cv2.cvtColor(roi_image, cv2.COLOR_BGR2RGB)
         cv2_im_rgb = cv2.resize(cv2_im_rgb, self.inference_size)
         run_inference(self.interpreter, cv2_im_rgb.tobytes())
         self.objects = get_objects(self.interpreter, confidence)
         self.filter_id = filter_id
 
-        height, width, channels = image.shape
+        height, width, channels = roi_image.shape
         scale_x, scale_y = width / self.inference_size[0], height / self.inference_size[1]
-        self.weed_centers = []
-        self.boxes = []
 
+        boxes, centres, scores, class_ids = [], [], [], []
         for det_object in self.objects:
             if det_object.id == self.filter_id:
                 bbox = det_object.bbox.scale(scale_x, scale_y)
 
-                startX, startY = int(bbox.xmin), int(bbox.ymin)
-                endX, endY = int(bbox.xmax), int(bbox.ymax)
-                boxW = endX - startX
-                boxH = endY - startY
-
-                # save the bounding box
-                self.boxes.append([startX, startY, boxW, boxH])
+                startX, startY = int(bbox.xmin) + offset_x, int(bbox.ymin) + offset_y
+                boxW, boxH = int(bbox.xmax) + offset_x - startX, int(bbox.ymax) + offset_y - startY
+                boxes.append([startX, startY, boxW, boxH])
                 # compute box center
-                centerX = int(startX + (boxW / 2))
-                centerY = int(startY + (boxH / 2))
-                self.weed_centers.append([centerX, centerY])
-
-                percent = int(100 * det_object.score)
-                label = f'{percent}% {self.labels.get(det_object.id, det_object.id)}'
-                cv2.rectangle(image, (startX, startY), (endX, endY), (0, 0, 255), 2)
-                cv2.putText(image, label, (startX, startY + 30),
-                                     cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 0, 0), 2)
-            else:
-                pass
-        # print(self.weedCenters)
-        return None, self.boxes, self.weed_centers, image
-
-
-
-
+                centres.append([int(startX + (boxW / 2)), int(startY + (boxH / 2))])
+                scores.append(det_object.score)
+                class_ids.append(det_object.id)
 
+        # the model sees the whole band, so boxes centred in excluded areas are dropped afterwards
+        if self.roi is not None and self.roi.exclude and boxes:
+            keep = self.roi.outside_exclusions(centres, image.shape)
+            boxes, centres = [box for box, k in zip(boxes, keep) if k], [c for c, k in zip(centres, keep) if k]
+            scores, class_ids = [s for s, k in zip(scores, keep) if k], [i for i, k in zip(class_ids, keep) if k]
 
+        return DetectionResult(boxes, centres, scores=scores, class_ids=class_ids, labels=self.labels)
 
+    def inference(self, image, confidence=0.5, filter_id=0):
+        """
+        Detections in a BGR frame, drawn onto a copy so the frame itself, e.g. one ImageRecorder saves, is untouched.
+        :return: None (no contours), boxes, centres and the annotated copy
+        """
+        result = self.detect(image, confidence, filter_id)
+        self.boxes = result.boxes.tolist()
+        self.weed_centers = result.centres.tolist()
+
+        return None, self.boxes, self.weed_centers, self.renderer.render(image, result)
+
+    def inference_batch(self, frames, confidence=0.5, filter_id=0):
+        """
+        Detections for a batch of frames, with the same return as GreenOnBrown.inference_batch. Edge TPU models are
+        compiled for a batch size of 1, so the frames go through the interpreter one at a time. Nothing is drawn.
+        :param frames: N x H x W x 3 array or list of BGR frames
+        :return: list of (boxes, centres) per frame, as (M, 4) and (M, 2) int32 arrays
+        """
+        results = []
+        for frame in frames:
+            result = self.detect(frame, confidence, filter_id)
+            results.append((result.boxes, result.centres))
+
+        return results
@@ -0,0 +1,453 @@
+import hashlib
+import inspect
+import sys
+import numpy as np
+import cv2
+
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+from utils.algorithms import hsv, exg_standardised, exg_standardised_yuv420, luma_at_chroma
+from utils.frame_formats import split_yuv420, CHROMA_TO_BGR
+from utils.log_manager import LogManager
+from utils.workspace import scratch
+
+CACHE_DIRECTORY = Path(__file__).resolve().parent.parent / 'cache' / 'luts'
+
+# number of colours evaluated per call when compiling a table
+COMPILE_CHUNK = 1 << 20
+
+# part of every cache key. Bump it when the table layout or the way tables are compiled changes.
+LUT_VERSION = 2
+
+
+@lru_cache(maxsize=None)
+def module_source(module_name):
+    """Source of a loaded module, or '' if it isn't available, e.g. when only .pyc files are installed."""
+    try:
+        return inspect.getsource(sys.modules[module_name])
+    except (KeyError, OSError, TypeError):
+        return ''
+
+
+class ColourLUT:
+    def __init__(self, func, name, bits=6, cache_directory=CACHE_DIRECTORY, **params):
+        """
+        Compiles a per-pixel index function into a quantised BGR -> uint8 lookup table, so a frame can be processed
+        with a single gather per pixel instead of several full-frame passes.
+
+        The table is indexed by (r << 2 * bits) | (g << bits) | b of the quantised channels. Functions that normalise
+        by frame statistics (maxg, veg, dgci, gndvi) are evaluated over the colour cube rather than a frame, so their
+        tables are only an approximation of those indices.
+        :param func: any function that takes a BGR image and returns a grayscale image or a (mask, True) tuple
+        :param name: name used in the cache filename, e.g. the GreenOnBrown algorithm name
+        :param bits: bits kept per channel, 8 gives a full 256^3 table (16 MB), 7 a 2 MB table
+        :param cache_directory: where compiled tables are saved. None disables the disk cache.
+        :param params: keyword arguments passed to func, also part of the cache key
+        """
+        if not 1 <= bits <= 8:
+            raise ValueError(f"bits must be between 1 and 8, got {bits}")
+
+        self.func = func
+        self.name = name
+        self.bits = bits
+        self.shift = 8 - bits
+        self.levels = 1 << bits
+        self.params = params
+        self.cache_directory = Path(cache_directory) if cache_directory is not None else None
+        self.table = None
+
+        self.logger = LogManager.get_logger(__name__)
+
+    @property
+    def cache_key(self):
+        """
+        Changes whenever LUT_VERSION, the function code and constants, its parameters or the table size change. The
+        source of the module defining the function is included too, so editing a function it calls (e.g. exg for
+        exgr) also rebuilds the table.
+        """
+        key = hashlib.md5(f"v{LUT_VERSION}".encode())
+        code = getattr(self.func, '__code__', None)
+        if code is not None:
+            key.update(code.co_code)
+            key.update(repr(code.co_consts).encode())
+        else:
+            key.update(repr(self.func).encode())
+        key.update(module_source(getattr(self.func, '__module__', None)).encode())
+        key.update(repr(sorted(self.params.items())).encode())
+        return f"{self.name}_{self.bits}bit_{key.hexdigest()[:12]}"
+
+    @property
+    def cache_path(self):
+        if self.cache_directory is None:
+            return None
+        return self.cache_directory / f"{self.cache_key}.npy"
+
+    def colour_cube(self, start, stop):
+        """
+        Returns the quantised colours for flat table indices start:stop as a BGR image with one row per green/blue
+        plane, using the centre of each quantisation bin.
+        """
+        index = np.arange(start, stop, dtype=np.int32)
+        mask = self.levels - 1
+        centre = (1 << self.shift) >> 1
+
+        cube = np.empty((stop - start, 3), dtype=np.uint8)
+        cube[:, 0] = ((index & mask) << self.shift) + centre
+        cube[:, 1] = (((index >> self.bits) & mask) << self.shift) + centre
+        cube[:, 2] = ((index >> (2 * self.bits)) << self.shift) + centre
+
+        return cube.reshape(-1, self.levels, 3)
+
+    def compile(self):
+        """Load the table from the disk cache, or build and cache it."""
+        if self.table is not None:
+            return self.table
+
+        cache_path = self.cache_path
+        if cache_path is not None and cache_path.exists():
+            try:
+                self.table = np.load(cache_path)
+                self.logger.info(f"[INFO] Loaded {self.name} colour LUT from {cache_path}")
+                return self.table
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Unable to load cached LUT {cache_path}: {e}. Rebuilding.")
+
+        size = self.levels ** 3
+        table = np.empty(size, dtype=np.uint8)
+        for start in range(0, size, COMPILE_CHUNK):
+            stop = min(start + COMPILE_CHUNK, size)
+            output = self.func(self.colour_cube(start, stop), **self.params)
+            if isinstance(output, tuple):
+                output = output[0]
+            table[start:stop] = np.clip(output, 0, 255).reshape(-1)
+
+        self.table = table
+        self.logger.info(f"[INFO] Compiled {self.name} colour LUT ({self.levels}^3 entries)")
+
+        if cache_path is not None:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                np.save(cache_path, table)
+            except OSError as e:
+                self.logger.warning(f"Unable to cache LUT to {cache_path}: {e}")
+
+        return self.table
+
+    def index(self, image, workspace=None):
+        """Flat table index for every pixel of a BGR image. intp, so np.take doesn't make a converted copy."""
+        if self.bits == 8:
+            # BGRA pixels read as little-endian uint32 are b | g << 8 | r << 16 | a << 24
+            bgra = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA, dst=scratch(workspace, 'bgra', image.shape, channels=4))
+            index = scratch(workspace, 'lut_index', image.shape, np.intp)
+            np.bitwise_and(bgra.view(np.uint32)[:, :, 0], 0xFFFFFF, out=index)
+            return index
+
+        index = scratch(workspace, 'lut_index', image.shape, np.intp)
+        channel = scratch(workspace, 'lut_channel', image.shape)
+        np.right_shift(image[:, :, 2], self.shift, out=channel)
+        np.copyto(index, channel)
+        for c in (1, 0):
+            index <<= self.bits
+            np.right_shift(image[:, :, c], self.shift, out=channel)
+            index |= channel
+        return index
+
+    def apply(self, image, out=None, workspace=None):
+        """
+        Returns the index image for a BGR frame with one lookup per pixel.
+        :param image: image as a BGR array (i.e. opened with opencv not PIL)
+        :param out: optional uint8 array with the frame height and width to write into
+        :param workspace: optional Workspace for the table index and output
+        :return: grayscale image
+        """
+        if self.table is None:
+            self.compile()
+
+        if out is None and workspace is not None:
+            out = workspace.get('index')
+
+        # mode='clip' avoids the buffered copy np.take makes for out= in the default mode
+        return np.take(self.table, self.index(image, workspace=workspace), out=out, mode='clip')
+
+    def __call__(self, image, workspace=None):
+        return self.apply(image, workspace=workspace)
+
+
+class MaskLUT(ColourLUT):
+    """
+    ColourLUT of a function that returns a binary mask. Calls return (mask, True) like hsv, so inference skips
+    the adaptive threshold.
+    """
+    def __call__(self, image, workspace=None):
+        return self.apply(image, workspace=workspace), True
+
+
+class ThresholdLUT(ColourLUT):
+    def __init__(self, algorithm='hsv', bits=8, max_tables=4, cache_directory=CACHE_DIRECTORY):
+        """
+        Bakes the hsv thresholds (and for exhsv the ExG index) into a colour lookup table, so a frame becomes a mask
+        with a single lookup instead of a cvtColor to HSV and three inRange calls.
+
+        The hue, saturation and brightness of every table colour are computed once. When thresholds change only
+        the component mask for the changed channel is rebuilt, and the last max_tables finished tables stay
+        resident so switching between sensitivity profiles costs nothing.
+        :param algorithm: 'hsv' returns a binary mask, 'exhsv' returns the ExG index gated by the hsv mask
+        :param bits: bits kept per channel. Memory is roughly 10 bytes per entry with 4 tables kept, about 160 MB
+                     at 8 bits (2^24 entries), which is too much for a Pi 3, and 20 MB at 7 bits. Below 8 bits
+                     colours near a threshold can land on the wrong side of it.
+        :param max_tables: number of finished tables kept for different threshold sets
+        :param cache_directory: where the exhsv ExG table is cached, see ColourLUT
+        """
+        if algorithm not in ('hsv', 'exhsv'):
+            raise ValueError(f"ThresholdLUT supports 'hsv' and 'exhsv', got {algorithm}")
+
+        super().__init__(hsv, algorithm, bits=bits, cache_directory=cache_directory)
+        self.algorithm = algorithm
+        self.max_tables = max_tables
+        self.exg_lut = ColourLUT(exg_standardised, 'nexg', bits=bits, cache_directory=cache_directory)
+
+        self.planes = None
+        self.components = {}
+        self.component_params = {}
+        self.tables = OrderedDict()
+        # batch frames are processed on several threads, and the components are shared between threshold sets
+        self.lock = Lock()
+
+    def compile(self):
+        """Compute the hue, saturation and brightness of every table colour."""
+        if self.planes is not None:
+            return self.planes
+
+        cube = self.colour_cube(0, self.levels ** 3)
+        hsv_cube = cv2.cvtColor(cube, cv2.COLOR_BGR2HSV)
+        self.planes = {
+            'hue': np.ascontiguousarray(hsv_cube[:, :, 0]),
+            'sat': np.ascontiguousarray(hsv_cube[:, :, 1]),
+            'val': np.ascontiguousarray(hsv_cube[:, :, 2])
+        }
+        if self.algorithm == 'exhsv':
+            self.planes['exg'] = self.exg_lut.compile().reshape(cube.shape[:2])
+
+        return self.planes
+
+    def prepare(self,
+                hue_min=30,
+                hue_max=90,
+                brightness_min=10,
+                brightness_max=220,
+                saturation_min=30,
+                saturation_max=255,
+                invert_hue=False):
+        """
+        Returns the table for a set of thresholds, building only the components that changed since the last build.
+        """
+        with self.lock:
+            key = (hue_min, hue_max, brightness_min, brightness_max, saturation_min, saturation_max, bool(invert_hue))
+            table = self.tables.get(key)
+            if table is not None:
+                self.tables.move_to_end(key)
+                return table
+
+            planes = self.compile()
+            params = {
+                'hue': (hue_min, hue_max, bool(invert_hue)),
+                'sat': (saturation_min, saturation_max),
+                'val': (brightness_min, brightness_max)
+            }
+            for channel, channel_params in params.items():
+                if self.component_params.get(channel) == channel_params:
+                    continue
+
+                component = cv2.inRange(planes[channel], channel_params[0], channel_params[1])
+                if channel == 'hue' and invert_hue:
+                    component = cv2.bitwise_not(component)
+                self.components[channel] = component
+                self.component_params[channel] = channel_params
+
+            table = cv2.bitwise_and(self.components['hue'], self.components['sat'])
+            cv2.bitwise_and(table, self.components['val'], dst=table)
+            if self.algorithm == 'exhsv':
+                cv2.bitwise_and(table, planes['exg'], dst=table)
+            table = table.reshape(-1)
+
+            self.tables[key] = table
+            if len(self.tables) > self.max_tables:
+                self.tables.popitem(last=False)
+
+            return table
+
+    def apply(self, image, out=None, workspace=None, table=None):
+        """
+        Applies a table from prepare, by default the one of the most recent call or the default thresholds if there
+        has not been one.
+        """
+        if table is None:
+            if self.table is None:
+                self.table = self.prepare()
+            table = self.table
+
+        if out is None and workspace is not None:
+            out = workspace.get('index')
+
+        return np.take(table, self.index(image, workspace=workspace), out=out, mode='clip')
+
+    def __call__(self, image,
+                 hue_min=30,
+                 hue_max=90,
+                 brightness_min=10,
+                 brightness_max=220,
+                 saturation_min=30,
+                 saturation_max=255,
+                 invert_hue=False,
+                 workspace=None):
+        # the table is kept for apply, but this call uses its own so concurrent calls with other thresholds,
+        # e.g. the empty-frame probe, can't swap it
+        table = self.table = self.prepare(hue_min=hue_min, hue_max=hue_max,
+                                          brightness_min=brightness_min, brightness_max=brightness_max,
+                                          saturation_min=saturation_min, saturation_max=saturation_max,
+                                          invert_hue=invert_hue)
+        image_out = self.apply(image, workspace=workspace, table=table)
+
+        if self.algorithm == 'hsv':
+            return image_out, True
+
+        return image_out
+
+
+class ChromaThresholdLUT:
+    def __init__(self, algorithm='hsv', max_tables=4):
+        """
+        hsv and exhsv thresholds for full range I420 frames, evaluated at chroma resolution without converting to BGR.
+
+        In YCbCr every channel is Y plus an offset that only depends on the chroma, so the hue and max - min of a
+        pixel only depend on (U, V), and V = Y + max offset. The hue, saturation and brightness thresholds therefore
+        reduce to a per-(U, V) range of allowed Y, stored as two 256 x 256 tables of lower and upper bounds. A frame
+        becomes a mask with two lookups and an inRange of Y against the looked-up bounds. The saturation and
+        brightness limits are exact for in-gamut colours, while 8-bit rounding means the boundaries can differ from
+        cv2.cvtColor by a level.
+        :param algorithm: 'hsv' returns a binary mask, 'exhsv' returns the standardised ExG gated by the hsv mask
+        :param max_tables: number of bound tables kept for different threshold sets
+        """
+        if algorithm not in ('hsv', 'exhsv'):
+            raise ValueError(f"ChromaThresholdLUT supports 'hsv' and 'exhsv', got {algorithm}")
+
+        self.algorithm = algorithm
+        self.max_tables = max_tables
+        self.planes = None
+        self.tables = OrderedDict()
+        self.bounds = None
+
+    def compile(self):
+        """Hue (0 - 180), max - min and max channel offset for every (U, V), indexed by U << 8 | V."""
+        if self.planes is not None:
+            return self.planes
+
+        chroma = np.arange(256, dtype=np.float64) - 128
+        cb, cr = np.meshgrid(chroma, chroma, indexing='ij')
+        offsets = np.stack([CHROMA_TO_BGR[c, 0] * cb + CHROMA_TO_BGR[c, 1] * cr for c in range(3)]).reshape(3, -1)
+        blue, green, red = offsets
+
+        max_offset = offsets.max(axis=0)
+        diff = max_offset - offsets.min(axis=0)
+        safe_diff = np.where(diff == 0, 1, diff)
+
+        # same case order as cv2.cvtColor, red first then green then blue
+        hue = np.select([max_offset == red, max_offset == green],
+                        [60 * (green - blue) / safe_diff, 120 + 60 * (blue - red) / safe_diff],
+                        240 + 60 * (red - green) / safe_diff)
+        hue = np.where(diff == 0, 0, np.where(hue < 0, hue + 360, hue))
+
+        self.planes = {
+            'hue': np.round(hue / 2).astype(np.uint8),
+            'diff': diff,
+            'max_offset': max_offset
+        }
+        return self.planes
+
+    def prepare(self,
+                hue_min=30,
+                hue_max=90,
+                brightness_min=10,
+                brightness_max=220,
+                saturation_min=30,
+                saturation_max=255,
+                invert_hue=False):
+        """Returns the (lower, upper) bound tables of Y for a set of thresholds."""
+        key = (hue_min, hue_max, brightness_min, brightness_max, saturation_min, saturation_max, bool(invert_hue))
+        bounds = self.tables.get(key)
+        if bounds is not None:
+            self.tables.move_to_end(key)
+            return bounds
+
+        planes = self.compile()
+        diff = planes['diff']
+
+        hue_ok = (planes['hue'] >= hue_min) & (planes['hue'] <= hue_max)
+        if invert_hue:
+            hue_ok = ~hue_ok
+
+        # S = 255 * diff / V, so the saturation limits become limits on V = Y + max offset
+        with np.errstate(divide='ignore'):
+            if saturation_max > 0:
+                lower_value = np.maximum(brightness_min, 255 * diff / saturation_max)
+            else:
+                lower_value = np.where(diff == 0, brightness_min, np.inf)
+            upper_value = np.minimum(brightness_max, 255 * diff / saturation_min) if saturation_min > 0 \
+                else np.full_like(diff, brightness_max)
+
+        lower = np.ceil(lower_value - planes['max_offset'])
+        upper = np.floor(upper_value - planes['max_offset'])
+        valid = hue_ok & (lower <= upper) & (lower <= 255) & (upper >= 0)
+
+        bounds = (np.where(valid, np.clip(lower, 0, 255), 255).astype(np.uint8),
+                  np.where(valid, np.clip(upper, 0, 255), 0).astype(np.uint8))
+
+        self.tables[key] = bounds
+        if len(self.tables) > self.max_tables:
+            self.tables.popitem(last=False)
+
+        return bounds
+
+    def mask(self, frame, workspace=None, bounds=None):
+        """
+        hsv mask of an I420 frame at chroma resolution using bounds from prepare, by default those of the most recent
+        call.
+        """
+        if bounds is None:
+            if self.bounds is None:
+                self.bounds = self.prepare()
+            bounds = self.bounds
+
+        _, u, v = split_yuv420(frame)
+        index = scratch(workspace, 'chroma_lut_index', u.shape, np.intp)
+        np.copyto(index, u)
+        index <<= 8
+        index |= v
+
+        lower = np.take(bounds[0], index, out=scratch(workspace, 'chroma_lower', u.shape), mode='clip')
+        upper = np.take(bounds[1], index, out=scratch(workspace, 'chroma_upper', u.shape), mode='clip')
+        return cv2.inRange(luma_at_chroma(frame, workspace=workspace), lower, upper,
+                           dst=scratch(workspace, 'chroma_mask', u.shape))
+
+    def __call__(self, frame,
+                 hue_min=30,
+                 hue_max=90,
+                 brightness_min=10,
+                 brightness_max=220,
+                 saturation_min=30,
+                 saturation_max=255,
+                 invert_hue=False,
+                 workspace=None):
+        bounds = self.bounds = self.prepare(hue_min=hue_min, hue_max=hue_max,
+                                            brightness_min=brightness_min, brightness_max=brightness_max,
+                                            saturation_min=saturation_min, saturation_max=saturation_max,
+                                            invert_hue=invert_hue)
+        mask = self.mask(frame, workspace=workspace, bounds=bounds)
+
+        if self.algorithm == 'hsv':
+            return mask, True
+
+        nexg = exg_standardised_yuv420(frame, workspace=workspace)
+        return cv2.bitwise_and(nexg, mask, dst=nexg)
@@ -0,0 +1,205 @@
+"""
+Fused index + clip (+ hsv gating) kernels for the 'numba' GreenOnBrown implementation.
+
+Each kernel makes a single row-parallel pass over the BGR frame and writes the clipped index straight into the
+output, instead of the channel copies, index, clip and inRange passes of the numpy versions. The arithmetic follows
+the numpy versions step by step (float32 where they use float32, OpenCV's fixed-point HSV conversion), so the output
+matches 'numpy' followed by the exg_min/exg_max clip in inference.
+
+Numba is optional. Without it NUMBA_AVAILABLE is False, GreenOnBrown doesn't register the implementation and the
+numpy versions are used. Compiled kernels are cached in cache/numba (or NUMBA_CACHE_DIR if set) so only the first
+boot after an install or update pays the JIT cost.
+"""
+import os
+import numpy as np
+
+from pathlib import Path
+from utils.workspace import scratch
+
+CACHE_DIRECTORY = Path(__file__).resolve().parent.parent / 'cache' / 'numba'
+
+# must be set before numba is imported to move the cache out of __pycache__
+os.environ.setdefault('NUMBA_CACHE_DIR', str(CACHE_DIRECTORY))
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        # plain Python functions, kept importable for testing without numba
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# OpenCV's 8-bit BGR2HSV tables, round((255 << 12) / v) and round((180 << 12) / (6 * diff)) with 0 for 0
+HSV_SHIFT = 12
+SATURATION_TABLE = np.concatenate(([0], np.rint((255 << HSV_SHIFT) / np.arange(1, 256)))).astype(np.int32)
+HUE_TABLE = np.concatenate(([0], np.rint((180 << HSV_SHIFT) / (6.0 * np.arange(1, 256))))).astype(np.int32)
+
+KERNEL_OPTIONS = {'parallel': True, 'cache': True, 'nogil': True}
+
+
+@njit(inline='always')
+def _hsv_pass(b, g, r, hue_min, hue_max, saturation_min, saturation_max, brightness_min, brightness_max,
+              invert_hue, saturation_table, hue_table):
+    """cv2.COLOR_BGR2HSV of one pixel followed by the hsv thresholds, True if the pixel passes."""
+    v = max(b, g, r)
+    diff = v - min(b, g, r)
+
+    s = (diff * saturation_table[v] + (1 << (HSV_SHIFT - 1))) >> HSV_SHIFT
+    if v == r:
+        h = g - b
+    elif v == g:
+        h = b - r + 2 * diff
+    else:
+        h = r - g + 4 * diff
+    h = (h * hue_table[diff] + (1 << (HSV_SHIFT - 1))) >> HSV_SHIFT
+    if h < 0:
+        h += 180
+
+    hue_pass = hue_min <= h <= hue_max
+    if invert_hue:
+        hue_pass = not hue_pass
+
+    return hue_pass and saturation_min <= s <= saturation_max and brightness_min <= v <= brightness_max
+
+
+@njit(inline='always')
+def _clip(value, low, high):
+    if value < low:
+        return low
+    if value > high:
+        return high
+    return value
+
+
+@njit(**KERNEL_OPTIONS)
+def exg_kernel(image, exg_min, exg_max, out):
+    for y in prange(image.shape[0]):
+        for x in range(image.shape[1]):
+            b = np.int32(image[y, x, 0])
+            g = np.int32(image[y, x, 1])
+            r = np.int32(image[y, x, 2])
+            out[y, x] = _clip(_clip(2 * g - r - b, 0, 255), exg_min, exg_max)
+
+
+@njit(**KERNEL_OPTIONS)
+def exgr_kernel(image, exg_min, exg_max, out):
+    red_weight = np.float32(1.4)
+    for y in prange(image.shape[0]):
+        for x in range(image.shape[1]):
+            b = np.int32(image[y, x, 0])
+            g = np.int32(image[y, x, 1])
+            r = np.int32(image[y, x, 2])
+            exg_value = np.float32(_clip(2 * g - r - b, 0, 255))
+            value = exg_value - (red_weight * np.float32(r) - np.float32(g))
+            out[y, x] = _clip(np.int32(_clip(value, np.float32(0), np.float32(255))), exg_min, exg_max)
+
+
+@njit(inline='always')
+def _exg_standardised(b, g, r):
+    """exg_standardised of one pixel, with the same float32 operations as the numpy version."""
+    channel_sum = np.float32(b + g + r)
+    if channel_sum == 0:
+        channel_sum = np.float32(1)
+    bn = np.float32(b) / channel_sum
+    gn = np.float32(g) / channel_sum
+    rn = np.float32(r) / channel_sum
+    value = np.float32(255) * (np.float32(2) * gn - rn - bn)
+    return np.int32(_clip(value, np.float32(0), np.float32(255)))
+
+
+@njit(**KERNEL_OPTIONS)
+def exg_standardised_kernel(image, exg_min, exg_max, out):
+    for y in prange(image.shape[0]):
+        for x in range(image.shape[1]):
+            value = _exg_standardised(np.int32(image[y, x, 0]), np.int32(image[y, x, 1]), np.int32(image[y, x, 2]))
+            out[y, x] = _clip(value, exg_min, exg_max)
+
+
+@njit(**KERNEL_OPTIONS)
+def exg_standardised_hue_kernel(image, exg_min, exg_max, hue_min, hue_max, saturation_min, saturation_max,
+                                brightness_min, brightness_max, invert_hue, saturation_table, hue_table, out):
+    for y in prange(image.shape[0]):
+        for x in range(image.shape[1]):
+            b = np.int32(image[y, x, 0])
+            g = np.int32(image[y, x, 1])
+            r = np.int32(image[y, x, 2])
+            value = 0
+            if _hsv_pass(b, g, r, hue_min, hue_max, saturation_min, saturation_max, brightness_min, brightness_max,
+                         invert_hue, saturation_table, hue_table):
+                value = _exg_standardised(b, g, r)
+            out[y, x] = _clip(value, exg_min, exg_max)
+
+
+@njit(**KERNEL_OPTIONS)
+def hsv_kernel(image, hue_min, hue_max, saturation_min, saturation_max, brightness_min, brightness_max,
+               invert_hue, saturation_table, hue_table, out):
+    for y in prange(image.shape[0]):
+        for x in range(image.shape[1]):
+            passed = _hsv_pass(np.int32(image[y, x, 0]), np.int32(image[y, x, 1]), np.int32(image[y, x, 2]),
+                               hue_min, hue_max, saturation_min, saturation_max, brightness_min, brightness_max,
+                               invert_hue, saturation_table, hue_table)
+            out[y, x] = 255 if passed else 0
+
+
+class FusedIndex:
+    def __init__(self, algorithm):
+        """
+        GreenOnBrown implementation backed by one of the fused kernels above. Calls take exg_min and exg_max so
+        inference can hand over the clip, and write into the workspace 'index' buffer when one is given.
+        :param algorithm: 'exg', 'exgr', 'nexg', 'exhsv' or 'hsv'
+        """
+        kernels = {
+            'exg': exg_kernel,
+            'exgr': exgr_kernel,
+            'nexg': exg_standardised_kernel,
+            'exhsv': exg_standardised_hue_kernel,
+            'hsv': hsv_kernel
+        }
+        if algorithm not in kernels:
+            raise ValueError(f"No fused kernel for {algorithm}. Available: {', '.join(kernels)}")
+
+        self.algorithm = algorithm
+        self.kernel = kernels[algorithm]
+        self.compiled = False
+
+    def compile(self):
+        """Compile (or load from the disk cache) ahead of the first frame."""
+        if not self.compiled:
+            self(np.zeros((2, 2, 3), dtype=np.uint8))
+            self.compiled = True
+
+    def __call__(self, image,
+                 exg_min=0,
+                 exg_max=255,
+                 hue_min=30,
+                 hue_max=90,
+                 brightness_min=10,
+                 brightness_max=220,
+                 saturation_min=30,
+                 saturation_max=255,
+                 invert_hue=False,
+                 workspace=None):
+        """
+        :param image: image as a BGR array (i.e. opened with opencv not PIL)
+        :return: index clipped to exg_min - exg_max, or for hsv the mask and True
+        """
+        out = scratch(workspace, 'index', image.shape)
+        image = np.ascontiguousarray(image)
+
+        if self.algorithm == 'hsv':
+            self.kernel(image, hue_min, hue_max, saturation_min, saturation_max, brightness_min, brightness_max,
+                        bool(invert_hue), SATURATION_TABLE, HUE_TABLE, out)
+            return out, True
+
+        if self.algorithm == 'exhsv':
+            self.kernel(image, exg_min, exg_max, hue_min, hue_max, saturation_min, saturation_max,
+                        brightness_min, brightness_max, bool(invert_hue), SATURATION_TABLE, HUE_TABLE, out)
+        else:
+            self.kernel(image, exg_min, exg_max, out)
+
+        return out
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+"""
+Per-pixel plant/soil classifier trained from labelled frames, used by the 'classifier' GreenOnBrown algorithm.
+
+Training needs a directory of frames, e.g. those saved by ImageRecorder with sample_method = whole, and a directory of
+masks painted over them with the same file names (any image format). In a mask, 255 marks plant and 0 marks soil or
+residue. Any other value is ignored, so anti-aliased brush edges and unpainted regions don't add label noise.
+
+Usage:
+    python -m utils.pixel_classifier --images data/frames --masks data/masks --output models/pixel_classifier.npz
+
+Then set algorithm = classifier and classifier_path = models/pixel_classifier.npz in the config. With
+implementation = lut the model is compiled into a colour lookup table, so each frame costs one lookup per pixel.
+"""
+import argparse
+import hashlib
+import time
+import numpy as np
+import cv2
+
+from pathlib import Path
+from utils.lut_manager import MaskLUT
+from utils.log_manager import LogManager
+
+FEATURE_NAMES = ('g_chromaticity', 'r_chromaticity', 'hue_cos', 'hue_sin', 'saturation', 'value')
+
+PLANT = 255
+SOIL = 0
+
+# added to every variance, as a fraction of the largest feature variance, so no class has a zero-width Gaussian
+VAR_SMOOTHING = 1e-3
+
+# colours evaluated per call when classifying large images, to bound the float32 feature memory
+CHUNK_PIXELS = 1 << 18
+
+
+def colour_features(image):
+    """
+    Colour features of every pixel of a BGR image: green and red chromaticity, hue as a point on the unit circle so
+    red hues either side of 0 stay close, and saturation and brightness.
+    :param image: uint8 BGR image of any 2D shape
+    :return: float32 array of shape (pixels, len(FEATURE_NAMES))
+    """
+    image = image.reshape(-1, 1, 3)
+    features = np.empty((image.shape[0], len(FEATURE_NAMES)), dtype=np.float32)
+
+    bgr = image[:, 0, :].astype(np.float32)
+    total = bgr.sum(axis=1) + 1
+    features[:, 0] = bgr[:, 1] / total
+    features[:, 1] = bgr[:, 2] / total
+
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV_FULL)[:, 0, :].astype(np.float32)
+    angle = hsv[:, 0] * (2 * np.pi / 256)
+    features[:, 2] = np.cos(angle)
+    features[:, 3] = np.sin(angle)
+    features[:, 4] = hsv[:, 1] / 255
+    features[:, 5] = hsv[:, 2] / 255
+
+    return features
+
+
+class PixelClassifier:
+    def __init__(self, means, variances, log_priors, threshold=0.5):
+        """
+        Gaussian Naive Bayes over colour_features, with one Gaussian per feature for soil (row 0) and plant (row 1).
+        Train with PixelClassifier.fit, or load a saved model with PixelClassifier.load.
+        :param means: (2, features) class means
+        :param variances: (2, features) class variances
+        :param log_priors: (2,) log class priors
+        :param threshold: plant probability above which a pixel is marked as plant
+        """
+        self.means = np.asarray(means, dtype=np.float32)
+        self.variances = np.asarray(variances, dtype=np.float32)
+        self.log_priors = np.asarray(log_priors, dtype=np.float32)
+        self.threshold = float(threshold)
+
+        if self.means.shape != (2, len(FEATURE_NAMES)) or self.variances.shape != self.means.shape:
+            raise ValueError(f"Expected means and variances of shape (2, {len(FEATURE_NAMES)}), "
+                             f"got {self.means.shape} and {self.variances.shape}")
+        if not 0 < self.threshold < 1:
+            raise ValueError(f"threshold must be between 0 and 1, got {threshold}")
+
+        # log p(x | plant) - log p(x | soil) is a quadratic in each feature, sum(a * x^2 + b * x) + c
+        inverse = 1 / self.variances
+        self.quadratic = 0.5 * (inverse[0] - inverse[1])
+        self.linear = self.means[1] * inverse[1] - self.means[0] * inverse[0]
+        self.constant = (self.log_priors[1] - self.log_priors[0]
+                         - 0.5 * np.sum(np.log(self.variances[1] / self.variances[0]))
+                         - 0.5 * np.sum(self.means[1] ** 2 * inverse[1] - self.means[0] ** 2 * inverse[0]))
+        self.log_odds_threshold = np.log(self.threshold / (1 - self.threshold))
+
+        self.logger = LogManager.get_logger(__name__)
+
+    @classmethod
+    def fit(cls, features, labels, threshold=0.5, class_counts=None):
+        """
+        :param features: (pixels, features) array from colour_features
+        :param labels: (pixels,) array of PLANT or SOIL
+        :param threshold: plant probability threshold stored with the model
+        :param class_counts: optional (soil, plant) pixel counts for the priors, if the samples were balanced
+        """
+        labels = np.asarray(labels).reshape(-1)
+        classes = [features[labels == SOIL], features[labels == PLANT]]
+        if any(len(samples) < 2 for samples in classes):
+            raise ValueError("Training data needs at least two soil (0) and two plant (255) pixels")
+
+        means = np.stack([samples.mean(axis=0) for samples in classes])
+        variances = np.stack([samples.var(axis=0) for samples in classes])
+        variances += VAR_SMOOTHING * variances.max()
+
+        counts = np.asarray(class_counts if class_counts is not None else [len(c) for c in classes], dtype=np.float64)
+        log_priors = np.log(counts / counts.sum())
+
+        return cls(means, variances, log_priors, threshold=threshold)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as model:
+            names = tuple(str(name) for name in model['feature_names'])
+            if names != FEATURE_NAMES:
+                raise ValueError(f"{path} was trained on features {names}, expected {FEATURE_NAMES}. Retrain it.")
+
+            return cls(model['means'], model['variances'], model['log_priors'], threshold=float(model['threshold']))
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, means=self.means, variances=self.variances, log_priors=self.log_priors,
+                 threshold=self.threshold, feature_names=np.array(FEATURE_NAMES))
+
+    @property
+    def digest(self):
+        """Short hash of the model, so compiled tables are cached per model."""
+        key = hashlib.md5()
+        for array in (self.means, self.variances, self.log_priors, np.float32(self.threshold)):
+            key.update(np.ascontiguousarray(array).tobytes())
+        return key.hexdigest()[:12]
+
+    def log_odds(self, features):
+        return (features * features) @ self.quadratic + features @ self.linear + self.constant
+
+    def probability(self, image):
+        """Plant probability of every pixel of a BGR image, as float32 with the image height and width."""
+        pixels = image.reshape(-1, 3)
+        log_odds = np.empty(pixels.shape[0], dtype=np.float32)
+        for start in range(0, pixels.shape[0], CHUNK_PIXELS):
+            log_odds[start:start + CHUNK_PIXELS] = self.log_odds(colour_features(pixels[start:start + CHUNK_PIXELS]))
+
+        return (1 / (1 + np.exp(-log_odds))).reshape(image.shape[:-1])
+
+    def mask(self, image):
+        """uint8 mask of the pixels classified as plant (255)."""
+        pixels = image.reshape(-1, 3)
+        mask = np.empty(pixels.shape[0], dtype=np.uint8)
+        for start in range(0, pixels.shape[0], CHUNK_PIXELS):
+            log_odds = self.log_odds(colour_features(pixels[start:start + CHUNK_PIXELS]))
+            mask[start:start + CHUNK_PIXELS] = np.where(log_odds > self.log_odds_threshold, PLANT, SOIL)
+
+        return mask.reshape(image.shape[:-1])
+
+    def __call__(self, image, workspace=None):
+        """
+        Reference implementation of the classifier algorithm.
+        :return: plant mask and True, as the mask is already thresholded
+        """
+        return self.mask(image), True
+
+    def lut(self, bits=8):
+        """The model compiled into a colour lookup table, cached on disk per model."""
+        return MaskLUT(self.mask, f'classifier_{self.digest}', bits=bits)
+
+
+def mask_path(masks_directory, image_path):
+    """Mask with the same file name as image_path in masks_directory, in any image format."""
+    for candidate in sorted(Path(masks_directory).glob(f'{image_path.stem}.*')):
+        if cv2.haveImageReader(str(candidate)):
+            return candidate
+    return None
+
+
+def sample_pixels(image, mask, max_samples, rng):
+    """
+    Colour features and labels for up to max_samples plant and max_samples soil pixels of one frame.
+    :return: features, labels and the (soil, plant) pixel counts of the whole mask
+    """
+    pixels = image.reshape(-1, 3)
+    labels = mask.reshape(-1)
+
+    samples, counts = [], []
+    for label in (SOIL, PLANT):
+        index = np.flatnonzero(labels == label)
+        counts.append(len(index))
+        if len(index) > max_samples:
+            index = rng.choice(index, max_samples, replace=False)
+        samples.append(index)
+
+    index = np.concatenate(samples)
+    return colour_features(pixels[index]), labels[index], counts
+
+
+def load_training_set(images_directory, masks_directory, max_samples=20000, seed=0):
+    """
+    Features, labels and whole-frame (soil, plant) counts from every frame with a matching mask.
+    """
+    logger = LogManager.get_logger(__name__)
+    rng = np.random.default_rng(seed)
+
+    features, labels = [], []
+    counts = np.zeros(2, dtype=np.int64)
+    for image_path in sorted(Path(images_directory).iterdir()):
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+
+        path = mask_path(masks_directory, image_path)
+        if path is None:
+            logger.warning(f"No mask for {image_path.name}, skipping")
+            continue
+
+        mask = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        if mask is None or mask.shape != image.shape[:2]:
+            logger.warning(f"Mask {path.name} is unreadable or a different size to {image_path.name}, skipping")
+            continue
+
+        frame_features, frame_labels, frame_counts = sample_pixels(image, mask, max_samples, rng)
+        features.append(frame_features)
+        labels.append(frame_labels)
+        counts += frame_counts
+
+    if not features:
+        raise ValueError(f"No frames in {images_directory} with a matching mask in {masks_directory}")
+
+    return np.concatenate(features), np.concatenate(labels), counts
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--images', type=str, required=True, help='directory of training frames')
+    ap.add_argument('--masks', type=str, required=True, help='directory of masks with the same file names')
+    ap.add_argument('--output', type=str, default='models/pixel_classifier.npz', help='model file to write')
+    ap.add_argument('--threshold', type=float, default=0.5, help='plant probability threshold')
+    ap.add_argument('--max-samples', type=int, default=20000, help='pixels sampled per class per frame')
+    ap.add_argument('--validation', type=float, default=0.2, help='share of sampled pixels held out for validation')
+    ap.add_argument('--lut-bits', type=int, default=8, help='bits per channel of the compiled table to time')
+    args = ap.parse_args()
+
+    features, labels, counts = load_training_set(args.images, args.masks, max_samples=args.max_samples)
+    print(f"[INFO] {len(labels)} sampled pixels, {counts[1] / counts.sum():.1%} plant across all masks")
+
+    rng = np.random.default_rng(1)
+    held_out = rng.random(len(labels)) < args.validation
+    classifier = PixelClassifier.fit(features[~held_out], labels[~held_out], threshold=args.threshold,
+                                     class_counts=counts)
+
+    if held_out.any():
+        predicted = np.where(classifier.log_odds(features[held_out]) > classifier.log_odds_threshold, PLANT, SOIL)
+        actual = labels[held_out]
+        for name, label in (('plant', PLANT), ('soil', SOIL)):
+            recall = np.mean(predicted[actual == label] == label) if np.any(actual == label) else float('nan')
+            print(f"[INFO] {name} recall on held out pixels: {recall:.3f}")
+
+    classifier.save(args.output)
+    print(f"[INFO] Saved model to {args.output}")
+
+    # time the table the OWL will use against the reference on a synthetic 640x480 frame
+    frame = np.random.default_rng(2).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    table = classifier.lut(bits=args.lut_bits)
+    table.compile()
+    for name, func in (('numpy', classifier), ('lut', table)):
+        start = time.perf_counter()
+        for _ in range(10):
+            func(frame)
+        print(f"[INFO] {name}: {(time.perf_counter() - start) * 100:.2f} ms per 640x480 frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import numpy as np
+import cv2
+
+from utils.frame_formats import split_yuv420
+from utils.workspace import scratch
+
+PREPROCESSING_METHODS = ('none', 'normalise', 'clahe')
+
+# persistent CLAHE objects keyed by (height, width, clip limit, tile grid), see get_clahe
+_CLAHE_INSTANCES = {}
+
+
+def get_clahe(shape, clip_limit=20, tile_grid_size=(64, 64)):
+    """
+    Returns a CLAHE object for a frame size, creating it only the first time. OpenCV sizes the internal buffers to
+    the first image applied, so one object is kept per resolution.
+    """
+    key = (shape[0], shape[1], clip_limit, tuple(tile_grid_size))
+    clahe = _CLAHE_INSTANCES.get(key)
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tuple(tile_grid_size))
+        _CLAHE_INSTANCES[key] = clahe
+
+    return clahe
+
+
+def equalisation_lut(hist, intensity=1.0):
+    """
+    256-entry LUT with the same mapping as cv2.equalizeHist for an image with this histogram, scaled by intensity
+    and truncated to uint8 as in normalize_brightness.
+    :param hist: 256 bin histogram of the channel
+    :param intensity: scale applied after equalisation
+    """
+    hist = np.asarray(hist, dtype=np.float64).reshape(-1)
+    total = hist.sum()
+    nonzero = np.flatnonzero(hist)
+    if len(nonzero) == 0:
+        return np.arange(256, dtype=np.uint8)
+
+    first = nonzero[0]
+    if hist[first] == total:
+        lut = np.full(256, first, dtype=np.float64)
+    else:
+        lut = np.rint((np.cumsum(hist) - hist[first]) * (255.0 / (total - hist[first])))
+        lut[:first] = 0
+
+    return np.clip(intensity * np.clip(lut, 0, 255), 0, 255).astype(np.uint8)
+
+
+class BrightnessNormaliser:
+    def __init__(self, intensity=0.8, update_interval=30, luminance_change=20):
+        """
+        normalize_brightness with the equalisation mapping cached as a LUT. The histogram is only recomputed every
+        update_interval frames, or straight away if the mean brightness moves by more than luminance_change levels
+        from the frame the mapping was built on. Other frames only need a cv2.LUT on the Y channel.
+        :param intensity: scale applied to the equalised brightness, as in normalize_brightness
+        :param update_interval: frames between histogram updates
+        :param luminance_change: change in mean brightness that forces an update
+        """
+        self.intensity = intensity
+        self.update_interval = update_interval
+        self.luminance_change = luminance_change
+
+        self.lut = None
+        self.reference_luminance = None
+        self.frames_since_update = 0
+
+    def update_needed(self, luma):
+        if self.lut is None or self.frames_since_update >= self.update_interval:
+            return True
+
+        return abs(cv2.mean(luma)[0] - self.reference_luminance) > self.luminance_change
+
+    def update(self, luma):
+        hist = cv2.calcHist([luma], [0], None, [256], [0, 256])
+        self.lut = equalisation_lut(hist, intensity=self.intensity)
+        self.reference_luminance = cv2.mean(luma)[0]
+        self.frames_since_update = 0
+
+    def apply_luma(self, luma):
+        """Normalises a Y plane in place."""
+        if self.update_needed(luma):
+            self.update(luma)
+        self.frames_since_update += 1
+
+        return cv2.LUT(luma, self.lut, dst=luma)
+
+    def __call__(self, image, workspace=None):
+        """
+        :param image: image as a BGR array (i.e. opened with opencv not PIL)
+        :param workspace: optional Workspace for the intermediate and output images
+        :return: brightness normalised BGR image
+        """
+        yuv = cv2.cvtColor(image, cv2.COLOR_BGR2YUV, dst=scratch(workspace, 'pre_yuv', image.shape, channels=3))
+        luma = cv2.extractChannel(yuv, 0, dst=scratch(workspace, 'pre_luma', image.shape))
+        cv2.insertChannel(self.apply_luma(luma), yuv, 0)
+
+        return cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR, dst=scratch(workspace, 'pre_out', image.shape, channels=3))
+
+    def yuv420(self, frame, workspace=None):
+        """The same normalisation of an I420 frame, a single LUT on the Y plane of a copy."""
+        out = workspace.get('pre_yuv420', shape=frame.shape) if workspace is not None else np.empty_like(frame)
+        np.copyto(out, frame)
+        y, _, _ = split_yuv420(out)
+        self.apply_luma(y)
+
+        return out
+
+
+class ClaheEnhancer:
+    def __init__(self, clip_limit=20, tile_grid_size=(64, 64)):
+        """
+        clahe_sat_val using a persistent CLAHE object per resolution instead of creating one every frame.
+        :param clip_limit: CLAHE contrast limit
+        :param tile_grid_size: number of tiles in (x, y)
+        """
+        self.clip_limit = clip_limit
+        self.tile_grid_size = tile_grid_size
+
+    def __call__(self, image, workspace=None):
+        clahe = get_clahe(image.shape, self.clip_limit, self.tile_grid_size)
+
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=scratch(workspace, 'pre_hsv', image.shape, channels=3))
+        channel = scratch(workspace, 'pre_channel', image.shape)
+        for c in (1, 2):
+            cv2.extractChannel(hsv, c, dst=channel)
+            clahe.apply(channel, dst=channel)
+            cv2.insertChannel(channel, hsv, c)
+
+        return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR, dst=scratch(workspace, 'pre_out', image.shape, channels=3))
+
+
+def create_preprocessor(method='none', update_interval=30):
+    """
+    Returns the preprocessing stage for a method name from PREPROCESSING_METHODS, or None for 'none'.
+    """
+    if method not in PREPROCESSING_METHODS:
+        raise ValueError(f"Unknown preprocessing method {method}. Must be one of: {', '.join(PREPROCESSING_METHODS)}")
+
+    if method == 'normalise':
+        return BrightnessNormaliser(update_interval=update_interval)
+    if method == 'clahe':
+        return ClaheEnhancer()
+
+    return None
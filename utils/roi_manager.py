@@ -0,0 +1,161 @@
+import numpy as np
+import cv2
+
+from utils.frame_formats import image_shape, split_yuv420
+
+
+class ProcessingROI:
+    def __init__(self, top=0.0, bottom=1.0, left=0.0, right=1.0, exclude=None):
+        """
+        Region of the frame passed to the detectors. Everything outside the band between top and bottom and left
+        and right is cropped off before the index is computed, and excluded rectangles (e.g. the boom or a wheel in
+        view) are cleared from the thresholded mask, or for GreenOnGreen boxes centred in them are dropped, so no
+        detection can come from them. Detections are returned in full frame coordinates.
+
+        All positions are fractions of the frame height or width, so the ROI doesn't depend on the resolution.
+        :param top: top of the processed band, e.g. the actuation line
+        :param bottom: bottom of the processed band
+        :param left: left edge of the processed band
+        :param right: right edge of the processed band
+        :param exclude: list of (left, top, right, bottom) rectangles to ignore, as fractions of the full frame
+        """
+        if not (0 <= top < bottom <= 1 and 0 <= left < right <= 1):
+            raise ValueError(f"ROI must satisfy 0 <= top < bottom <= 1 and 0 <= left < right <= 1, "
+                             f"got top={top}, bottom={bottom}, left={left}, right={right}")
+
+        self.top = top
+        self.bottom = bottom
+        self.left = left
+        self.right = right
+        self.exclude = [tuple(rectangle) for rectangle in (exclude or [])]
+
+        # per frame shape, so a resolution change only recomputes these once
+        self._bounds = {}
+        self._masks = {}
+        self._yuv_buffer = None
+
+    @staticmethod
+    def parse_exclusions(value):
+        """
+        Rectangles from a config string of 'left, top, right, bottom' fractions separated by semicolons,
+        e.g. '0, 0.8, 0.15, 1; 0.85, 0.8, 1, 1' for both wheels in the bottom corners.
+        """
+        rectangles = []
+        for item in value.split(';'):
+            if not item.strip():
+                continue
+            rectangle = tuple(float(v) for v in item.split(','))
+            if len(rectangle) != 4:
+                raise ValueError(f"Excluded areas need 4 values (left, top, right, bottom), got: {item.strip()}")
+            rectangles.append(rectangle)
+
+        return rectangles
+
+    @property
+    def full_frame(self):
+        return (self.top, self.bottom, self.left, self.right) == (0, 1, 0, 1) and not self.exclude
+
+    def bounds(self, shape, frame_format='bgr'):
+        """
+        (y0, y1, x0, x1) pixel bounds of the band in a frame of the given (height, width). For yuv420 frames the
+        band is aligned to even columns and a multiple of 4 rows, so the cropped frame is still a valid I420 frame.
+        """
+        key = (tuple(shape[:2]), frame_format)
+        if key not in self._bounds:
+            height, width = shape[:2]
+            y0, y1 = int(self.top * height), int(np.ceil(self.bottom * height))
+            x0, x1 = int(self.left * width), int(np.ceil(self.right * width))
+
+            if frame_format == 'yuv420':
+                y0, x0 = y0 & ~1, x0 & ~1
+                rows = (y1 - y0 + 3) & ~3
+                y1 = min(y0 + rows, height & ~3)
+                y0 = max(y1 - rows, 0)
+                x1 = min((x1 + 1) & ~1, width)
+
+            self._bounds[key] = (y0, y1, x0, x1)
+
+        return self._bounds[key]
+
+    def offset(self, shape, frame_format='bgr'):
+        """(x, y) of the top left of the band, to add to detections in the cropped frame."""
+        y0, _, x0, _ = self.bounds(shape, frame_format)
+        return x0, y0
+
+    def crop(self, frame, frame_format='bgr'):
+        """
+        The band of a frame. A view for BGR frames. YUV420 planes are not contiguous in a cropped view, so the band
+        is copied into a reused I420 buffer, valid until the next call.
+        """
+        y0, y1, x0, x1 = self.bounds(image_shape(frame, frame_format), frame_format)
+        if frame_format != 'yuv420':
+            return frame[y0:y1, x0:x1]
+
+        height, width = y1 - y0, x1 - x0
+        if self._yuv_buffer is None or self._yuv_buffer.shape != (height * 3 // 2, width):
+            self._yuv_buffer = np.empty((height * 3 // 2, width), dtype=np.uint8)
+
+        y, u, v = split_yuv420(frame)
+        crop_y, crop_u, crop_v = split_yuv420(self._yuv_buffer)
+        np.copyto(crop_y, y[y0:y1, x0:x1])
+        np.copyto(crop_u, u[y0 // 2:y1 // 2, x0 // 2:x1 // 2])
+        np.copyto(crop_v, v[y0 // 2:y1 // 2, x0 // 2:x1 // 2])
+
+        return self._yuv_buffer
+
+    def exclusion_mask(self, shape, frame_format='bgr'):
+        """uint8 mask of the band with 0 in excluded areas and 255 elsewhere, or None if nothing is excluded."""
+        if not self.exclude:
+            return None
+
+        key = (tuple(shape[:2]), frame_format)
+        if key not in self._masks:
+            height, width = shape[:2]
+            y0, y1, x0, x1 = self.bounds(shape, frame_format)
+            mask = np.full((y1 - y0, x1 - x0), 255, dtype=np.uint8)
+            for left, top, right, bottom in self.exclude:
+                start = (int(left * width) - x0, int(top * height) - y0)
+                end = (int(np.ceil(right * width)) - x0 - 1, int(np.ceil(bottom * height)) - y0 - 1)
+                cv2.rectangle(mask, start, end, 0, -1)
+            self._masks[key] = mask
+
+        return self._masks[key]
+
+    def apply_exclusions(self, mask, shape, frame_format='bgr'):
+        """Clears the excluded areas from a thresholded mask of the band, in place."""
+        exclusion_mask = self.exclusion_mask(shape, frame_format)
+        if exclusion_mask is not None:
+            cv2.bitwise_and(mask, exclusion_mask, dst=mask)
+        return mask
+
+    def outside_exclusions(self, centres, shape):
+        """
+        True for each (x, y) full frame point outside every excluded area, for detectors that don't threshold a mask,
+        e.g. GreenOnGreen drops boxes whose centre is excluded.
+        :param centres: (N, 2) points in full frame pixels
+        :param shape: (height, width) of the full frame
+        """
+        centres = np.asarray(centres, dtype=np.int64).reshape(-1, 2)
+        keep = np.ones(len(centres), dtype=bool)
+        height, width = shape[:2]
+        for left, top, right, bottom in self.exclude:
+            keep &= ~((centres[:, 0] >= int(left * width)) & (centres[:, 0] < int(np.ceil(right * width))) &
+                      (centres[:, 1] >= int(top * height)) & (centres[:, 1] < int(np.ceil(bottom * height))))
+
+        return keep
+
+    def processed_fraction(self, shape, frame_format='bgr'):
+        """Share of the frame's pixels the detectors still process."""
+        y0, y1, x0, x1 = self.bounds(shape, frame_format)
+        return (y1 - y0) * (x1 - x0) / (shape[0] * shape[1])
+
+    def draw(self, image, colour=(0, 255, 255)):
+        """Outlines the band and excluded areas on a full frame BGR image for display."""
+        height, width = image.shape[:2]
+        cv2.rectangle(image, (int(self.left * width), int(self.top * height)),
+                      (int(self.right * width) - 1, int(self.bottom * height) - 1), colour, 1)
+        for left, top, right, bottom in self.exclude:
+            cv2.rectangle(image, (int(left * width), int(top * height)),
+                          (int(right * width) - 1, int(bottom * height) - 1), (128, 128, 128), 1)
+
+        return image
@@ -0,0 +1,122 @@
+import cv2
+
+from utils.workspace import scratch
+
+THRESHOLD_METHODS = ('gaussian', 'box', 'downsampled', 'otsu')
+
+# neighbourhood and offset of the original cv2.adaptiveThreshold call in GreenOnBrown.inference
+BLOCK_SIZE = 31
+OFFSET = 2
+
+
+class GaussianThreshold:
+    """
+    The original 31 x 31 Gaussian weighted local mean threshold. Best quality, and the slowest as the Gaussian
+    filter costs 62 multiplies per pixel.
+    """
+    def __call__(self, index, workspace=None):
+        return cv2.adaptiveThreshold(index, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV,
+                                     BLOCK_SIZE, OFFSET, dst=scratch(workspace, 'threshold', index.shape))
+
+
+class BoxThreshold:
+    """
+    Unweighted 31 x 31 local mean. OpenCV computes it with running sums like an integral image, so the cost doesn't
+    depend on the block size. Edges of plants get a slightly wider halo than with the Gaussian mean.
+    """
+    def __call__(self, index, workspace=None):
+        return cv2.adaptiveThreshold(index, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV,
+                                     BLOCK_SIZE, OFFSET, dst=scratch(workspace, 'threshold', index.shape))
+
+
+class DownsampledThreshold:
+    def __init__(self, factor=4):
+        """
+        Gaussian local mean computed on a copy of the index shrunk by factor and upsampled back with linear
+        interpolation, then compared with the full resolution index as adaptiveThreshold does. The mean is smoother
+        than the full resolution one, so very small plants next to larger ones can be missed.
+        :param factor: downsampling factor in each direction
+        """
+        self.factor = factor
+        self.block_size = max(BLOCK_SIZE // factor, 1) | 1
+
+    def __call__(self, index, workspace=None):
+        height, width = index.shape[:2]
+        small_shape = (max(height // self.factor, 1), max(width // self.factor, 1))
+
+        small = cv2.resize(index, small_shape[::-1], interpolation=cv2.INTER_AREA,
+                           dst=scratch(workspace, 'threshold_small', small_shape))
+        small = cv2.GaussianBlur(small, (self.block_size, self.block_size), 0, dst=small,
+                                 borderType=cv2.BORDER_REPLICATE)
+        mean = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR,
+                          dst=scratch(workspace, 'threshold_mean', index.shape))
+
+        # THRESH_BINARY_INV: 255 where index <= mean - OFFSET
+        shifted = cv2.add(index, OFFSET, dst=scratch(workspace, 'threshold_shifted', index.shape))
+        return cv2.compare(shifted, mean, cv2.CMP_LE, dst=scratch(workspace, 'threshold', index.shape))
+
+
+class OtsuThreshold:
+    def __init__(self, update_interval=30):
+        """
+        Global threshold chosen with Otsu's method every update_interval frames and reused in between, so most
+        frames cost a single comparison per pixel. Marks the plants themselves rather than the local contrast around
+        them, and needs a reasonably consistent index range between updates, e.g. from the exg_min/exg_max clip.
+        :param update_interval: frames between Otsu updates
+        """
+        self.update_interval = update_interval
+        self.level = None
+        self.frames_since_update = 0
+
+    def __call__(self, index, workspace=None):
+        if self.level is None or self.frames_since_update >= self.update_interval:
+            self.update(index)
+        self.frames_since_update += 1
+
+        return self.apply(index, workspace=workspace)
+
+    def update(self, index):
+        """
+        Otsu level of an index. A one-valued index, e.g. bare soil clipped to exg_min, has nothing to separate and
+        OpenCV returns 0 for it, which would mark every pixel, so the level is cleared and recomputed on the next frame.
+        A level at the index minimum is kept, only pixels above it are marked.
+        """
+        low, high, _, _ = cv2.minMaxLoc(index)
+        level = cv2.threshold(index, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[0] if low < high else None
+        self.level = level if level is not None and level >= low else None
+        self.frames_since_update = 0
+
+    def apply(self, index, workspace=None):
+        """
+        Thresholds an index at the current level without counting a frame, e.g. for the tiles of a pyramid frame.
+        Empty if no level has been found.
+        """
+        out = scratch(workspace, 'threshold', index.shape)
+        if self.level is None:
+            out.fill(0)
+            return out
+
+        return cv2.threshold(index, self.level, 255, cv2.THRESH_BINARY, dst=out)[1]
+
+    def reset(self):
+        """Recompute the level on the next frame, e.g. after exg_min or exg_max change the index range."""
+        self.level = None
+        self.frames_since_update = 0
+
+
+def create_thresholder(method='gaussian', update_interval=30):
+    """
+    Returns the thresholding stage for a method name from THRESHOLD_METHODS. Each algorithm needs its own
+    instance, as the Otsu level depends on the index.
+    """
+    if method not in THRESHOLD_METHODS:
+        raise ValueError(f"Unknown threshold method {method}. Must be one of: {', '.join(THRESHOLD_METHODS)}")
+
+    if method == 'box':
+        return BoxThreshold()
+    if method == 'downsampled':
+        return DownsampledThreshold()
+    if method == 'otsu':
+        return OtsuThreshold(update_interval=update_interval)
+
+    return GaussianThreshold()
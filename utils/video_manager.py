@@ -2,6 +2,7 @@ import cv2
 import time
 
 from threading import Thread, Event, Condition, Lock
+from utils.frame_formats import FRAME_FORMATS, bgr_to_yuv420, repack_yuv420
 from utils.log_manager import LogManager
 
 # determine availability of picamera versions
@@ -24,10 +25,11 @@ except Exception as e:
 
 # class to support webcams
 class WebcamStream:
-    def __init__(self, src=0):
+    def __init__(self, src=0, frame_format='bgr'):
         self.logger = LogManager.get_logger(__name__)
         self.name = "WebcamStream"
         self.logger.info(f'Camera type: {self.name}')
+        self.frame_format = frame_format
         self.stream = cv2.VideoCapture(src)
 
         self.frame_width = self.stream.get(cv2.CAP_PROP_FRAME_WIDTH)
@@ -46,6 +48,10 @@ class WebcamStream:
             self.logger.error(f'Unable to read from video source: {src}')
             raise ValueError("Unable to read from video source:", src)
 
+        # webcams only deliver BGR, so yuv420 frames are converted in the update thread
+        if self.frame_format == 'yuv420':
+            self.frame = bgr_to_yuv420(self.frame)
+
         # initialize the thread name, stop event, and the thread itself
         self.stop_event = Event()
         self.thread = Thread(target=self.update, name=self.name, args=())
@@ -60,7 +66,10 @@ class WebcamStream:
         try:
             while not self.stop_event.is_set():
                 # Read the next frame from the stream
-                self.grabbed, self.frame = self.stream.read()
+                grabbed, frame = self.stream.read()
+                if grabbed and self.frame_format == 'yuv420':
+                    frame = bgr_to_yuv420(frame)
+                self.grabbed, self.frame = grabbed, frame
 
                 # If not grabbed, end of the stream has been reached.
                 if not self.grabbed:
@@ -81,11 +90,12 @@ class WebcamStream:
 
 
 class PiCamera2Stream:
-    def __init__(self, src=0, resolution=(416, 320), exp_compensation=-2, **kwargs):
+    def __init__(self, src=0, resolution=(416, 320), exp_compensation=-2, frame_format='bgr', **kwargs):
         self.logger = LogManager.get_logger(__name__)
         self.name = 'Picamera2Stream'
         self.logger.info(f'Camera type: {self.name}')
         self.size = resolution  # picamera2 uses size instead of resolution, keeping this consistent
+        self.frame_format = frame_format
         self.frame_width = None
         self.frame_height = None
         self.frame = None
@@ -104,6 +114,13 @@ class PiCamera2Stream:
             "size": self.size
         }
 
+        # planar YUV420 comes straight from the ISP without the conversion to RGB. sYCC is full range BT.601, which
+        # the yuv420 algorithms assume.
+        colour_space = None
+        if self.frame_format == 'yuv420':
+            self.configurations['format'] = 'YUV420'
+            colour_space = libcamera.ColorSpace.Sycc()
+
         self.controls = {
             "AeExposureMode": 1,
             "AwbMode": libcamera.controls.AwbModeEnum.Daylight,
@@ -111,7 +128,7 @@ class PiCamera2Stream:
         }
         # Or if you prefer split logs for different aspects:
         self.logger.info("Setting camera format", extra=dict(
-            format='RGB888',
+            format=self.configurations['format'],
             image_size=list(self.size),
             note='RGB888 represents BGR format in libcamera'))
 
@@ -145,6 +162,7 @@ class PiCamera2Stream:
             self.config = self.camera.create_preview_configuration(main=self.configurations,
                                                                    transform=Transform(hflip=True, vflip=True),
                                                                    queue=False,
+                                                                   colour_space=colour_space,
                                                                    controls=self.controls)
             self.camera.configure(self.config)
             self.camera.start()
@@ -177,6 +195,9 @@ class PiCamera2Stream:
             while not self.stopped.is_set():
                 frame = self.camera.capture_array("main")
                 if frame is not None:
+                    if self.frame_format == 'yuv420':
+                        frame = repack_yuv420(frame, self.frame_width, self.frame_height)
+
                     with self.lock:
                         self.frame = frame
                         self.frame_available = True
@@ -207,10 +228,11 @@ class PiCamera2Stream:
 
 
 class PiCameraStream:
-    def __init__(self, resolution=(416, 320), exp_compensation=-2, **kwargs):
+    def __init__(self, resolution=(416, 320), exp_compensation=-2, frame_format='bgr', **kwargs):
         self.logger = LogManager.get_logger(__name__)
         self.name = 'PicameraStream'
         self.logger.info(f'Camera type: {self.name}')
+        self.frame_format = frame_format
         self.frame_width = None
         self.frame_height = None
 
@@ -258,7 +280,7 @@ class PiCameraStream:
     def update(self):
         try:
             for f in self.stream:
-                self.frame = f.array
+                self.frame = bgr_to_yuv420(f.array) if self.frame_format == 'yuv420' else f.array
                 self.rawCapture.truncate(0)
 
                 if self.stopped.is_set():
@@ -285,20 +307,31 @@ class PiCameraStream:
 
 # overarching class to determine which stream to use
 class VideoStream:
-    def __init__(self, src=0, resolution=(416, 320), exp_compensation=-2, **kwargs):
+    def __init__(self, src=0, resolution=(416, 320), exp_compensation=-2, frame_format='bgr', **kwargs):
+        """
+        :param frame_format: 'bgr' for (height, width, 3) BGR frames or 'yuv420' for planar I420 frames of shape
+                             (height * 3 / 2, width). Only picamera2 delivers YUV420 natively, other sources convert.
+        """
         self.CAMERA_VERSION = PICAMERA_VERSION if PICAMERA_VERSION is not None else 'webcam'
         self.logger = LogManager.get_logger(__name__)
         self.frame_height = None
         self.frame_width = None
 
+        if frame_format not in FRAME_FORMATS:
+            self.logger.error(f"Unsupported frame format: {frame_format}")
+            raise ValueError(f"Unsupported frame format: {frame_format}")
+        self.frame_format = frame_format
+
         if self.CAMERA_VERSION == 'legacy':
-            self.stream = PiCameraStream(resolution=resolution, exp_compensation=exp_compensation, **kwargs)
+            self.stream = PiCameraStream(resolution=resolution, exp_compensation=exp_compensation,
+                                         frame_format=frame_format, **kwargs)
 
         elif self.CAMERA_VERSION == 'picamera2':
-            self.stream = PiCamera2Stream(src=src, resolution=resolution, exp_compensation=exp_compensation, **kwargs)
+            self.stream = PiCamera2Stream(src=src, resolution=resolution, exp_compensation=exp_compensation,
+                                          frame_format=frame_format, **kwargs)
 
         elif self.CAMERA_VERSION == 'webcam':
-            self.stream = WebcamStream(src=src)
+            self.stream = WebcamStream(src=src, frame_format=frame_format)
 
         else:
             self.logger.error(f"Unsupported camera version: {self.CAMERA_VERSION}")
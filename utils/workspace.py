@@ -0,0 +1,46 @@
+import numpy as np
+
+
+class Workspace:
+    def __init__(self, shape):
+        """
+        Preallocated scratch buffers for one frame size. Kernels that accept a workspace write into these buffers
+        with out=/dst= arguments, so steady-state processing doesn't allocate new full-frame arrays. A buffer is
+        only valid until the same kernel runs on the next frame.
+        :param shape: frame shape, only the height and width are used
+        """
+        self.shape = tuple(shape[:2])
+        self.buffers = {}
+
+    def get(self, name, dtype=np.uint8, channels=None, shape=None):
+        """
+        Returns the named buffer, allocating it the first time it is requested.
+        :param name: buffer name, unique per kernel stage
+        :param dtype: numpy dtype of the buffer
+        :param channels: number of channels, None for a single-channel frame-sized buffer
+        :param shape: (height, width) for buffers that aren't frame-sized, e.g. YUV420 chroma planes
+        """
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            shape = self.shape if shape is None else tuple(shape[:2])
+            shape = shape if channels is None else shape + (channels,)
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buffer
+
+        return buffer
+
+    def matches(self, image):
+        return image.shape[:2] == self.shape
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+
+def scratch(workspace, name, shape, dtype=np.uint8, channels=None):
+    """Buffer from the workspace if there is one, otherwise a new array of the given (height, width)."""
+    if workspace is None:
+        shape = tuple(shape[:2]) if channels is None else tuple(shape[:2]) + (channels,)
+        return np.empty(shape, dtype=dtype)
+
+    return workspace.get(name, dtype=dtype, channels=channels, shape=shape)